@@ -0,0 +1,183 @@
+"""
+Admin dashboard sections, each served as its own JSON page.
+
+The dashboard page is an empty shell; its script fetches every section in
+parallel from /admin/api/<section>. Each section is a single keyset-paginated
+query: rows are ordered by the section's sort key and the next page starts
+after the last row's key, so a later page costs the same as the first one
+(no OFFSET scan). The cursor handed to the client is that key, base64-encoded.
+
+Pages are cached for ADMIN_SECTION_TTL seconds under the ride board version.
+Any booking or vehicle change bumps the version, so it shows up on the next
+fetch. Changes that don't touch the board, such as a new registration, can be
+up to one TTL late.
+"""
+import base64
+import binascii
+import json
+import os
+from collections import namedtuple
+
+from cache import TTLCache, board_cache
+from db import get_db
+
+ADMIN_SECTION_TTL = float(os.environ.get('ADMIN_SECTION_TTL', '10'))
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# sql: SELECT with a {where} (or {and}, if it already filters) slot for the keyset and an {order} slot
+# key: SQL expressions of the sort key; fields: the same values' names in each row
+Section = namedtuple('Section', 'sql key fields')
+
+_BOOKED_PASSENGERS = """
+    SELECT {columns}
+    FROM bookings b
+    JOIN users u ON b.passenger_id = u.id
+    JOIN vehicles v ON b.vehicle_id = v.id
+    JOIN users d ON v.driver_id = d.id
+    {where}
+    ORDER BY {order}
+"""
+
+SECTIONS = {
+    'passengers': Section(
+        _BOOKED_PASSENGERS.replace('{columns}', "u.full_name, u.residence, u.email, d.full_name as driver_name, "
+                                                "b.id as booking_id"),
+        ('d.full_name', 'u.full_name', 'b.id'),
+        ('driver_name', 'full_name', 'booking_id'),
+    ),
+    # Same rows and order as 'passengers', just the addresses (the page loads all of them)
+    'emails': Section(
+        _BOOKED_PASSENGERS.replace('{columns}', "u.email, d.full_name as driver_name, u.full_name, "
+                                                "b.id as booking_id"),
+        ('d.full_name', 'u.full_name', 'b.id'),
+        ('driver_name', 'full_name', 'booking_id'),
+    ),
+    # Drivers with at least one pickup location (EXISTS instead of DISTINCT over the join)
+    'drivers': Section(
+        """
+        SELECT u.id, u.full_name, u.grade, u.phone_number
+        FROM users u
+        WHERE u.is_driver = TRUE
+          AND EXISTS (SELECT 1 FROM vehicles v WHERE v.driver_id = u.id)
+          {and}
+        ORDER BY {order}
+        """,
+        ('u.full_name', 'u.id'),
+        ('full_name', 'id'),
+    ),
+    'vehicles': Section(
+        """
+        SELECT v.id, v.vehicle_name, COALESCE(v.vehicle_name, '') as sort_name, v.driver_id,
+               d.full_name as driver_name, d.driver_capacity, COUNT(b.id) as passenger_count
+        FROM vehicles v
+        JOIN users d ON v.driver_id = d.id
+        LEFT JOIN bookings b ON b.vehicle_id = v.id
+        {where}
+        GROUP BY v.id, v.vehicle_name, v.driver_id, d.full_name, d.driver_capacity
+        ORDER BY {order}
+        """,
+        ('d.full_name', "COALESCE(v.vehicle_name, '')", 'v.id'),
+        ('driver_name', 'sort_name', 'id'),
+    ),
+    # Users who are neither booked nor driving a vehicle
+    'inactive': Section(
+        """
+        SELECT u.id, u.full_name, u.grade, u.residence, u.phone_number, u.email
+        FROM users u
+        WHERE NOT EXISTS (SELECT 1 FROM bookings b WHERE b.passenger_id = u.id)
+          AND NOT EXISTS (SELECT 1 FROM vehicles v WHERE v.driver_id = u.id)
+          {and}
+        ORDER BY {order}
+        """,
+        ('u.full_name', 'u.id'),
+        ('full_name', 'id'),
+    ),
+}
+
+section_cache = TTLCache(maxsize=256, ttl=ADMIN_SECTION_TTL)
+
+
+class InvalidCursor(ValueError):
+    """The 'after' cursor could not be decoded for this section"""
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """Sort key values from a cursor made by encode_cursor()"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor(str(e))
+    if (not isinstance(values, list) or len(values) != length
+            or not all(isinstance(v, (str, int, float)) for v in values)):
+        raise InvalidCursor(f"expected {length} key values")
+    return values
+
+
+def page_size(limit):
+    """Clamp a requested page size (None = default)"""
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _query(section, after, limit):
+    placeholder = "%s" if os.environ.get('DATABASE_URL') else "?"
+    where, also, params = '', '', []
+    if after is not None:
+        # Row-value comparison: strictly after the last row of the previous page
+        keyset = f"({', '.join(section.key)}) > ({', '.join([placeholder] * len(section.key))})"
+        where, also = 'WHERE ' + keyset, 'AND ' + keyset
+        params.extend(after)
+    sql = (section.sql.replace('{where}', where).replace('{and}', also)
+           .replace('{order}', ', '.join(section.key)))
+    # One extra row tells us whether there is a next page
+    sql += f" LIMIT {placeholder}"
+    params.append(limit + 1)
+
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+
+def fetch_page(name, cursor=None, limit=None):
+    """
+    One page of a dashboard section.
+
+    Args:
+        name: Key of SECTIONS
+        cursor: 'next' value from the previous page, or None for the first page
+        limit: Rows per page (clamped to MAX_PAGE_SIZE)
+
+    Returns:
+        dict: 'section', 'rows', 'next' (cursor or None) and the board 'version'
+
+    Raises:
+        KeyError: Unknown section
+        InvalidCursor: Malformed cursor
+    """
+    section = SECTIONS[name]
+    limit = page_size(limit)
+    after = decode_cursor(cursor, len(section.key)) if cursor else None
+
+    version = board_cache.version
+    key = (name, version, cursor, limit)
+    page = section_cache.get(key)
+    if page is not None:
+        return page
+
+    rows = _query(section, after, limit)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][field] for field in section.fields)
+    page = {'section': name, 'version': version, 'rows': [dict(row) for row in rows], 'next': next_cursor}
+    section_cache.set(key, page)
+    return page
@@ -1,12 +1,28 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Response, stream_with_context, render_template, request, redirect, url_for, flash, jsonify, g, after_this_request, send_file
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from db import get_db_connection, init_db, release_db_connection
-from models import User
+from db import get_db, init_db, pool_stats, PoolTimeout
+from models import User, user_cache
+from passwords import password_hasher, hash_password, verify_password, HashingBusy
+from ratelimit import limiter, rate_limited, RateLimited
+from cache import board_cache
+from cards import card_cache, render_board
+from rides import load_ride_board, book_seat, BOOKED, ALREADY_BOOKED, FULL
+from live import broadcaster
+from snapshot import snapshot_writer
+import assets
+import metrics
+import sqltrace
+import startup
+from exports import passengers_by_driver, passengers_csv, passengers_pdf, export_date
+from admin_sections import SECTIONS, DEFAULT_PAGE_SIZE, InvalidCursor, fetch_page
+from ride_stats import load_stats, DEFAULT_WEEKS
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'f557d923d5679644c2b94cd0ad194313')
+metrics.init_app(app)
+assets.init_app(app)
+sqltrace.init_app(app)
 
 # --- CONFIGURATION ---
 
@@ -84,6 +100,23 @@ login_manager.login_view = 'login'
 def load_user(user_id):
     return User.get(user_id)
 
+# All pooled connections busy for DB_POOL_TIMEOUT seconds - fail fast instead of queueing forever
+@app.errorhandler(PoolTimeout)
+def database_busy(e):
+    print(f"Database pool timeout: {e}")
+    return "The site is busy right now. Please try again in a few seconds.", 503, {'Retry-After': '5'}
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(e):
+    print(f"Password hashing busy: {e}")
+    return "Too many sign-ins right now. Please try again in a few seconds.", 503, {'Retry-After': '5'}
+
+@app.errorhandler(RateLimited)
+def rate_limited_response(e):
+    # Raised before the view runs, so no connection or hash work was spent on it
+    return (f"Too many requests. Please wait {e.retry_after_header} seconds and try again.", 429,
+            {'Retry-After': e.retry_after_header, 'Cache-Control': 'no-store'})
+
 # Watchdog monitoring is handled externally by Railway service
 # No integrated watchdog needed - Railway monitors from outside
 
@@ -91,154 +124,137 @@ def load_user(user_id):
 
 @app.route('/')
 def index():
-    conn = None
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # OPTIMIZED: Single query with JOIN to get all data at once (eliminates N+1 query problem)
-        cur.execute("""
-            SELECT
-                v.id as vehicle_id,
-                v.vehicle_name,
-                v.driver_id,
-                u.full_name as driver_name,
-                u.phone_number as driver_phone,
-                u.driver_capacity,
-                p.full_name as passenger_name,
-                p.id as passenger_id
-            FROM vehicles v
-            JOIN users u ON v.driver_id = u.id
-            LEFT JOIN bookings b ON b.vehicle_id = v.id
-            LEFT JOIN users p ON b.passenger_id = p.id
-            ORDER BY u.full_name, v.vehicle_name, p.full_name
-        """)
-        rows = cur.fetchall()
-
-        # Process results into structured data
-        vehicles_dict = {}
-        driver_totals = {}
-
-        for row in rows:
-            vehicle_id = row['vehicle_id']
-            driver_id = row['driver_id']
-
-            # Initialize vehicle if not seen before
-            if vehicle_id not in vehicles_dict:
-                vehicles_dict[vehicle_id] = {
-                    'id': vehicle_id,
-                    'name': row['vehicle_name'],
-                    'driver': row['driver_name'],
-                    'driver_phone': row['driver_phone'],
-                    'driver_id': driver_id,
-                    'driver_capacity': row['driver_capacity'] or 0,
-                    'passengers': []
-                }
-                
-                # --- FIX STARTS HERE ---
-                # Only initialize driver total if we haven't seen this DRIVER before.
-                # Do not reset it just because we found a new vehicle.
-                if driver_id not in driver_totals:
-                    driver_totals[driver_id] = 0
-                # --- FIX ENDS HERE ---
-
-            # Add passenger if exists
-            if row['passenger_id']:
-                passenger = {
-                    'full_name': row['passenger_name'],
-                    'id': row['passenger_id']
-                }
-                # Avoid duplicates (in case of data issues)
-                if passenger not in vehicles_dict[vehicle_id]['passengers']:
-                    vehicles_dict[vehicle_id]['passengers'].append(passenger)
-                    driver_totals[driver_id] += 1
-
-        # Add driver totals and capacity check to each vehicle
-        vehicles_data = []
-        for vehicle in vehicles_dict.values():
-            driver_id = vehicle['driver_id']
-            driver_total = driver_totals.get(driver_id, 0)
-            vehicle['driver_total_passengers'] = driver_total
-            vehicle['is_full'] = driver_total >= vehicle['driver_capacity']
-            vehicles_data.append(vehicle)
-
-        return render_template('index.html', vehicles=vehicles_data)
+        # Served from memory; rebuilt only after a booking/vehicle change
+        board_version, vehicles_data = board_cache.snapshot(load_ride_board)
+        # Cards are cached per vehicle; only the viewer's own buttons are filled in here
+        board_html, my_vehicle = render_board(vehicles_data, current_user)
+        return render_template('index.html', vehicles=vehicles_data, board_version=board_cache.tag(board_version),
+                               board_html=board_html, my_vehicle=my_vehicle)
     except Exception as e:
         print(f"Index route error: {e}")
         import traceback
         traceback.print_exc()  # Print full stack trace for debugging
         flash("Error loading rides. Please try again.")
         return render_template('index.html', vehicles=[])
-    finally:
-        if conn:
-            release_db_connection(conn)
 
-@app.route('/join/<int:vehicle_id>')
-@login_required
-def join_ride(vehicle_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
+@app.route('/api/rides')
+def api_rides():
+    """Ride board as JSON with a strong ETag, so pollers get a cheap 304 when nothing changed"""
+    # Fast path: cached board is fresh and the client already has this version - no DB work
+    version = board_cache.fresh_version()
+    if version is not None and request.if_none_match.contains(board_etag(version)):
+        return not_modified(version)
 
     try:
-        # Check if already booked
-        cur.execute(f"SELECT * FROM bookings WHERE passenger_id = {DB_PLACEHOLDER}", (current_user.id,))
-        if cur.fetchone():
-            flash("You already have a ride! Leave it first.")
-        else:
-            # Get vehicle and driver info
-            cur.execute(f"SELECT v.driver_id, u.driver_capacity FROM vehicles v JOIN users u ON v.driver_id = u.id WHERE v.id = {DB_PLACEHOLDER}", (vehicle_id,))
-            vehicle = cur.fetchone()
+        version, vehicles_data = board_cache.snapshot(load_ride_board)
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        print(f"Rides API error: {e}")
+        return jsonify({'error': 'Error loading rides'}), 500
 
-            if not vehicle:
-                flash("Vehicle not found.")
-                return redirect(url_for('index'))
+    if request.if_none_match.contains(board_etag(version)):
+        return not_modified(version)
+
+    response = jsonify({'version': board_cache.tag(version), 'vehicles': vehicles_data})
+    response.set_etag(board_etag(version))
+    # Clients may keep a copy but must revalidate (cheap thanks to the ETag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
-            driver_id = vehicle['driver_id']
-            driver_capacity = vehicle['driver_capacity'] or 0
+@app.route('/stream/rides')
+def stream_rides():
+    """Server-Sent Events feed of ride board changes (see live.py)"""
+    q = broadcaster.subscribe()
+    if q is None:
+        # With threaded workers every stream holds a thread - keep some free for normal requests
+        return "Too many live connections", 503, {'Retry-After': '30'}
+    try:
+        broadcaster.set_baseline(board_cache.get(load_ride_board))
+    except Exception:
+        broadcaster.unsubscribe(q)
+        raise
+
+    # The stream only waits on its queue; it never touches the database
+    response = Response(broadcaster.stream(q, lambda: board_cache.version), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Also covers clients that disconnect before the first message is sent
+    response.call_on_close(lambda: broadcaster.unsubscribe(q))
+    return response
 
-            # Count total passengers across ALL vehicles for this driver
-            cur.execute(f"""
-                SELECT COUNT(*) as count FROM bookings b
-                JOIN vehicles v ON b.vehicle_id = v.id
-                WHERE v.driver_id = {DB_PLACEHOLDER}
-            """, (driver_id,))
-            count_result = cur.fetchone()
-            current_count = count_result['count'] if count_result else 0
+def board_changed():
+    """Call after committing anything shown on the ride board"""
+    board_cache.invalidate()
+    if g.get('board_publish_pending'):
+        return
+    g.board_publish_pending = True
 
-            if current_count >= driver_capacity:
+    # Publish once the view has returned its connection to the pool
+    @after_this_request
+    def publish_board_change(response):
+        try:
+            # With subscribers: reload the board once (re-priming the cache) and push the deltas
+            broadcaster.board_changed(lambda: board_cache.snapshot(load_ride_board))
+        except Exception as e:
+            # The change is already committed; clients catch up on their next reconnect
+            print(f"Live update error: {e}")
+        # Debounced rewrite of the offline backup on a background thread
+        snapshot_writer.schedule(board_cache.version)
+        return response
+
+def board_etag(version):
+    return f"board-{board_cache.tag(version)}"
+
+def not_modified(version):
+    response = app.response_class(status=304)
+    response.set_etag(board_etag(version))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/join/<int:vehicle_id>')
+@login_required
+@rate_limited('join_ride', methods=('GET',))
+def join_ride(vehicle_id):
+    with get_db() as conn:
+        try:
+            outcome = book_seat(conn, current_user.id, vehicle_id)
+            if outcome == BOOKED:
+                board_changed()
+                flash("You've been added to the ride!")
+            elif outcome == ALREADY_BOOKED:
+                flash("You already have a ride! Leave it first.")
+            elif outcome == FULL:
                 flash("This driver is at full capacity.")
             else:
-                cur.execute(f"INSERT INTO bookings (passenger_id, vehicle_id) VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER})", (current_user.id, vehicle_id))
-                conn.commit()
-                flash("You've been added to the ride!")
-    except Exception as e:
-        print(f"Join ride error: {e}")
-        flash(f"Error joining ride: {str(e)}")
-    finally:
-        release_db_connection(conn)
+                flash("Vehicle not found.")
+        except Exception as e:
+            print(f"Join ride error: {e}")
+            flash(f"Error joining ride: {str(e)}")
 
     return redirect(url_for('index'))
 
 @app.route('/leave')
 @login_required
 def leave_ride():
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db() as conn:
+        cur = conn.cursor()
 
-    try:
-        cur.execute(f"DELETE FROM bookings WHERE passenger_id = {DB_PLACEHOLDER}", (current_user.id,))
-        conn.commit()
-    except Exception as e:
-        print(f"Leave ride error: {e}")
-        flash("Error leaving ride. Please try again.")
-    finally:
-        release_db_connection(conn)
+        try:
+            cur.execute(f"DELETE FROM bookings WHERE passenger_id = {DB_PLACEHOLDER}", (current_user.id,))
+            conn.commit()
+            board_changed()
+        except Exception as e:
+            print(f"Leave ride error: {e}")
+            flash("Error leaving ride. Please try again.")
 
     return redirect(url_for('index'))
 
 # --- AUTH ROUTES (Login/Register) --- 
 
 @app.route('/register', methods=['GET', 'POST'])
+@rate_limited('register')
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -258,74 +274,92 @@ def register():
                 flash("Invalid admin password. Registration failed.")
                 return redirect(url_for('register'))
 
-        hashed = generate_password_hash(pwd)
+        hashed = hash_password(pwd)
 
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with get_db() as conn:
+            cur = conn.cursor()
 
-        try:
-            # Get driver capacity if user is a driver
-            driver_capacity = None
-            if is_driver and request.form.get('driver_capacity'):
-                driver_capacity = int(request.form['driver_capacity'])
+            try:
+                # Get driver capacity if user is a driver
+                driver_capacity = None
+                if is_driver and request.form.get('driver_capacity'):
+                    driver_capacity = int(request.form['driver_capacity'])
 
-            cur.execute(f"INSERT INTO users (username, password_hash, full_name, grade, residence, phone_number, email, is_driver, is_admin, driver_capacity) VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER})",
-                        (username, hashed, name, grade, residence, phone_number, email, is_driver, register_as_admin, driver_capacity))
-            conn.commit()
+                cur.execute(f"INSERT INTO users (username, password_hash, full_name, grade, residence, phone_number, email, is_driver, is_admin, driver_capacity) VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER})",
+                            (username, hashed, name, grade, residence, phone_number, email, is_driver, register_as_admin, driver_capacity))
+                conn.commit()
 
-            # If user is a driver and provided vehicle info, create vehicle
-            if is_driver and request.form.get('vehicle_name'):
-                vehicle_name = request.form['vehicle_name']
+                # If user is a driver and provided vehicle info, create vehicle
+                if is_driver and request.form.get('vehicle_name'):
+                    vehicle_name = request.form['vehicle_name']
 
-                # Get the newly created user's ID
-                cur.execute(f"SELECT id FROM users WHERE username = {DB_PLACEHOLDER}", (username,))
-                user_id = cur.fetchone()['id']
+                    # Get the newly created user's ID
+                    cur.execute(f"SELECT id FROM users WHERE username = {DB_PLACEHOLDER}", (username,))
+                    user_id = cur.fetchone()['id']
 
-                cur.execute(f"INSERT INTO vehicles (driver_id, vehicle_name, remember_vehicle) VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER})",
-                            (user_id, vehicle_name, False))
-                conn.commit()
+                    cur.execute(f"INSERT INTO vehicles (driver_id, vehicle_name, remember_vehicle) VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER})",
+                                (user_id, vehicle_name, False))
+                    conn.commit()
+                    board_changed()
 
-            release_db_connection(conn)
-            flash("Registration successful! Please log in.")
-            return redirect(url_for('login'))
-        except Exception as e:
-            release_db_connection(conn)
-            print(f"Registration error: {e}")  # Log the actual error
-            flash("Username taken or registration error. Please try again.")
+                flash("Registration successful! Please log in.")
+                return redirect(url_for('login'))
+            except Exception as e:
+                print(f"Registration error: {e}")  # Log the actual error
+                flash("Username taken or registration error. Please try again.")
 
     return render_template('register.html')
 
 @app.route('/login', methods=['GET', 'POST'])
+@rate_limited('login')
 def login():
     if request.method == 'POST':
         username = request.form['username']
         pwd = request.form['password']
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-
         try:
-            cur.execute(f"SELECT * FROM users WHERE username = {DB_PLACEHOLDER}", (username,))
-            user = cur.fetchone()
+            with get_db() as conn:
+                cur = conn.cursor()
+                cur.execute(f"SELECT * FROM users WHERE username = {DB_PLACEHOLDER}", (username,))
+                user = cur.fetchone()
+
+            # Checked in the password pool, without holding a database connection
+            if user and verify_password(user['password_hash'], pwd):
+                if password_hasher.needs_rehash(user['password_hash']):
+                    upgrade_password_hash(user['id'], user['password_hash'], pwd)
 
-            if user and check_password_hash(user['password_hash'], pwd):
                 # Get admin status from database
                 is_admin = user.get('is_admin', False)
 
                 user_obj = User(user['id'], user['username'], user['full_name'], user['is_driver'], is_admin)
+                User.remember(user)
                 remember = 'remember' in request.form
                 login_user(user_obj, remember=remember)
                 return redirect(url_for('index'))
             else:
                 flash("Invalid credentials")
+        except (PoolTimeout, HashingBusy):
+            raise
         except Exception as e:
             print(f"Login error: {e}")
             flash("Login error. Please try again.")
-        finally:
-            release_db_connection(conn)
 
     return render_template('login.html')
 
+def upgrade_password_hash(user_id, old_hash, password):
+    """Re-hash a password with the current PASSWORD_HASH_METHOD after a successful login (best effort)"""
+    try:
+        new_hash = hash_password(password)
+        with get_db() as conn:
+            cur = conn.cursor()
+            # Skip it if the password was changed in the meantime
+            cur.execute(f"UPDATE users SET password_hash = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER} AND password_hash = {DB_PLACEHOLDER}",
+                        (new_hash, user_id, old_hash))
+            conn.commit()
+        password_hasher.rehashed += 1
+    except Exception as e:
+        print(f"⚠️ Password rehash skipped for user {user_id}: {e}")
+
 @app.route('/logout')
 def logout():
     logout_user()
@@ -338,75 +372,80 @@ def admin_dashboard():
         flash("Admin access required.")
         return redirect(url_for('index'))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # No need to define DB_PLACEHOLDER, use 
+    # Just the shell: each section is fetched from admin_section() by the page's script
+    return render_template('admin_dashboard.html', page_size=DEFAULT_PAGE_SIZE)
+
+@app.route('/admin/api/<section>')
+@login_required
+def admin_section(section):
+    """One keyset-paginated page of a dashboard section as JSON (see admin_sections.py)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    if section not in SECTIONS:
+        return jsonify({'error': 'Unknown section'}), 404
 
     try:
-        # 1. Get Active Passengers (Keep this)
-        cur.execute("""
-            SELECT u.full_name, u.residence, u.email, d.full_name as driver_name
-            FROM users u
-            JOIN bookings b ON u.id = b.passenger_id
-            JOIN vehicles v ON b.vehicle_id = v.id
-            JOIN users d ON v.driver_id = d.id
-            ORDER BY d.full_name, u.full_name
-        """)
-        passengers = cur.fetchall()
-
-        # 2. Get Active Drivers (Keep this)
-        cur.execute("""
-            SELECT DISTINCT u.full_name, u.grade, u.phone_number
-            FROM users u
-            JOIN vehicles v ON u.id = v.driver_id
-            WHERE u.is_driver = TRUE
-            ORDER BY u.full_name
-        """)
-        drivers = cur.fetchall()
-
-        # 3. OPTIMIZED: Get "Inactive Users" instead of "All Users"
-        # We only want users who are NOT in the bookings table AND are NOT drivers with vehicles
-        # This prevents duplicate info on the screen and reduces data load.
-        cur.execute("""
-            SELECT u.full_name, u.grade, u.residence, u.phone_number, u.email 
-            FROM users u
-            LEFT JOIN bookings b ON u.id = b.passenger_id
-            LEFT JOIN vehicles v ON u.id = v.driver_id
-            WHERE b.id IS NULL        -- Not a passenger
-            AND v.id IS NULL          -- Not a driver with a vehicle
-            ORDER BY u.full_name
-        """)
-        inactive_users = cur.fetchall()
-
-        # 4. Vehicles (Keep this)
-        # ... existing vehicle query ...
-        cur.execute("""
-            SELECT
-                v.vehicle_name,
-                v.driver_id,
-                d.full_name as driver_name,
-                d.driver_capacity,
-                COUNT(b.id) as driver_occupied
-            FROM vehicles v
-            JOIN users d ON v.driver_id = d.id
-            LEFT JOIN bookings b ON b.vehicle_id = v.id
-            GROUP BY v.id, v.vehicle_name, v.driver_id, d.full_name, d.driver_capacity
-            ORDER BY d.full_name, v.vehicle_name
-        """)
-        vehicles = cur.fetchall()
-
-        # Pass 'inactive_users' instead of 'all_users'
-        return render_template('admin_dashboard.html', 
-                             passengers=passengers, 
-                             drivers=drivers, 
-                             vehicles=vehicles, 
-                             all_users=inactive_users) # Renaming it here so HTML doesn't break
+        page = fetch_page(section, request.args.get('after'), request.args.get('limit', type=int))
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    except PoolTimeout:
+        raise
     except Exception as e:
-        print(f"Admin dashboard error: {e}")
-        flash("Error loading admin dashboard.")
+        print(f"Admin section error ({section}): {e}")
+        return jsonify({'error': 'Error loading section'}), 500
+
+    response = jsonify(page)
+    # Names, phone numbers and emails - keep them out of shared and browser caches
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/admin/stats')
+@login_required
+def admin_stats():
+    """Weekly ride statistics as JSON, read from the rollup tables only (see ride_stats.py)"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+
+    try:
+        stats = load_stats(request.args.get('weeks', DEFAULT_WEEKS, type=int))
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        print(f"Admin stats error: {e}")
+        return jsonify({'error': 'Error loading statistics'}), 500
+
+    response = jsonify(stats)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/admin/export/passengers.csv')
+@login_required
+def export_passengers_csv():
+    """Booked passengers grouped by driver, streamed as CSV"""
+    if not current_user.is_admin:
+        flash("Admin access required.")
         return redirect(url_for('index'))
-    finally:
-        release_db_connection(conn)
+    return export_response(passengers_csv(passengers_by_driver()), 'text/csv; charset=utf-8',
+                           f"passengers_{export_date().isoformat()}.csv")
+
+@app.route('/admin/export/rides.pdf')
+@login_required
+def export_rides_pdf():
+    """Booked passengers grouped by driver, streamed as a PDF (replaces the in-browser jsPDF export)"""
+    if not current_user.is_admin:
+        flash("Admin access required.")
+        return redirect(url_for('index'))
+    return export_response(passengers_pdf(passengers_by_driver()), 'application/pdf',
+                           f"passengers_{export_date().isoformat()}.pdf")
+
+def export_response(chunks, mimetype, filename):
+    """Stream a generator as a download; its queries count towards this request's metrics"""
+    metrics.measure_whole_stream()
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/become_admin', methods=['POST'])
 @login_required
@@ -417,24 +456,23 @@ def become_admin():
         flash("Invalid admin password.")
         return redirect(url_for('profile'))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db() as conn:
+        cur = conn.cursor()
 
-    try:
-        # Update user's admin status in database
-        cur.execute(f"UPDATE users SET is_admin = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
-                    (True, current_user.id))
-        conn.commit()
+        try:
+            # Update user's admin status in database
+            cur.execute(f"UPDATE users SET is_admin = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
+                        (True, current_user.id))
+            conn.commit()
+            User.invalidate(current_user.id)
 
-        # Update current_user object
-        current_user.is_admin = True
+            # Update current_user object
+            current_user.is_admin = True
 
-        flash("You are now an admin!")
-    except Exception as e:
-        print(f"Become admin error: {e}")
-        flash("Error upgrading to admin. Please try again.")
-    finally:
-        release_db_connection(conn)
+            flash("You are now an admin!")
+        except Exception as e:
+            print(f"Become admin error: {e}")
+            flash("Error upgrading to admin. Please try again.")
 
     return redirect(url_for('profile'))
 
@@ -447,59 +485,57 @@ def add_vehicle():
         flash("Only drivers can add vehicles.")
         return redirect(url_for('index'))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db() as conn:
+        cur = conn.cursor()
 
-    try:
-        if request.method == 'POST':
-            vehicle_name = request.form['vehicle_name']
-            remember_vehicle = 'remember_vehicle' in request.form
+        try:
+            if request.method == 'POST':
+                vehicle_name = request.form['vehicle_name']
+                remember_vehicle = 'remember_vehicle' in request.form
 
-            cur.execute(f"INSERT INTO vehicles (driver_id, vehicle_name, remember_vehicle) VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER})",
-                        (current_user.id, vehicle_name, remember_vehicle))
-            conn.commit()
-            flash("Vehicle added successfully!")
-            return redirect(url_for('index'))
-    except Exception as e:
-        print(f"Add vehicle error: {e}")
-        flash("Error adding vehicle. Please try again.")
-    finally:
-        release_db_connection(conn)
+                cur.execute(f"INSERT INTO vehicles (driver_id, vehicle_name, remember_vehicle) VALUES ({DB_PLACEHOLDER}, {DB_PLACEHOLDER}, {DB_PLACEHOLDER})",
+                            (current_user.id, vehicle_name, remember_vehicle))
+                conn.commit()
+                board_changed()
+                flash("Vehicle added successfully!")
+                return redirect(url_for('index'))
+        except Exception as e:
+            print(f"Add vehicle error: {e}")
+            flash("Error adding vehicle. Please try again.")
 
     return render_template('add_vehicle.html')
 
 @app.route('/remove_vehicle/<int:vehicle_id>')
 @login_required
 def remove_vehicle(vehicle_id):
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db() as conn:
+        cur = conn.cursor()
 
-    try:
-        # Get vehicle info
-        cur.execute(f"SELECT driver_id FROM vehicles WHERE id = {DB_PLACEHOLDER}", (vehicle_id,))
-        vehicle = cur.fetchone()
+        try:
+            # Get vehicle info
+            cur.execute(f"SELECT driver_id FROM vehicles WHERE id = {DB_PLACEHOLDER}", (vehicle_id,))
+            vehicle = cur.fetchone()
 
-        if not vehicle:
-            flash("Vehicle not found.")
-            return redirect(url_for('index'))
+            if not vehicle:
+                flash("Vehicle not found.")
+                return redirect(url_for('index'))
 
-        # Check if user owns this vehicle or is admin
-        if vehicle['driver_id'] != current_user.id and not current_user.is_admin:
-            flash("You can only remove your own vehicle.")
-            return redirect(url_for('index'))
+            # Check if user owns this vehicle or is admin
+            if vehicle['driver_id'] != current_user.id and not current_user.is_admin:
+                flash("You can only remove your own vehicle.")
+                return redirect(url_for('index'))
 
-        # Delete all bookings for this vehicle first
-        cur.execute(f"DELETE FROM bookings WHERE vehicle_id = {DB_PLACEHOLDER}", (vehicle_id,))
+            # Delete all bookings for this vehicle first
+            cur.execute(f"DELETE FROM bookings WHERE vehicle_id = {DB_PLACEHOLDER}", (vehicle_id,))
 
-        # Delete the vehicle
-        cur.execute(f"DELETE FROM vehicles WHERE id = {DB_PLACEHOLDER}", (vehicle_id,))
-        conn.commit()
-        flash("Vehicle removed successfully!")
-    except Exception as e:
-        print(f"Remove vehicle error: {e}")
-        flash("Error removing vehicle. Please try again.")
-    finally:
-        release_db_connection(conn)
+            # Delete the vehicle
+            cur.execute(f"DELETE FROM vehicles WHERE id = {DB_PLACEHOLDER}", (vehicle_id,))
+            conn.commit()
+            board_changed()
+            flash("Vehicle removed successfully!")
+        except Exception as e:
+            print(f"Remove vehicle error: {e}")
+            flash("Error removing vehicle. Please try again.")
 
     return redirect(url_for('index'))
 
@@ -511,19 +547,18 @@ def remove_passenger(vehicle_id, passenger_id):
         flash("You don't have permission to remove this passenger.")
         return redirect(url_for('index'))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db() as conn:
+        cur = conn.cursor()
 
-    try:
-        cur.execute(f"DELETE FROM bookings WHERE passenger_id = {DB_PLACEHOLDER} AND vehicle_id = {DB_PLACEHOLDER}",
-                    (passenger_id, vehicle_id))
-        conn.commit()
-        flash("Passenger removed successfully!")
-    except Exception as e:
-        print(f"Remove passenger error: {e}")
-        flash("Error removing passenger. Please try again.")
-    finally:
-        release_db_connection(conn)
+        try:
+            cur.execute(f"DELETE FROM bookings WHERE passenger_id = {DB_PLACEHOLDER} AND vehicle_id = {DB_PLACEHOLDER}",
+                        (passenger_id, vehicle_id))
+            conn.commit()
+            board_changed()
+            flash("Passenger removed successfully!")
+        except Exception as e:
+            print(f"Remove passenger error: {e}")
+            flash("Error removing passenger. Please try again.")
 
     return redirect(url_for('index'))
 
@@ -537,28 +572,27 @@ def upgrade_to_driver():
         return redirect(url_for('index'))
 
     if request.method == 'POST':
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with get_db() as conn:
+            cur = conn.cursor()
 
-        try:
-            # Get driver capacity from form
-            driver_capacity = int(request.form.get('driver_capacity', 0))
+            try:
+                # Get driver capacity from form
+                driver_capacity = int(request.form.get('driver_capacity', 0))
 
-            # Update user to driver
-            cur.execute(f"UPDATE users SET is_driver = {DB_PLACEHOLDER}, driver_capacity = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
-                        (True, driver_capacity, current_user.id))
-            conn.commit()
+                # Update user to driver
+                cur.execute(f"UPDATE users SET is_driver = {DB_PLACEHOLDER}, driver_capacity = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
+                            (True, driver_capacity, current_user.id))
+                conn.commit()
+                User.invalidate(current_user.id)
 
-            # Update current_user object
-            current_user.is_driver = True
+                # Update current_user object
+                current_user.is_driver = True
 
-            flash("You are now a driver! You can add your vehicle.")
-            return redirect(url_for('add_vehicle'))
-        except Exception as e:
-            print(f"Upgrade to driver error: {e}")
-            flash("Error upgrading account. Please try again.")
-        finally:
-            release_db_connection(conn)
+                flash("You are now a driver! You can add your vehicle.")
+                return redirect(url_for('add_vehicle'))
+            except Exception as e:
+                print(f"Upgrade to driver error: {e}")
+                flash("Error upgrading account. Please try again.")
 
     return render_template('upgrade_to_driver.html')
 
@@ -569,112 +603,118 @@ def downgrade_to_passenger():
         flash("You are already a passenger.")
         return redirect(url_for('index'))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db() as conn:
+        cur = conn.cursor()
 
-    try:
-        # First, find and delete any vehicle owned by this driver
-        cur.execute(f"SELECT id FROM vehicles WHERE driver_id = {DB_PLACEHOLDER}", (current_user.id,))
-        vehicle = cur.fetchone()
+        try:
+            # First, find and delete any vehicle owned by this driver
+            cur.execute(f"SELECT id FROM vehicles WHERE driver_id = {DB_PLACEHOLDER}", (current_user.id,))
+            vehicle = cur.fetchone()
 
-        if vehicle:
-            # Delete all bookings for this vehicle
-            cur.execute(f"DELETE FROM bookings WHERE vehicle_id = {DB_PLACEHOLDER}", (vehicle['id'],))
-            # Delete the vehicle
-            cur.execute(f"DELETE FROM vehicles WHERE id = {DB_PLACEHOLDER}", (vehicle['id'],))
+            if vehicle:
+                # Delete all bookings for this vehicle
+                cur.execute(f"DELETE FROM bookings WHERE vehicle_id = {DB_PLACEHOLDER}", (vehicle['id'],))
+                # Delete the vehicle
+                cur.execute(f"DELETE FROM vehicles WHERE id = {DB_PLACEHOLDER}", (vehicle['id'],))
 
-        # Update user to passenger
-        cur.execute(f"UPDATE users SET is_driver = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
-                    (False, current_user.id))
-        conn.commit()
+            # Update user to passenger
+            cur.execute(f"UPDATE users SET is_driver = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
+                        (False, current_user.id))
+            conn.commit()
+            board_changed()
+            User.invalidate(current_user.id)
 
-        # Update current_user object
-        current_user.is_driver = False
+            # Update current_user object
+            current_user.is_driver = False
 
-        flash("You are now a passenger. Your vehicle has been removed.")
-    except Exception as e:
-        print(f"Downgrade to passenger error: {e}")
-        flash("Error changing account status. Please try again.")
-    finally:
-        release_db_connection(conn)
+            flash("You are now a passenger. Your vehicle has been removed.")
+        except Exception as e:
+            print(f"Downgrade to passenger error: {e}")
+            flash("Error changing account status. Please try again.")
 
     return redirect(url_for('index'))
 
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
-    conn = get_db_connection()
-    cur = conn.cursor()
+    # Hash a new password before taking a database connection
+    new_password_hash = None
+    if request.method == 'POST' and request.form.get('password', '').strip():
+        new_password_hash = hash_password(request.form['password'].strip())
 
-    if request.method == 'POST':
-        full_name = request.form['full_name']
-        username = request.form['username']
-        grade = request.form['grade']
-        residence = request.form['residence']
-        phone_number = request.form.get('phone_number', '').strip() or None
-        email = request.form.get('email', '').strip() or None
-        password = request.form.get('password', '').strip()
+    with get_db() as conn:
+        cur = conn.cursor()
 
+        if request.method == 'POST':
+            full_name = request.form['full_name']
+            username = request.form['username']
+            grade = request.form['grade']
+            residence = request.form['residence']
+            phone_number = request.form.get('phone_number', '').strip() or None
+            email = request.form.get('email', '').strip() or None
+            password = request.form.get('password', '').strip()
+
+            try:
+                # Update user information including driver capacity
+                driver_capacity = None
+                if current_user.is_driver and request.form.get('driver_capacity'):
+                    driver_capacity = int(request.form['driver_capacity'])
+
+                # Check if password is being updated
+                if password:
+                    # Update with new password
+                    hashed = new_password_hash
+                    cur.execute(f"UPDATE users SET full_name = {DB_PLACEHOLDER}, username = {DB_PLACEHOLDER}, grade = {DB_PLACEHOLDER}, residence = {DB_PLACEHOLDER}, phone_number = {DB_PLACEHOLDER}, email = {DB_PLACEHOLDER}, driver_capacity = {DB_PLACEHOLDER}, password_hash = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
+                                (full_name, username, grade, residence, phone_number, email, driver_capacity, hashed, current_user.id))
+                else:
+                    # Update without changing password
+                    cur.execute(f"UPDATE users SET full_name = {DB_PLACEHOLDER}, username = {DB_PLACEHOLDER}, grade = {DB_PLACEHOLDER}, residence = {DB_PLACEHOLDER}, phone_number = {DB_PLACEHOLDER}, email = {DB_PLACEHOLDER}, driver_capacity = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
+                                (full_name, username, grade, residence, phone_number, email, driver_capacity, current_user.id))
+                conn.commit()
+
+                # Update all vehicles if user is a driver
+                if current_user.is_driver:
+                    # Get all vehicle IDs and their updates from the form
+                    for key in request.form:
+                        if key.startswith('vehicle_name_'):
+                            vehicle_id = int(key.split('_')[-1])
+                            vehicle_name = request.form[f'vehicle_name_{vehicle_id}']
+                            remember_vehicle = f'remember_vehicle_{vehicle_id}' in request.form
+
+                            cur.execute(f"UPDATE vehicles SET vehicle_name = {DB_PLACEHOLDER}, remember_vehicle = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER} AND driver_id = {DB_PLACEHOLDER}",
+                                        (vehicle_name, remember_vehicle, vehicle_id, current_user.id))
+                    conn.commit()
+
+                # Names and capacity are shown on the ride board
+                board_changed()
+                User.invalidate(current_user.id)
+
+                # Update current_user object
+                current_user.full_name = full_name
+                current_user.username = username
+
+                flash("Profile updated successfully!")
+                return redirect(url_for('profile'))
+            except Exception as e:
+                conn.rollback()
+                print(f"Profile update error: {e}")
+                flash("Error updating profile. Username may already be taken.")
+
+        # GET request (or failed POST) - fetch user data
         try:
-            # Update user information including driver capacity
-            driver_capacity = None
-            if current_user.is_driver and request.form.get('driver_capacity'):
-                driver_capacity = int(request.form['driver_capacity'])
-
-            # Check if password is being updated
-            if password:
-                # Update with new password
-                hashed = generate_password_hash(password)
-                cur.execute(f"UPDATE users SET full_name = {DB_PLACEHOLDER}, username = {DB_PLACEHOLDER}, grade = {DB_PLACEHOLDER}, residence = {DB_PLACEHOLDER}, phone_number = {DB_PLACEHOLDER}, email = {DB_PLACEHOLDER}, driver_capacity = {DB_PLACEHOLDER}, password_hash = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
-                            (full_name, username, grade, residence, phone_number, email, driver_capacity, hashed, current_user.id))
-            else:
-                # Update without changing password
-                cur.execute(f"UPDATE users SET full_name = {DB_PLACEHOLDER}, username = {DB_PLACEHOLDER}, grade = {DB_PLACEHOLDER}, residence = {DB_PLACEHOLDER}, phone_number = {DB_PLACEHOLDER}, email = {DB_PLACEHOLDER}, driver_capacity = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
-                            (full_name, username, grade, residence, phone_number, email, driver_capacity, current_user.id))
-            conn.commit()
+            cur.execute(f"SELECT username, grade, residence, phone_number, email, driver_capacity FROM users WHERE id = {DB_PLACEHOLDER}", (current_user.id,))
+            user_data = cur.fetchone()
 
-            # Update all vehicles if user is a driver
+            vehicles_data = []
             if current_user.is_driver:
-                # Get all vehicle IDs and their updates from the form
-                for key in request.form:
-                    if key.startswith('vehicle_name_'):
-                        vehicle_id = int(key.split('_')[-1])
-                        vehicle_name = request.form[f'vehicle_name_{vehicle_id}']
-                        remember_vehicle = f'remember_vehicle_{vehicle_id}' in request.form
-
-                        cur.execute(f"UPDATE vehicles SET vehicle_name = {DB_PLACEHOLDER}, remember_vehicle = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER} AND driver_id = {DB_PLACEHOLDER}",
-                                    (vehicle_name, remember_vehicle, vehicle_id, current_user.id))
-                conn.commit()
-
-            # Update current_user object
-            current_user.full_name = full_name
-            current_user.username = username
+                cur.execute(f"SELECT id, vehicle_name, remember_vehicle FROM vehicles WHERE driver_id = {DB_PLACEHOLDER}", (current_user.id,))
+                vehicles_data = cur.fetchall()
 
-            flash("Profile updated successfully!")
-            return redirect(url_for('profile'))
+            return render_template('profile.html', user_data=user_data, vehicles_data=vehicles_data)
         except Exception as e:
-            print(f"Profile update error: {e}")
-            flash("Error updating profile. Username may already be taken.")
-        finally:
-            release_db_connection(conn)
-
-    # GET request - fetch user data
-    try:
-        cur.execute(f"SELECT username, grade, residence, phone_number, email, driver_capacity FROM users WHERE id = {DB_PLACEHOLDER}", (current_user.id,))
-        user_data = cur.fetchone()
-
-        vehicles_data = []
-        if current_user.is_driver:
-            cur.execute(f"SELECT id, vehicle_name, remember_vehicle FROM vehicles WHERE driver_id = {DB_PLACEHOLDER}", (current_user.id,))
-            vehicles_data = cur.fetchall()
-
-        return render_template('profile.html', user_data=user_data, vehicles_data=vehicles_data)
-    except Exception as e:
-        print(f"Profile load error: {e}")
-        flash("Error loading profile.")
-        return redirect(url_for('index'))
-    finally:
-        release_db_connection(conn)
+            print(f"Profile load error: {e}")
+            flash("Error loading profile.")
+            return redirect(url_for('index'))
 
 @app.route('/demote_admin', methods=['POST'])
 @login_required
@@ -683,29 +723,29 @@ def demote_admin():
         flash("You are not an admin.")
         return redirect(url_for('index'))
 
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db() as conn:
+        cur = conn.cursor()
 
-    try:
-        # Update user to non-admin
-        cur.execute(f"UPDATE users SET is_admin = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
-                    (False, current_user.id))
-        conn.commit()
+        try:
+            # Update user to non-admin
+            cur.execute(f"UPDATE users SET is_admin = {DB_PLACEHOLDER} WHERE id = {DB_PLACEHOLDER}",
+                        (False, current_user.id))
+            conn.commit()
+            User.invalidate(current_user.id)
 
-        # Update current_user object
-        current_user.is_admin = False
+            # Update current_user object
+            current_user.is_admin = False
 
-        flash("Admin privileges removed.")
-    except Exception as e:
-        print(f"Demote admin error: {e}")
-        flash("Error removing admin privileges. Please try again.")
-    finally:
-        release_db_connection(conn)
+            flash("Admin privileges removed.")
+        except Exception as e:
+            print(f"Demote admin error: {e}")
+            flash("Error removing admin privileges. Please try again.")
 
     return redirect(url_for('index'))
 
 @app.route('/delete_account', methods=['POST'])
 @login_required
+@rate_limited('delete_account')
 def delete_account():
     """Delete user account and all associated data"""
     confirm_username = request.form.get('confirm_username', '').strip()
@@ -716,54 +756,50 @@ def delete_account():
         flash("Username does not match. Account deletion cancelled.")
         return redirect(url_for('profile'))
 
-    # Verify password is correct
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        # Get user's password hash
+    # Verify password is correct (checked without holding a database connection)
+    with get_db() as conn:
+        cur = conn.cursor()
         cur.execute(f"SELECT password_hash FROM users WHERE id = {DB_PLACEHOLDER}", (current_user.id,))
         user_row = cur.fetchone()
 
-        if not user_row or not check_password_hash(user_row['password_hash'], confirm_password):
-            flash("Incorrect password. Account deletion cancelled.")
-            return redirect(url_for('profile'))
+    if not user_row or not verify_password(user_row['password_hash'], confirm_password):
+        flash("Incorrect password. Account deletion cancelled.")
+        return redirect(url_for('profile'))
 
-        # Delete all bookings where user is a passenger
-        cur.execute(f"DELETE FROM bookings WHERE passenger_id = {DB_PLACEHOLDER}", (current_user.id,))
+    with get_db() as conn:
+        cur = conn.cursor()
 
-        # If user is a driver, remove all passengers from their vehicles and delete vehicles
-        if current_user.is_driver:
-            # Get all vehicle IDs for this driver
-            cur.execute(f"SELECT id FROM vehicles WHERE driver_id = {DB_PLACEHOLDER}", (current_user.id,))
-            vehicle_rows = cur.fetchall()
+        try:
+            # Delete all bookings where user is a passenger
+            cur.execute(f"DELETE FROM bookings WHERE passenger_id = {DB_PLACEHOLDER}", (current_user.id,))
 
-            for vehicle_row in vehicle_rows:
-                vehicle_id = vehicle_row['id']
-                # Delete all bookings for this vehicle
-                cur.execute(f"DELETE FROM bookings WHERE vehicle_id = {DB_PLACEHOLDER}", (vehicle_id,))
+            # If user is a driver, remove all passengers from their vehicles and delete vehicles
+            if current_user.is_driver:
+                # Delete the bookings on every vehicle of this driver in one statement
+                cur.execute(f"DELETE FROM bookings WHERE vehicle_id IN (SELECT id FROM vehicles WHERE driver_id = {DB_PLACEHOLDER})",
+                            (current_user.id,))
 
-            # Delete all vehicles owned by this user
-            cur.execute(f"DELETE FROM vehicles WHERE driver_id = {DB_PLACEHOLDER}", (current_user.id,))
+                # Delete all vehicles owned by this user
+                cur.execute(f"DELETE FROM vehicles WHERE driver_id = {DB_PLACEHOLDER}", (current_user.id,))
 
-        # Finally, delete the user account
-        cur.execute(f"DELETE FROM users WHERE id = {DB_PLACEHOLDER}", (current_user.id,))
+            # Finally, delete the user account
+            cur.execute(f"DELETE FROM users WHERE id = {DB_PLACEHOLDER}", (current_user.id,))
 
-        conn.commit()
+            conn.commit()
+            board_changed()
+            User.invalidate(current_user.id)
 
-        # Log the user out
-        logout_user()
+            # Log the user out
+            logout_user()
 
-        flash("Your account has been permanently deleted. We're sorry to see you go.")
-        return redirect(url_for('index'))
+            flash("Your account has been permanently deleted. We're sorry to see you go.")
+            return redirect(url_for('index'))
 
-    except Exception as e:
-        conn.rollback()
-        print(f"Delete account error: {e}")
-        flash("An error occurred while deleting your account. Please try again or contact support.")
-        return redirect(url_for('profile'))
-    finally:
-        release_db_connection(conn)
+        except Exception as e:
+            conn.rollback()
+            print(f"Delete account error: {e}")
+            flash("An error occurred while deleting your account. Please try again or contact support.")
+            return redirect(url_for('profile'))
 
 # --- SECURITY & SEO ROUTES ---
 
@@ -779,14 +815,81 @@ def security_txt():
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint for monitoring services"""
-    return {'status': 'healthy', 'service': 'church-rides'}, 200
+    """Liveness check for monitoring services; admins and METRICS_TOKEN holders also get the internals"""
+    status = {'status': 'healthy', 'service': 'church-rides'}
+    if not metrics.authorized(current_user):
+        return status, 200
+    return {**status, 'board_cache': board_cache.stats(), 'board_cards': card_cache.stats(), 'user_cache': user_cache.stats(), 'db_pool': pool_stats(), 'live': broadcaster.stats(), 'snapshot': snapshot_writer.stats(), 'passwords': password_hasher.stats(), 'rate_limits': limiter.stats(), 'startup': startup.startup_timeline.stats()}, 200
+
+@app.route('/ready')
+def readiness_check():
+    """Readiness probe: 200 only if the database answers (the watchdog checks it next to /health)"""
+    try:
+        with get_db() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+    except Exception as e:
+        print(f"Readiness check failed: {e}")
+        return {'status': 'unavailable', 'database': 'error'}, 503, {'Cache-Control': 'no-store'}
+    return {'status': 'ready', 'database': 'ok'}, 200, {'Cache-Control': 'no-store'}
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target (admin session or METRICS_TOKEN, see metrics.py)"""
+    if not metrics.authorized(current_user):
+        return "Forbidden", 403
+
+    pool = pool_stats() or {}
+    gauges = [
+        ('db_pool_connections', 'Pooled PostgreSQL connections by state.',
+         [({'state': state}, pool[state]) for state in ('in_use', 'idle', 'waiting') if state in pool]),
+        ('db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection.',
+         [({}, pool['timeouts'])] if pool else [], 'counter'),
+        ('board_cache_version', 'Current ride board version.', [({}, board_cache.version)]),
+        ('board_cache_lookups_total', 'Board cache lookups by result.',
+         [({'result': 'hit'}, board_cache.hits), ({'result': 'miss'}, board_cache.misses)], 'counter'),
+        ('live_subscribers', 'Open /stream/rides connections.', [({}, broadcaster.subscriber_count)]),
+        ('startup_seconds', 'Seconds from process start to each start-up stage.',
+         [({'stage': stage}, startup.startup_timeline.seconds(stage))
+          for stage in ('imported', 'warmed_up', 'first_byte') if startup.startup_timeline.seconds(stage) is not None]),
+    ]
+    return metrics.render(gauges), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/api/ride_snapshot')
+def ride_snapshot():
+    """
+    The offline ride snapshot (gzip JSON, see snapshot.py) for a watchdog that can't read our disk.
+
+    Same access as /metrics. Served from the file without touching the
+    database, so it still works while the database is down; only a missing
+    file (snapshots on, nothing written since start-up) is written first.
+    """
+    if not metrics.authorized(current_user):
+        return "Forbidden", 403
+    path = snapshot_writer.path
+    if not path:
+        return "Snapshots are off (RIDE_SNAPSHOT_PATH is empty)", 404
+    path = os.path.abspath(path)
+    if not os.path.exists(path):
+        try:
+            snapshot_writer.write_now(board_cache.version)
+        except Exception as e:
+            print(f"⚠️ Ride snapshot write failed: {e}")
+            return "No ride snapshot available", 503, {'Retry-After': '60'}
+    # Names and phone numbers: never let a proxy or browser keep a copy
+    response = send_file(path, mimetype='application/gzip', conditional=False, etag=False, max_age=0)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/privacy')
 def privacy():
     """Privacy policy page - establishes trust with users and antivirus"""
     return render_template('privacy.html')
 
+# Last, so 'imported' covers the whole module
+startup.init_app(app)
+
 if __name__ == '__main__':
     # DB already initialized at module level (line 18)
     # No need to initialize again here
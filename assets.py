@@ -0,0 +1,315 @@
+"""
+Static assets: vendored libraries, fingerprinted URLs, long-lived caching and
+compression.
+
+static_url(filename) works like url_for('static', filename=...), but the URL
+carries a hash of the file's content:
+
+    static_url('vendor/bootstrap.min.css') -> /assets/vendor/bootstrap.min.3f2a9c1b7d.css
+
+A fingerprinted URL always means the same bytes, so it is served with a
+year's max-age and `immutable`. Browsers never revalidate it, and a deploy that
+changes the file changes the URL. Plain /static/... URLs still work and are
+cached for STATIC_MAX_AGE seconds.
+
+Third-party libraries (VENDOR) are served from static/vendor/ instead of a
+CDN, so the first page doesn't wait on another DNS lookup and TLS handshake.
+`python -m assets` downloads them (or `--from DIR` copies them from an
+unpacked bootstrap-5.3.0-dist), checking each against its Subresource
+Integrity hash. It also writes a .gz copy, and a .br copy when the Brotli
+package is installed, next to every compressible file in static/. Commit the
+results. A library that is missing from static/vendor/, or whose bytes don't
+match its hash, is served from its CDN URL instead, and cdn_integrity() adds
+the SRI attributes that make the browser refuse a CDN copy with different
+bytes.
+
+A fingerprinted file goes out as its .br or .gz copy when the client accepts
+that encoding. Without a .gz copy, the file is gzipped once in memory.
+HTML responses of GZIP_MIN_BYTES or more are gzipped on the fly at GZIP_LEVEL.
+"""
+import base64
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import namedtuple
+
+from flask import Response, abort, request, send_from_directory, url_for
+from markupsafe import Markup
+
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', '3600'))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', '1024'))
+# Level 3 gets within ~15% of level 6's size at about a third of the CPU time
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '3'))
+
+Vendored = namedtuple('Vendored', 'url integrity')
+
+# static/ path -> where it came from (and is served from until `python -m assets` has fetched it),
+# with the SRI hash Bootstrap publishes for it
+VENDOR = {
+    'vendor/bootstrap.min.css': Vendored(
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+        'sha384-9ndCyUaIbzAi2FUVXJi0CjmCapSmO7SnpJef0486qhLnuZ2cdeRhO02iuK6FUUVM'),
+    'vendor/bootstrap.bundle.min.js': Vendored(
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+        'sha384-geWF76RCwLtnZ8qwWowPQNguL3RmwHVBC9FhGdlKrxdiJJigb/j/68SIy3Te4Bkz'),
+}
+
+COMPRESSIBLE_TYPES = ('application/javascript', 'application/json', 'image/svg+xml', 'image/vnd.microsoft.icon')
+COMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def is_compressible(filename):
+    mimetype = mimetypes.guess_type(filename)[0] or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+def sri_hash(body):
+    """Subresource Integrity value for body ('sha384-<base64 digest>')"""
+    return 'sha384-' + base64.b64encode(hashlib.sha384(body).digest()).decode()
+
+
+def fingerprint(path):
+    """First 10 hex digits of the file's SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:10]
+
+
+class AssetManifest:
+    """Fingerprinted names for the files in a static folder, worked out once at start-up"""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.urls = {}          # filename -> fingerprinted filename
+        self.files = {}         # fingerprinted filename -> filename
+        self._gzipped = {}      # filename -> bytes, for files without a .gz copy
+        self._lock = threading.Lock()
+        for root, _, names in os.walk(static_folder):
+            for name in names:
+                if name.endswith(tuple(COMPRESSED_SUFFIXES.values())):
+                    continue
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                stem, ext = os.path.splitext(filename)
+                fingerprinted = f"{stem}.{fingerprint(path)}{ext}"
+                self.urls[filename] = fingerprinted
+                self.files[fingerprinted] = filename
+
+    def gzipped(self, filename):
+        """The file gzipped, compressed on first use and kept"""
+        body = self._gzipped.get(filename)
+        if body is None:
+            with open(os.path.join(self.static_folder, filename), 'rb') as f:
+                body = gzip.compress(f.read(), 9, mtime=0)
+            with self._lock:
+                self._gzipped[filename] = body
+        return body
+
+
+manifest = None
+
+
+def static_url(filename, **values):
+    """
+    url_for('static', filename=...) with the content hash in the filename.
+
+    Falls back to the CDN for a vendored library that hasn't been downloaded,
+    and to the plain /static/ URL for a file the manifest doesn't know.
+
+    Args:
+        filename: Path inside static/
+        **values: Passed on to url_for (e.g. _external=True)
+
+    Returns:
+        str: URL
+    """
+    if manifest is not None and filename in manifest.urls:
+        return url_for('asset', filename=manifest.urls[filename], **values)
+    if filename in VENDOR:
+        return VENDOR[filename].url
+    return url_for('static', filename=filename, **values)
+
+
+def cdn_integrity(filename):
+    """
+    integrity/crossorigin attributes for a tag whose static_url() is a CDN URL.
+
+    Empty once the file is served from static/.
+
+    Returns:
+        Markup: ' integrity="..." crossorigin="anonymous"' or ''
+    """
+    if filename in VENDOR and (manifest is None or filename not in manifest.urls):
+        return Markup(' integrity="%s" crossorigin="anonymous"') % VENDOR[filename].integrity
+    return Markup('')
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def serve_asset(filename):
+    """A fingerprinted file, precompressed where the client allows it"""
+    original = manifest.files.get(filename)
+    if original is None:
+        abort(404)
+    if is_compressible(original):
+        response = None
+        for encoding, suffix in COMPRESSED_SUFFIXES.items():
+            if _accepts(encoding) and os.path.exists(os.path.join(manifest.static_folder, original + suffix)):
+                response = send_from_directory(manifest.static_folder, original + suffix,
+                                               mimetype=mimetypes.guess_type(original)[0],
+                                               download_name=os.path.basename(original),
+                                               max_age=IMMUTABLE_MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            if _accepts('gzip') and os.path.getsize(os.path.join(manifest.static_folder, original)) >= GZIP_MIN_BYTES:
+                response = Response(manifest.gzipped(original), mimetype=mimetypes.guess_type(original)[0])
+                response.headers['Content-Encoding'] = 'gzip'
+        if response is None:
+            response = send_from_directory(manifest.static_folder, original, max_age=IMMUTABLE_MAX_AGE)
+        response.vary.add('Accept-Encoding')
+    else:
+        response = send_from_directory(manifest.static_folder, original, max_age=IMMUTABLE_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
+
+
+def compress_html(response):
+    """after_request: gzip HTML pages of GZIP_MIN_BYTES or more for clients that accept it"""
+    if (response.mimetype != 'text/html' or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.content_length is None or response.content_length < GZIP_MIN_BYTES or not _accepts('gzip'):
+        return response
+    response.set_data(gzip.compress(response.get_data(), GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def verify_vendored(manifest):
+    """
+    Drop vendored files whose bytes don't match their SRI hash from the manifest.
+
+    Returns:
+        tuple: (missing, mismatched) lists of VENDOR filenames, both served from the CDN
+    """
+    missing, mismatched = [], []
+    for filename, vendored in VENDOR.items():
+        if filename not in manifest.urls:
+            missing.append(filename)
+            continue
+        with open(os.path.join(manifest.static_folder, filename), 'rb') as f:
+            if sri_hash(f.read()) == vendored.integrity:
+                continue
+        mismatched.append(filename)
+        del manifest.files[manifest.urls.pop(filename)]
+    return missing, mismatched
+
+
+def init_app(app):
+    """
+    Build the manifest and register /assets/, static_url and HTML compression.
+
+    Call right after metrics.init_app: after_request hooks run in reverse
+    order, so compress_html then runs after every hook that might still
+    change the body.
+    """
+    global manifest
+    manifest = AssetManifest(app.static_folder)
+    missing, mismatched = verify_vendored(manifest)
+    if missing:
+        print(f"⚠️ Not vendored yet, serving from the CDN: {', '.join(missing)} (run python -m assets)")
+    if mismatched:
+        print(f"⚠️ Doesn't match its SRI hash, serving from the CDN: {', '.join(mismatched)} (run python -m assets)")
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = STATIC_MAX_AGE
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.add_template_global(static_url)
+    app.add_template_global(cdn_integrity)
+    app.after_request(compress_html)
+
+
+def _fetch(vendored, path, source_dir=None):
+    """
+    Fetch a vendored file (from its CDN URL, or by name from source_dir) and write it to path.
+
+    Raises:
+        OSError: Download failed or the file isn't in source_dir
+        ValueError: The bytes fail the SRI check; nothing is written
+    """
+    if source_dir is None:
+        import urllib.request
+        with urllib.request.urlopen(vendored.url, timeout=30) as source:
+            body = source.read()
+    else:
+        # bootstrap-5.3.0-dist keeps them in css/ and js/
+        name = os.path.basename(path)
+        found = [os.path.join(root, name) for root, _, names in os.walk(source_dir) if name in names]
+        if not found:
+            raise FileNotFoundError(f"no {name} under {source_dir}")
+        with open(found[0], 'rb') as f:
+            body = f.read()
+    if sri_hash(body) != vendored.integrity:
+        raise ValueError(f"got {sri_hash(body)}, expected {vendored.integrity}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(body)
+    return body
+
+
+def _precompress(static_folder):
+    """Write .gz (and .br if Brotli is installed) next to each compressible file; returns the paths"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print("⚠️ Brotli isn't installed (pip install Brotli); writing .gz only")
+    written = []
+    for root, _, names in os.walk(static_folder):
+        for name in names:
+            path = os.path.join(root, name)
+            if name.endswith(tuple(COMPRESSED_SUFFIXES.values())) or not is_compressible(name):
+                continue
+            with open(path, 'rb') as f:
+                body = f.read()
+            if len(body) < GZIP_MIN_BYTES:
+                continue
+            copies = [('.gz', gzip.compress(body, 9, mtime=0))]
+            if brotli is not None:
+                copies.append(('.br', brotli.compress(body, quality=11)))
+            for suffix, compressed in copies:
+                if len(compressed) < len(body):
+                    with open(path + suffix, 'wb') as f:
+                        f.write(compressed)
+                    written.append(path + suffix)
+    return written
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--from', dest='source_dir', help='copy VENDOR files from this directory instead of the CDN')
+    args = parser.parse_args()
+
+    static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    for filename, vendored in VENDOR.items():
+        path = os.path.join(static_folder, filename)
+        try:
+            body = _fetch(vendored, path, args.source_dir)
+        except (OSError, ValueError) as e:
+            print(f"❌ {filename}: {e}")
+            continue
+        print(f"✅ {filename}: {len(body):,} bytes, {vendored.integrity}")
+    for path in _precompress(static_folder):
+        print(f"🗜️ {os.path.relpath(path, static_folder)}: {os.path.getsize(path):,} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+"""
+Benchmarks and stress scripts. Run them from the repository root, e.g.
+
+    python -m benchmarks.booking_stress
+"""
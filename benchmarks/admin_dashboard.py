@@ -0,0 +1,105 @@
+"""
+Time the admin dashboard: the page itself and each section endpoint.
+
+Seeds a scratch database, logs in as a seeded admin through the Flask test
+client and reports the median of --repeat runs for:
+  - GET /admin_dashboard
+  - the first page of every /admin/api/<section>, cold (section cache cleared)
+    and warm
+  - all first pages fetched in parallel, cold - what a browser waits for
+    before the dashboard is filled in
+
+Section endpoints that don't exist (older checkouts) are skipped, so the same
+script gives the before/after numbers.
+
+    python -m benchmarks.admin_dashboard --users 5000 --vehicles 300
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.pop('DATABASE_URL', None)
+SCRATCH = tempfile.mkdtemp()
+os.environ.setdefault('SQLITE_PATH', os.path.join(SCRATCH, 'admin_bench.db'))
+os.environ.setdefault('RIDE_SNAPSHOT_PATH', os.path.join(SCRATCH, 'ride_snapshot.json.gz'))
+
+import db
+from benchmarks.seed import seed, seeded_usernames, PASSWORD
+
+SECTIONS = ('passengers', 'emails', 'drivers', 'vehicles', 'inactive')
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--vehicles', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_db() as conn:
+        seed(conn, users=args.users, vehicles=args.vehicles, admins=1)
+
+    from app import app
+    try:
+        from admin_sections import section_cache
+    except ImportError:
+        section_cache = None
+
+    admin = seeded_usernames(args.users, args.vehicles, admins=1)['admins'][0]
+    clients = []
+    for _ in range(len(SECTIONS)):
+        client = app.test_client()
+        client.post('/login', data={'username': admin, 'password': PASSWORD})
+        clients.append(client)
+    client = clients[0]
+
+    def get(url, c=client):
+        response = c.get(url)
+        assert response.status_code == 200, f"{url}: HTTP {response.status_code}"
+        return response
+
+    results = []
+    page = get('/admin_dashboard')
+    results.append(('GET /admin_dashboard', median_ms(lambda: get('/admin_dashboard'), args.repeat),
+                    f"{len(page.data) / 1024:.0f} KB"))
+
+    if section_cache is not None:
+        for name in SECTIONS:
+            url = f'/admin/api/{name}'
+            size = f"{len(get(url).data) / 1024:.0f} KB"
+
+            def cold():
+                section_cache.clear()
+                get(url)
+            results.append((f'{url} (cold)', median_ms(cold, args.repeat), size))
+            results.append((f'{url} (warm)', median_ms(lambda: get(url), args.repeat), size))
+
+        pool = ThreadPoolExecutor(max_workers=len(SECTIONS))
+
+        def all_sections():
+            section_cache.clear()
+            list(pool.map(lambda pair: get(f'/admin/api/{pair[0]}', pair[1]), zip(SECTIONS, clients)))
+        results.append(('all sections in parallel (cold)', median_ms(all_sections, args.repeat), ''))
+        pool.shutdown()
+
+    print(f"\n{args.users} users, {args.vehicles} vehicles, median of {args.repeat} runs")
+    print(f"{'request':<36} {'ms':>8}  size")
+    for label, ms, size in results:
+        print(f"{label:<36} {ms:>8.2f}  {size}")
+
+
+if __name__ == '__main__':
+    main()
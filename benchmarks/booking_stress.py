@@ -0,0 +1,149 @@
+"""
+Concurrent booking stress test for rides.book_seat().
+
+Many passengers hit the same few drivers at the same moment (all threads are
+released together by a barrier). Afterwards every driver's booking count must
+be <= driver_capacity and must match the number of BOOKED outcomes.
+
+    python -m benchmarks.booking_stress                 # scratch SQLite file
+    DATABASE_URL=postgres://... python -m benchmarks.booking_stress --keep
+
+Against PostgreSQL point DATABASE_URL at a scratch database: rows are inserted
+with a 'stress_' username prefix and removed afterwards unless --keep is given.
+tests/test_booking.py runs the same check under pytest (and in CI, on both
+databases).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'stress.db'))
+
+from db import get_db, get_db_connection, release_db_connection, init_db
+from rides import book_seat, BOOKED
+
+
+def seed(drivers, capacity, passengers):
+    is_postgres = os.environ.get('DATABASE_URL') is not None
+    ph = "%s" if is_postgres else "?"
+    conn = get_db_connection()
+    cur = conn.cursor()
+    driver_vehicles = {}
+    for d in range(drivers):
+        cur.execute(f"INSERT INTO users (username, password_hash, full_name, is_driver, driver_capacity) VALUES ({ph}, 'x', {ph}, {ph}, {ph})",
+                    (f'stress_driver_{d}', f'Driver {d}', True, capacity))
+        cur.execute(f"SELECT id FROM users WHERE username = {ph}", (f'stress_driver_{d}',))
+        driver_id = cur.fetchone()['id']
+        # Two pickup locations per driver so capacity is shared across vehicles
+        vehicle_ids = []
+        for v in range(2):
+            cur.execute(f"INSERT INTO vehicles (driver_id, vehicle_name) VALUES ({ph}, {ph})", (driver_id, f'Stop {d}-{v}'))
+            cur.execute(f"SELECT MAX(id) as id FROM vehicles WHERE driver_id = {ph}", (driver_id,))
+            vehicle_ids.append(cur.fetchone()['id'])
+        driver_vehicles[driver_id] = vehicle_ids
+    passenger_ids = []
+    for p in range(passengers):
+        cur.execute(f"INSERT INTO users (username, password_hash, full_name) VALUES ({ph}, 'x', {ph})",
+                    (f'stress_passenger_{p}', f'Passenger {p}'))
+        cur.execute(f"SELECT id FROM users WHERE username = {ph}", (f'stress_passenger_{p}',))
+        passenger_ids.append(cur.fetchone()['id'])
+    conn.commit()
+    release_db_connection(conn)
+    return driver_vehicles, passenger_ids
+
+
+def cleanup():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM bookings WHERE passenger_id IN (SELECT id FROM users WHERE username LIKE 'stress_%')")
+    cur.execute("DELETE FROM vehicles WHERE driver_id IN (SELECT id FROM users WHERE username LIKE 'stress_%')")
+    cur.execute("DELETE FROM users WHERE username LIKE 'stress_%'")
+    conn.commit()
+    release_db_connection(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=3)
+    parser.add_argument('--capacity', type=int, default=5)
+    parser.add_argument('--passengers', type=int, default=60)
+    parser.add_argument('--attempts', type=int, default=2, help='join attempts per passenger')
+    parser.add_argument('--keep', action='store_true', help='keep seeded rows (PostgreSQL)')
+    args = parser.parse_args()
+
+    init_db()
+    cleanup()
+    driver_vehicles, passenger_ids = seed(args.drivers, args.capacity, args.passengers)
+    all_vehicles = [(d, v) for d, vs in driver_vehicles.items() for v in vs]
+
+    outcomes = Counter()
+    booked_per_driver = Counter()
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(passenger_ids))
+
+    def worker(passenger_id):
+        barrier.wait()
+        for _ in range(args.attempts):
+            driver_id, vehicle_id = random.choice(all_vehicles)
+            try:
+                with get_db() as conn:
+                    outcome = book_seat(conn, passenger_id, vehicle_id)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == BOOKED:
+                    booked_per_driver[driver_id] += 1
+
+    threads = [threading.Thread(target=worker, args=(p,)) for p in passenger_ids]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    # Verify against the database
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT v.driver_id, COUNT(b.id) as booked
+        FROM bookings b JOIN vehicles v ON b.vehicle_id = v.id
+        GROUP BY v.driver_id
+    """)
+    db_counts = {row['driver_id']: row['booked'] for row in cur.fetchall()}
+    release_db_connection(conn)
+
+    ok = True
+    for driver_id in driver_vehicles:
+        booked = db_counts.get(driver_id, 0)
+        status = 'ok'
+        if booked > args.capacity or booked != booked_per_driver[driver_id]:
+            status = 'OVERBOOKED' if booked > args.capacity else 'MISMATCH'
+            ok = False
+        print(f"driver {driver_id}: {booked}/{args.capacity} booked ({status})")
+
+    total = sum(outcomes.values())
+    print(f"{total} attempts in {elapsed:.2f}s ({total / elapsed:.0f}/s): {dict(outcomes)}")
+    if errors:
+        print(f"{len(errors)} errors, e.g. {errors[0]}")
+        ok = False
+
+    if not args.keep:
+        cleanup()
+
+    print("✅ No overbooking" if ok else "❌ Capacity violated or bookings failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
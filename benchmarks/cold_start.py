@@ -0,0 +1,140 @@
+"""
+Cold start: what `import app` costs, and how long the first visitor waits.
+
+Import profile: runs `python -X importtime -c "import app"` --runs times in
+fresh interpreters and reports the median total, which database drivers got
+imported, and the modules with the largest cumulative import time (median
+over the runs).
+
+First byte: spawns gunicorn from the Procfile --runs times per WARM_UP
+setting, on a freshly seeded database, and measures
+  cold GET /    sent the moment the port accepts connections; time from spawn
+                to the response (what a visitor waking the app up sees)
+  first GET /   sent once /health has answered; that request's own latency
+                (what the first visitor after a health check sees)
+It also reports the app's own startup timeline from /health (seconds from the
+gunicorn master's start to the end of the import, the warm-up and the first
+response).
+
+    python -m benchmarks.cold_start
+    DATABASE_URL=postgresql://localhost/scratch python -m benchmarks.cold_start --runs 3
+"""
+import argparse
+import os
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.loadtest import REPO_ROOT, free_port, gunicorn_argv, seed_scratch_database
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+DRIVERS = ('psycopg2', 'sqlite3')
+
+
+def import_profile(runs):
+    """Median `import app` time (ms), drivers imported, and {module: median cumulative ms}"""
+    totals = []
+    cumulative = defaultdict(list)
+    drivers = set()
+    code = "import app"
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=REPO_ROOT,
+                                env=dict(os.environ), capture_output=True, text=True, check=True)
+        for line in result.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            _, cumulative_us, _, module = match.groups()
+            cumulative[module].append(int(cumulative_us) / 1000)
+            if module == 'app':
+                totals.append(int(cumulative_us) / 1000)
+            if module in DRIVERS:
+                drivers.add(module)
+    medians = {module: statistics.median(samples) for module, samples in cumulative.items()}
+    return statistics.median(totals), sorted(drivers), medians
+
+
+def get(port, path, timeout=30):
+    import requests
+    return requests.get(f'http://127.0.0.1:{port}{path}', timeout=timeout,
+                        headers={'X-Forwarded-Proto': 'https',
+                                 'Authorization': f"Bearer {os.environ['METRICS_TOKEN']}"})
+
+
+def first_byte(warm_up, cold):
+    """One gunicorn start; returns (ms measured for GET /, the app's startup stats)"""
+    import requests
+    os.environ['WARM_UP'] = '1' if warm_up else '0'
+    port = free_port()
+    spawned = time.perf_counter()
+    process = subprocess.Popen(gunicorn_argv(port), cwd=REPO_ROOT, env=dict(os.environ),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = spawned + 60
+        while True:
+            if process.poll() is not None or time.perf_counter() > deadline:
+                raise SystemExit("gunicorn did not start")
+            try:
+                if cold:
+                    get(port, '/')
+                    measured = time.perf_counter() - spawned
+                else:
+                    get(port, '/health')
+                    started = time.perf_counter()
+                    get(port, '/')
+                    measured = time.perf_counter() - started
+                break
+            except requests.ConnectionError:
+                time.sleep(0.01)
+        return measured * 1000, get(port, '/health').json()['startup']
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=12, help='modules to list in the import profile')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--vehicles', type=int, default=40)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    os.environ.setdefault('SQLITE_PATH', os.path.join(scratch, 'cold_start.db'))
+    os.environ.setdefault('RIDE_SNAPSHOT_PATH', os.path.join(scratch, 'ride_snapshot.json.gz'))
+    os.environ.setdefault('ADMIN_PASSWORD', 'cold-start')
+    # /health only includes the startup timeline for METRICS_TOKEN holders
+    os.environ.setdefault('METRICS_TOKEN', 'cold-start')
+    seed_scratch_database(args)
+    dialect = 'PostgreSQL' if os.environ.get('DATABASE_URL') else 'SQLite'
+
+    total, drivers, medians = import_profile(args.runs)
+    print(f"import app ({dialect}): {total:.1f} ms median of {args.runs}, "
+          f"drivers imported: {', '.join(drivers) or 'none'}")
+    print(f"{'module':<28} {'cumulative ms':>14}")
+    for module, ms in sorted(medians.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{module:<28} {ms:>14.1f}")
+
+    print(f"\n{'WARM_UP':<8} {'measure':<12} {'median ms':>10} {'max ms':>8}  "
+          f"{'imported s':>10} {'warmed s':>8} {'1st byte s':>10}")
+    for warm_up in (False, True):
+        for cold, label in ((True, 'cold GET /'), (False, 'first GET /')):
+            runs = [first_byte(warm_up, cold) for _ in range(args.runs)]
+            samples = [ms for ms, _ in runs]
+            timeline = runs[-1][1]
+            print(f"{int(warm_up):<8} {label:<12} {statistics.median(samples):>10.1f} {max(samples):>8.1f}  "
+                  f"{timeline['imported_s']!s:>10} {timeline['warmed_up_s']!s:>8} {timeline['first_byte_s']!s:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Hundreds of idle clients against the threaded and the gevent worker.
+
+Spawns a local gunicorn (Procfile / gunicorn.conf.py) on a freshly seeded
+scratch SQLite database, once per WORKER_MODE. It then opens:
+
+  --slow     connections that send half a request and go quiet, like phones on
+             a bad network (gthread parks a thread on each one)
+  --streams  /stream/rides subscribers that just sit and listen
+
+While they are held open, --probes threads loop over GET / (cached board) and
+GET /ready (one query per request) for --duration seconds, each request with
+a --probe-timeout. The report gives probe latency and failures, how many
+streams were accepted, and the worker's peak OS threads and open SQLite
+connections (from /proc, sampled every 100 ms).
+
+    python -m benchmarks.idle_clients
+    python -m benchmarks.idle_clients --modes gevent --slow 500 --streams 500
+"""
+import argparse
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from benchmarks.loadtest import free_port, percentile, seed_scratch_database, start_gunicorn
+
+MODES = ('threads', 'gevent')
+PROBES = ('/', '/ready')
+
+
+def worker_pid(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        children = f.read().split()
+    return int(children[0]) if children else None
+
+
+def process_usage(pid, db_path):
+    """(OS threads, open SQLite connections) of pid; the main database file is open once per connection"""
+    with open(f'/proc/{pid}/status') as f:
+        threads = next(int(line.split()[1]) for line in f if line.startswith('Threads:'))
+    connections = 0
+    for fd in os.listdir(f'/proc/{pid}/fd'):
+        try:
+            connections += os.readlink(f'/proc/{pid}/fd/{fd}') == db_path
+        except OSError:
+            pass
+    return threads, connections
+
+
+def open_idle(port, path, request_line_only):
+    """Connect and send a request; a slow client stops halfway through its headers"""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+    head = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nX-Forwarded-Proto: https\r\n"
+    sock.sendall(head.encode() if request_line_only else (head + "\r\n").encode())
+    return sock
+
+
+def stream_status(sock):
+    """Status code of a /stream/rides response (None if nothing came back in time)"""
+    sock.settimeout(5)
+    try:
+        line = sock.recv(64).split(b'\r\n', 1)[0].split()
+        return int(line[1]) if len(line) > 1 else None
+    except (OSError, ValueError):
+        return None
+
+
+def run_mode(mode, args, db_path):
+    os.environ['WORKER_MODE'] = mode
+    port = free_port()
+    gunicorn = start_gunicorn(port)
+    base_url = f'http://127.0.0.1:{port}'
+    sockets = []
+    samples = {path: [] for path in PROBES}
+    failures = Counter()
+    peak = {'threads': 0, 'connections': 0}
+    stop = threading.Event()
+
+    def sampler(pid):
+        while not stop.is_set():
+            try:
+                threads, connections = process_usage(pid, db_path)
+            except (OSError, StopIteration):
+                break
+            peak['threads'] = max(peak['threads'], threads)
+            peak['connections'] = max(peak['connections'], connections)
+            time.sleep(0.1)
+
+    def prober(number):
+        import requests
+        session = requests.Session()
+        session.headers['X-Forwarded-Proto'] = 'https'
+        i = number
+        while not stop.is_set():
+            path = PROBES[i % len(PROBES)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                status = session.get(base_url + path, timeout=args.probe_timeout).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            if status == 200:
+                samples[path].append((time.perf_counter() - started) * 1000)
+            else:
+                failures[f'{path} {status}'] += 1
+
+    try:
+        pid = worker_pid(gunicorn.pid)
+        threading.Thread(target=sampler, args=(pid,), daemon=True).start()
+        streams = [open_idle(port, '/stream/rides', False) for _ in range(args.streams)]
+        stream_statuses = Counter(stream_status(sock) for sock in streams)
+        sockets.extend(streams)
+        sockets.extend(open_idle(port, '/', True) for _ in range(args.slow))
+
+        probers = [threading.Thread(target=prober, args=(n,)) for n in range(args.probes)]
+        for thread in probers:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in probers:
+            thread.join()
+    finally:
+        stop.set()
+        for sock in sockets:
+            sock.close()
+        gunicorn.send_signal(signal.SIGINT)
+        gunicorn.wait(timeout=10)
+    return samples, failures, stream_statuses, peak
+
+
+def describe(samples):
+    samples = sorted(samples)
+    if not samples:
+        return f"{'-':>8} {'-':>8} {0:>6}"
+    return f"{percentile(samples, 50):>8.1f} {percentile(samples, 95):>8.1f} {len(samples):>6}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='threads,gevent', help='comma-separated: threads, gevent')
+    parser.add_argument('--slow', type=int, default=300, help='clients that stop halfway through a request')
+    parser.add_argument('--streams', type=int, default=200, help='idle /stream/rides subscribers')
+    parser.add_argument('--probes', type=int, default=8, help='threads looping over GET / and GET /ready')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--probe-timeout', type=float, default=5)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--vehicles', type=int, default=40)
+    args = parser.parse_args()
+    modes = [mode.strip() for mode in args.modes.split(',')]
+    for mode in modes:
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode {mode}")
+
+    scratch = tempfile.mkdtemp()
+    db_path = os.path.join(scratch, 'idle_clients.db')
+    os.environ.pop('DATABASE_URL', None)
+    os.environ['SQLITE_PATH'] = db_path
+    os.environ.setdefault('RIDE_SNAPSHOT_PATH', os.path.join(scratch, 'ride_snapshot.json.gz'))
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    # A recycled worker would drop every held connection mid-run
+    os.environ.setdefault('GUNICORN_MAX_REQUESTS', '0')
+    seed_scratch_database(args)
+
+    print(f"{args.slow} slow clients, {args.streams} streams, {args.probes} probe threads, {os.cpu_count()} CPUs")
+    print(f"{'mode':<8} {'probe':<11} {'p50 ms':>8} {'p95 ms':>8} {'ok':>6}  failures")
+    for mode in modes:
+        samples, failures, stream_statuses, peak = run_mode(mode, args, db_path)
+        for path in PROBES:
+            failed = {key.split(' ', 1)[1]: n for key, n in failures.items() if key.split(' ', 1)[0] == path}
+            print(f"{mode:<8} {'GET ' + path:<11} {describe(samples[path])}  {failed or ''}")
+        print(f"{mode:<8} streams {dict(stream_statuses)}, peak worker threads {peak['threads']}, "
+              f"peak SQLite connections {peak['connections']}")
+
+
+if __name__ == '__main__':
+    main()
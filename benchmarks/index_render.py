@@ -0,0 +1,109 @@
+"""
+Time rendering the ride board page (GET /) for different viewers.
+
+Seeds a scratch database and reports the median of --repeat calls of the
+index view, with the board already in board_cache, for a guest, a member
+without a seat, a passenger, a driver and an admin. On checkouts with
+cards.py it also times re-rendering every card and re-rendering after one
+vehicle changed.
+
+    python -m benchmarks.index_render --users 2000 --vehicles 150
+"""
+import argparse
+import copy
+import os
+import statistics
+import tempfile
+import time
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'index_bench.db'))
+os.environ.setdefault('RIDE_SNAPSHOT_PATH', os.path.join(tempfile.mkdtemp(), 'ride_snapshot.json.gz'))
+os.environ.setdefault('ADMIN_PASSWORD', 'index-render')
+
+import db
+from benchmarks.seed import seed, clear
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def pick_viewers(conn):
+    """{label: user id or None}; the admin also gets a seat, so their own row shows up too"""
+    cur = conn.cursor()
+    cur.execute("SELECT passenger_id FROM bookings ORDER BY id LIMIT 1")
+    booked = cur.fetchone()['passenger_id']
+    cur.execute("SELECT id FROM users WHERE NOT is_driver AND NOT is_admin "
+                "AND id NOT IN (SELECT passenger_id FROM bookings) ORDER BY id LIMIT 1")
+    free = cur.fetchone()['id']
+    cur.execute("SELECT driver_id FROM vehicles ORDER BY id LIMIT 1")
+    driver = cur.fetchone()['driver_id']
+    cur.execute("SELECT id FROM users WHERE is_admin ORDER BY id LIMIT 1")
+    admin = cur.fetchone()['id']
+    return {'guest': None, 'no seat': free, 'passenger': booked, 'driver': driver, 'admin': admin}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--vehicles', type=int, default=150)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_db() as conn:
+        clear(conn)
+        counts = seed(conn, users=args.users, vehicles=args.vehicles, admins=1)
+        viewers = pick_viewers(conn)
+
+    from flask_login import login_user
+    import app as appmod
+    from models import User
+
+    def render(user_id):
+        with appmod.app.test_request_context('/', base_url='https://localhost'):
+            if user_id is not None:
+                login_user(User.get(user_id))
+            return appmod.index()
+
+    # Warm every viewer up first; the first few large pages are slower for allocator reasons alone
+    for user_id in viewers.values():
+        for _ in range(10):
+            render(user_id)
+
+    print(f"{counts}")
+    print(f"{'viewer':<12} {'median ms':>10} {'KB':>6}")
+    for label, user_id in viewers.items():
+        html = render(user_id)
+        print(f"{label:<12} {median_ms(lambda: render(user_id), args.repeat):>10.2f} {len(html) / 1024:>6.0f}")
+
+    try:
+        from cards import CardCache
+    except ImportError:
+        return
+    from cache import board_cache
+    from rides import load_ride_board
+    with appmod.app.app_context():
+        board = board_cache.get(load_ride_board)
+        changed = copy.deepcopy(board)
+        changed[0]['passengers'] = changed[0]['passengers'][:-1]
+        print(f"{'all cards re-rendered':<30} {median_ms(lambda: CardCache().cards(board), args.repeat):>8.2f} ms")
+
+        def one_changed():
+            cards = CardCache()
+            cards.cards(board)
+            started = time.perf_counter()
+            cards.cards(changed)
+            return (time.perf_counter() - started) * 1000
+        samples = [one_changed() for _ in range(args.repeat)]
+        print(f"{'one vehicle changed':<30} {statistics.median(samples):>8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,383 @@
+"""
+End-to-end load test: replays a mixed workload and reports per-route latency.
+
+Virtual users (one thread each) log in as seeded passengers, then loop over a
+weighted mix of operations until --duration runs out:
+
+  index   GET /
+  api     GET /api/rides with If-None-Match, like a poller
+  churn   GET /leave, then GET /join/<random vehicle>
+  admin   GET /admin_dashboard as the seeded admin
+  login   POST /login from a fresh session
+
+Targets:
+  (default)    Flask test client in this process, on a freshly seeded scratch DB
+  --gunicorn   spawn a local gunicorn with the Procfile settings on the scratch DB
+  --url URL    an already-running server; seed its database first with
+               `python -m benchmarks.seed` using the same --users/--vehicles
+
+The rate limiter is off for spawned and in-process targets (all virtual users
+share one IP); set RATE_LIMIT_ENABLED=1 to measure with it.
+
+The report is JSON (per-route count, errors, p50/p95/p99 and throughput), so runs
+can be compared:
+
+    python -m benchmarks.loadtest --duration 30 --threads 8 --output before.json
+    python -m benchmarks.loadtest --gunicorn --threads 16 --output after.json
+    python -m benchmarks.loadtest --compare before.json after.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from benchmarks.seed import PASSWORD, seeded_usernames
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = 'index=50,api=20,churn=15,admin=5,login=10'
+# Status codes each operation expects; anything else counts as an error
+EXPECTED = {
+    'GET /': {200},
+    'GET /api/rides': {200, 304},
+    'GET /leave': {302},
+    'GET /join/<id>': {302},
+    'GET /admin_dashboard': {200},
+    'POST /login': {302},
+}
+
+
+class TestClientSession:
+    """One logged-in browser, backed by the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, headers=None):
+        # https so force_https doesn't redirect when DATABASE_URL is set
+        response = self.client.open(path, method=method, data=data, headers=headers,
+                                    base_url='https://localhost')
+        body = response.get_data()
+        return response.status_code, response.headers, body
+
+
+class HttpSession:
+    """One logged-in browser talking to a real server"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        # Tell the app the request came over https (gunicorn trusts this from 127.0.0.1)
+        self.session.headers['X-Forwarded-Proto'] = 'https'
+
+    def request(self, method, path, data=None, headers=None):
+        response = self.session.request(method, self.base_url + path, data=data, headers=headers,
+                                        allow_redirects=False, timeout=90)
+        return response.status_code, response.headers, response.content
+
+
+def percentile(sorted_samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('index', 'api', 'churn', 'admin', 'login'):
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, number, new_session, usernames, admin, vehicle_ids, mix, record_from, stop_at):
+        super().__init__(daemon=True)
+        self.rng = random.Random(number)
+        self.new_session = new_session
+        self.usernames = usernames
+        self.username = usernames[number % len(usernames)]
+        self.admin = admin
+        self.vehicle_ids = vehicle_ids
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.record_from = record_from
+        self.stop_at = stop_at
+        self.samples = defaultdict(list)   # route -> [ms]
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.etag = None
+        self.session = None
+        self.admin_session = None
+
+    def timed(self, session, label, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            status, headers, _ = session.request(method, path, **kwargs)
+        except Exception as e:
+            status, headers = type(e).__name__, {}
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if started >= self.record_from:
+            self.samples[label].append(elapsed_ms)
+            self.statuses[label][str(status)] += 1
+            if status not in EXPECTED[label]:
+                self.errors[label] += 1
+        return status, headers
+
+    def login(self, username):
+        session = self.new_session()
+        session.request('POST', '/login', data={'username': username, 'password': PASSWORD})
+        return session
+
+    def run(self):
+        self.session = self.login(self.username)
+        while time.perf_counter() < self.stop_at:
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            getattr(self, f'op_{operation}')()
+
+    def op_index(self):
+        self.timed(self.session, 'GET /', 'GET', '/')
+
+    def op_api(self):
+        headers = {'If-None-Match': self.etag} if self.etag else None
+        status, response_headers = self.timed(self.session, 'GET /api/rides', 'GET', '/api/rides', headers=headers)
+        if status == 200:
+            self.etag = response_headers.get('ETag')
+
+    def op_churn(self):
+        self.timed(self.session, 'GET /leave', 'GET', '/leave')
+        vehicle_id = self.rng.choice(self.vehicle_ids)
+        self.timed(self.session, 'GET /join/<id>', 'GET', f'/join/{vehicle_id}')
+
+    def op_admin(self):
+        if self.admin is None:
+            return
+        if self.admin_session is None:
+            self.admin_session = self.login(self.admin)
+        self.timed(self.admin_session, 'GET /admin_dashboard', 'GET', '/admin_dashboard')
+
+    def op_login(self):
+        session = self.new_session()
+        self.timed(session, 'POST /login', 'POST', '/login',
+                   data={'username': self.rng.choice(self.usernames), 'password': PASSWORD})
+
+
+def build_report(users, measured_seconds, meta):
+    samples = defaultdict(list)
+    statuses = defaultdict(Counter)
+    errors = Counter()
+    for user in users:
+        for label, values in user.samples.items():
+            samples[label].extend(values)
+            statuses[label].update(user.statuses[label])
+        errors.update(user.errors)
+
+    routes = {}
+    for label in sorted(samples):
+        values = sorted(samples[label])
+        routes[label] = {
+            'count': len(values),
+            'errors': errors[label],
+            'statuses': dict(statuses[label]),
+            'throughput_rps': round(len(values) / measured_seconds, 2),
+            'mean_ms': round(sum(values) / len(values), 2),
+            'p50_ms': round(percentile(values, 50), 2),
+            'p95_ms': round(percentile(values, 95), 2),
+            'p99_ms': round(percentile(values, 99), 2),
+            'max_ms': round(values[-1], 2),
+        }
+    total = sum(route['count'] for route in routes.values())
+    return {
+        'meta': meta,
+        'totals': {
+            'requests': total,
+            'errors': sum(errors.values()),
+            'throughput_rps': round(total / measured_seconds, 2),
+        },
+        'routes': routes,
+    }
+
+
+def seed_scratch_database(args):
+    from db import get_db, init_db
+    from benchmarks.seed import seed, clear
+    init_db()
+    with get_db() as conn:
+        clear(conn)
+        return seed(conn, users=args.users, vehicles=args.vehicles, admins=1)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def gunicorn_argv(port):
+    """The Procfile's web command, bound to localhost:port"""
+    with open(os.path.join(REPO_ROOT, 'Procfile')) as f:
+        command = next(line.split(':', 1)[1] for line in f if line.startswith('web:'))
+    argv = [arg.replace('0.0.0.0:$PORT', f'127.0.0.1:{port}') for arg in shlex.split(command)]
+    argv[0:1] = [sys.executable, '-m', 'gunicorn']
+    return argv
+
+
+def start_gunicorn(port):
+    """Run the Procfile's web command on localhost"""
+    process = subprocess.Popen(gunicorn_argv(port), cwd=REPO_ROOT, env=dict(os.environ),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    import requests
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with code {process.returncode}")
+        try:
+            requests.get(f'http://127.0.0.1:{port}/health', timeout=1,
+                         headers={'X-Forwarded-Proto': 'https'})
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("gunicorn did not start within 30s")
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    names = seeded_usernames(args.users, args.vehicles, admins=1)
+    dataset = {'users': args.users, 'vehicles': args.vehicles}
+    gunicorn = None
+
+    if args.url:
+        target = args.url
+        new_session = lambda: HttpSession(args.url)
+    else:
+        dataset = seed_scratch_database(args)
+        print(f"🌱 Seeded {dataset}", file=sys.stderr)
+        if args.gunicorn:
+            port = free_port()
+            gunicorn = start_gunicorn(port)
+            target = 'gunicorn'
+            new_session = lambda: HttpSession(f'http://127.0.0.1:{port}')
+        else:
+            from app import app
+            target = 'test-client'
+            new_session = lambda: TestClientSession(app)
+
+    try:
+        status, _, body = new_session().request('GET', '/api/rides')
+        if status != 200:
+            raise SystemExit(f"GET /api/rides returned {status}; is the server seeded?")
+        vehicle_ids = [vehicle['id'] for vehicle in json.loads(body)['vehicles']]
+        if not vehicle_ids:
+            raise SystemExit("No vehicles on the board; seed the database first")
+
+        started = time.perf_counter()
+        record_from = started + args.warmup
+        stop_at = record_from + args.duration
+        users = [VirtualUser(i, new_session, names['passengers'], args.admin or names['admins'][0],
+                             vehicle_ids, mix, record_from, stop_at)
+                 for i in range(args.threads)]
+        print(f"🚦 {args.threads} virtual users against {target} for {args.duration:.0f}s "
+              f"(+{args.warmup:.0f}s warm-up)", file=sys.stderr)
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        measured = max(0.001, min(time.perf_counter(), stop_at) - record_from)
+    finally:
+        if gunicorn is not None:
+            # SIGINT is gunicorn's quick shutdown; SIGTERM would wait on keep-alive connections
+            gunicorn.send_signal(signal.SIGINT)
+            try:
+                gunicorn.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                gunicorn.kill()
+
+    meta = {
+        'target': target,
+        'dialect': 'postgres' if os.environ.get('DATABASE_URL') else 'sqlite',
+        'threads': args.threads,
+        'duration_s': args.duration,
+        'warmup_s': args.warmup,
+        'mix': mix,
+        'dataset': dataset,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+    }
+    return build_report(users, measured, meta)
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"{'route':<24} {'p50 ms':>17} {'p95 ms':>17} {'p99 ms':>17} {'req/s':>17}")
+    for label in sorted(set(before['routes']) | set(after['routes'])):
+        b, a = before['routes'].get(label), after['routes'].get(label)
+        if not b or not a:
+            print(f"{label:<24} {'(only in one run)':>17}")
+            continue
+        cells = [f"{b[k]:>7.1f} → {a[k]:<7.1f}" for k in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')]
+        print(f"{label:<24} " + ' '.join(cells))
+    bt, at = before['totals'], after['totals']
+    print(f"{'total':<24} {bt['throughput_rps']:.1f} → {at['throughput_rps']:.1f} req/s, "
+          f"errors {bt['errors']} → {at['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='drive an already-running server (seed it first)')
+    target.add_argument('--gunicorn', action='store_true', help='spawn a local gunicorn from the Procfile')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds run before measuring')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--vehicles', type=int, default=150)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'operation weights (default {DEFAULT_MIX})')
+    parser.add_argument('--admin', help='admin username (default: the seeded admin)')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two JSON reports')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    scratch = tempfile.mkdtemp()
+    if not args.url and not os.environ.get('DATABASE_URL'):
+        os.environ.setdefault('SQLITE_PATH', os.path.join(scratch, 'loadtest.db'))
+    os.environ.setdefault('RIDE_SNAPSHOT_PATH', os.path.join(scratch, 'ride_snapshot.json.gz'))
+    # Every virtual user shares 127.0.0.1, so the per-IP limits would turn most logins into 429s
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"📄 Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
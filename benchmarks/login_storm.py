@@ -0,0 +1,135 @@
+"""
+Index latency during a login storm.
+
+Spawns a local gunicorn (Procfile settings) on a freshly seeded scratch
+database. --readers logged-in users loop over GET / the whole time. After
+--calm seconds, --logins more threads start posting to /login back to back for
+--storm seconds. The report gives GET / p50/p95/p99 before and during the
+storm, and the login latency and status codes.
+
+A login answered 503 is retried after --retry-after seconds, like a person
+clicking again. Each mode restarts gunicorn with different hashing settings:
+  inline  hash on the request thread with no queue limit (how the app used to work)
+  pool    the passwords.py defaults (bounded queue, niced hashing thread)
+
+    python -m benchmarks.login_storm
+    python -m benchmarks.login_storm --modes pool --logins 32 --storm 20
+"""
+import argparse
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from benchmarks.loadtest import HttpSession, free_port, percentile, seed_scratch_database, start_gunicorn
+from benchmarks.seed import PASSWORD, seeded_usernames
+
+MODES = {
+    'inline': {'PASSWORD_HASH_WORKERS': '0', 'PASSWORD_HASH_QUEUE': '1000'},
+    'pool': {},
+}
+
+
+def run_mode(mode, args, names):
+    for name in ('PASSWORD_HASH_WORKERS', 'PASSWORD_HASH_QUEUE'):
+        os.environ.pop(name, None)
+    os.environ.update(MODES[mode])
+    port = free_port()
+    gunicorn = start_gunicorn(port)
+    base_url = f'http://127.0.0.1:{port}'
+
+    calm, storm, logins = [], [], []
+    login_statuses = Counter()
+    storm_at = time.perf_counter() + args.calm
+    stop_at = storm_at + args.storm
+
+    def reader(number):
+        session = HttpSession(base_url)
+        session.request('POST', '/login', data={'username': names[number % len(names)], 'password': PASSWORD})
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                status, _, _ = session.request('GET', '/')
+            except Exception as e:
+                status = type(e).__name__
+            (calm if started < storm_at else storm).append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                print(f"⚠️ GET / returned {status}", file=sys.stderr)
+
+    def stormer(number):
+        time.sleep(max(0.0, storm_at - time.perf_counter()))
+        i = number
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                status, _, _ = HttpSession(base_url).request(
+                    'POST', '/login', data={'username': names[i % len(names)], 'password': PASSWORD})
+            except Exception as e:
+                status = type(e).__name__
+            logins.append((time.perf_counter() - started) * 1000)
+            login_statuses[str(status)] += 1
+            if status == 503:
+                time.sleep(args.retry_after)
+            else:
+                i += args.logins
+
+    threads = ([threading.Thread(target=reader, args=(n,)) for n in range(args.readers)] +
+               [threading.Thread(target=stormer, args=(n,)) for n in range(args.logins)])
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        gunicorn.send_signal(signal.SIGINT)
+        gunicorn.wait(timeout=10)
+    return calm, storm, logins, login_statuses
+
+
+def describe(samples):
+    samples = sorted(samples)
+    if not samples:
+        return f"{'-':>8} {'-':>8} {'-':>8} {0:>6}"
+    return (f"{percentile(samples, 50):>8.1f} {percentile(samples, 95):>8.1f} "
+            f"{percentile(samples, 99):>8.1f} {len(samples):>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='inline,pool', help='comma-separated: inline, pool')
+    parser.add_argument('--readers', type=int, default=4, help='threads looping over GET /')
+    parser.add_argument('--logins', type=int, default=16, help='threads posting /login during the storm')
+    parser.add_argument('--calm', type=float, default=5, help='seconds measured before the storm')
+    parser.add_argument('--storm', type=float, default=10, help='seconds of login storm')
+    parser.add_argument('--retry-after', type=float, default=0.5, help='seconds before retrying a 503 login')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--vehicles', type=int, default=40)
+    args = parser.parse_args()
+    modes = [mode.strip() for mode in args.modes.split(',')]
+    for mode in modes:
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode {mode}")
+
+    scratch = tempfile.mkdtemp()
+    os.environ.pop('DATABASE_URL', None)
+    os.environ.setdefault('SQLITE_PATH', os.path.join(scratch, 'login_storm.db'))
+    os.environ.setdefault('RIDE_SNAPSHOT_PATH', os.path.join(scratch, 'ride_snapshot.json.gz'))
+    # Measures the hashing path, not ratelimit.py (see benchmarks.rate_limits)
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+    seed_scratch_database(args)
+    names = seeded_usernames(args.users, args.vehicles)['passengers']
+
+    print(f"{args.readers} readers, {args.logins} login threads, {os.cpu_count()} CPUs")
+    print(f"{'mode':<8} {'measure':<22} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'count':>6}  statuses")
+    for mode in modes:
+        calm, storm, logins, statuses = run_mode(mode, args, names)
+        print(f"{mode:<8} {'GET / before storm':<22} {describe(calm)}")
+        print(f"{mode:<8} {'GET / during storm':<22} {describe(storm)}")
+        print(f"{mode:<8} {'POST /login':<22} {describe(logins)}  {dict(statuses)}")
+
+
+if __name__ == '__main__':
+    main()
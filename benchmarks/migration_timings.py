@@ -0,0 +1,133 @@
+"""
+Time the hot-path queries before and after the index/foreign-key migrations.
+
+Migrates a fresh database to version 2 (the pre-index schema), seeds it, times
+the queries behind index(), admin_dashboard() and join_ride, then applies the
+remaining migrations and times them again.
+
+    python -m benchmarks.migration_timings --users 5000 --vehicles 300
+    DATABASE_URL=postgres://.../empty_db python -m benchmarks.migration_timings
+
+PostgreSQL needs an EMPTY scratch database (migrations can't be rolled back).
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'migration_bench.db'))
+
+from db import get_db_connection, release_db_connection
+from migrate import apply_migrations
+from benchmarks.seed import seed
+
+PH = "%s" if os.environ.get('DATABASE_URL') else "?"
+
+QUERIES = {
+    'index board': ("""
+        SELECT v.id as vehicle_id, v.vehicle_name, v.driver_id, u.full_name as driver_name,
+               u.phone_number as driver_phone, u.driver_capacity,
+               p.full_name as passenger_name, p.id as passenger_id
+        FROM vehicles v
+        JOIN users u ON v.driver_id = u.id
+        LEFT JOIN bookings b ON b.vehicle_id = v.id
+        LEFT JOIN users p ON b.passenger_id = p.id
+        ORDER BY u.full_name, v.vehicle_name, p.full_name
+    """, ()),
+    'admin passengers': ("""
+        SELECT u.full_name, u.residence, u.email, d.full_name as driver_name
+        FROM users u
+        JOIN bookings b ON u.id = b.passenger_id
+        JOIN vehicles v ON b.vehicle_id = v.id
+        JOIN users d ON v.driver_id = d.id
+        ORDER BY d.full_name, u.full_name
+    """, ()),
+    'admin inactive users': ("""
+        SELECT u.full_name, u.grade, u.residence, u.phone_number, u.email
+        FROM users u
+        LEFT JOIN bookings b ON u.id = b.passenger_id
+        LEFT JOIN vehicles v ON u.id = v.driver_id
+        WHERE b.id IS NULL AND v.id IS NULL
+        ORDER BY u.full_name
+    """, ()),
+    'admin vehicle occupancy': ("""
+        SELECT v.vehicle_name, v.driver_id, d.full_name as driver_name, d.driver_capacity,
+               COUNT(b.id) as driver_occupied
+        FROM vehicles v
+        JOIN users d ON v.driver_id = d.id
+        LEFT JOIN bookings b ON b.vehicle_id = v.id
+        GROUP BY v.id, v.vehicle_name, v.driver_id, d.full_name, d.driver_capacity
+        ORDER BY d.full_name, v.vehicle_name
+    """, ()),
+    'join_ride driver count': (f"""
+        SELECT COUNT(*) as count FROM bookings b
+        JOIN vehicles v ON b.vehicle_id = v.id
+        WHERE v.driver_id = {PH}
+    """, None),  # params filled in with a real driver id
+    'vehicle passenger list': (f"""
+        SELECT u.full_name FROM bookings b JOIN users u ON b.passenger_id = u.id
+        WHERE b.vehicle_id = {PH}
+    """, None),
+}
+
+
+def time_queries(conn, driver_id, vehicle_id, repeat):
+    cur = conn.cursor()
+    results = {}
+    for label, (sql, params) in QUERIES.items():
+        if params is None:
+            params = (driver_id,) if 'driver' in label else (vehicle_id,)
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cur.execute(sql, params)
+            cur.fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+        results[label] = statistics.median(samples)
+    conn.rollback()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--vehicles', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    apply_migrations(target=2, verbose=False)
+    conn = get_db_connection()
+    try:
+        counts = seed(conn, users=args.users, vehicles=args.vehicles)
+        print(f"Seeded {counts}")
+        cur = conn.cursor()
+        cur.execute("SELECT driver_id, id FROM vehicles ORDER BY id DESC LIMIT 1")
+        row = cur.fetchone()
+        driver_id, vehicle_id = row['driver_id'], row['id']
+        conn.commit()
+        before = time_queries(conn, driver_id, vehicle_id, args.repeat)
+    finally:
+        release_db_connection(conn)
+
+    apply_migrations(verbose=False)
+    conn = get_db_connection()
+    try:
+        # Give the planner fresh statistics for the new indexes
+        conn.cursor().execute("ANALYZE")
+        conn.commit()
+        after = time_queries(conn, driver_id, vehicle_id, args.repeat)
+    finally:
+        release_db_connection(conn)
+
+    dialect = 'postgres' if os.environ.get('DATABASE_URL') else 'sqlite'
+    print(f"\nMedian of {args.repeat} runs ({dialect}, {args.users} users, {args.vehicles} vehicles)")
+    print(f"{'query':<26} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for label in QUERIES:
+        b, a = before[label], after[label]
+        print(f"{label:<26} {b:>10.2f} {a:>10.2f} {b / a if a else 0:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Per-route query budgets.
+
+Runs the main routes through the Flask test client on a seeded scratch
+database, counting each route's queries with sqltrace.query_budget(). Any
+route over its budget, or repeating one statement more than allowed (an N+1
+pattern), fails the run.
+
+    python -m benchmarks.query_budgets            # exits 1 if a budget is exceeded
+    python -m benchmarks.query_budgets --verbose  # also list every query
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+os.environ.pop('DATABASE_URL', None)
+SCRATCH = tempfile.mkdtemp()
+os.environ.setdefault('SQLITE_PATH', os.path.join(SCRATCH, 'query_budgets.db'))
+os.environ.setdefault('RIDE_SNAPSHOT_PATH', os.path.join(SCRATCH, 'ride_snapshot.json.gz'))
+
+import db
+from cache import board_cache
+from rides import load_ride_board
+from benchmarks.seed import seed, seeded_usernames, PASSWORD
+from sqltrace import query_budget, QueryBudgetExceeded
+
+USERS, VEHICLES = 300, 30
+
+# (label, who, method, path, max queries, max repeats of one statement, cold board cache)
+ROUTES = [
+    ('index (cold cache)', 'passenger', 'GET', '/', 1, 1, True),
+    ('index (warm cache)', 'passenger', 'GET', '/', 0, 0, False),
+    ('api rides (warm cache)', 'passenger', 'GET', '/api/rides', 0, 0, False),
+    ('join', 'passenger', 'GET', '/join/{vehicle}', 2, 1, False),
+    ('leave', 'passenger', 'GET', '/leave', 1, 1, False),
+    ('profile', 'driver', 'GET', '/profile', 2, 1, False),
+    ('admin dashboard (shell)', 'admin', 'GET', '/admin_dashboard', 0, 0, False),
+    ('admin passengers page', 'admin', 'GET', '/admin/api/passengers', 1, 1, False),
+    ('admin emails page', 'admin', 'GET', '/admin/api/emails?limit=1000', 1, 1, False),
+    ('admin drivers page', 'admin', 'GET', '/admin/api/drivers', 1, 1, False),
+    ('admin vehicles page', 'admin', 'GET', '/admin/api/vehicles', 1, 1, False),
+    ('admin inactive page', 'admin', 'GET', '/admin/api/inactive', 1, 1, False),
+    ('admin page (cached)', 'admin', 'GET', '/admin/api/passengers', 0, 0, False),
+    ('admin stats', 'admin', 'GET', '/admin/stats', 3, 1, False),
+    ('admin stats (cached)', 'admin', 'GET', '/admin/stats', 0, 0, False),
+]
+
+# Non-web code paths: (label, callable, max queries, max repeats); None = report only
+JOBS = [
+    ('watchdog rides data', 'watchdog_scheduler:get_all_rides_data', 1, 1),
+]
+
+
+def load(target):
+    module, _, name = target.partition(':')
+    return getattr(__import__(module), name)
+
+
+def check(label, budget, max_repeats, fn, verbose):
+    """Run fn under a query budget; returns True if within budget"""
+    try:
+        with query_budget(budget if budget is not None else float('inf'), max_repeats, label=label) as trace:
+            fn()
+        repeated = trace.repeated(2)
+        result = 'ok' if budget is not None else (
+            f"report only ({repeated[0][1]}x repeated statement)" if repeated else 'report only')
+        ok = True
+    except QueryBudgetExceeded as e:
+        result = f"OVER BUDGET\n    {e}"
+        ok = False
+    print(f"{label:<26} {len(trace):>8} {budget if budget is not None else '-':>7} {trace.total_ms:>8.2f}  {result}")
+    if verbose:
+        print(trace.summary())
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_db() as conn:
+        seed(conn, users=USERS, vehicles=VEHICLES, admins=1)
+        cur = conn.cursor()
+        cur.execute("SELECT MIN(id) as id FROM vehicles")
+        vehicle_id = cur.fetchone()['id']
+
+    from app import app
+    names = seeded_usernames(USERS, VEHICLES, admins=1)
+    clients = {}
+    for who, username in (('passenger', names['passengers'][0]), ('driver', names['drivers'][0]),
+                          ('admin', names['admins'][0])):
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': PASSWORD})
+        clients[who] = client
+
+    failures = 0
+    print(f"{'route':<26} {'queries':>8} {'budget':>7} {'ms':>8}  result")
+    for label, who, method, path, budget, max_repeats, cold in ROUTES:
+        if cold:
+            board_cache.invalidate()
+        else:
+            board_cache.get(load_ride_board)
+
+        def request():
+            response = clients[who].open(path.format(vehicle=vehicle_id), method=method)
+            assert response.status_code < 500, f"{label}: HTTP {response.status_code}"
+
+        failures += not check(label, budget, max_repeats, request, args.verbose)
+
+    for label, target, budget, max_repeats in JOBS:
+        failures += not check(label, budget, max_repeats, load(target), args.verbose)
+
+    if failures:
+        print(f"\n❌ {failures} route(s) over budget")
+        return 1
+    print("\n✅ All routes within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Cost and effect of the rate limiter (ratelimit.py).
+
+  - check() time for one hot key, for a stream of new keys that keeps the
+    LRU full (every call evicts), and with 8 threads sharing the limiter
+  - memory held by a full limiter (RATE_LIMIT_MAX_KEYS buckets)
+  - end to end through the Flask test client: one address hammering POST /login
+    with a wrong password at one account, then that account's owner and a
+    bystander logging in from other addresses (X-Forwarded-For, one trusted
+    proxy hop)
+
+    python -m benchmarks.rate_limits
+    python -m benchmarks.rate_limits --attempts 200 --max-keys 50000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+os.environ.pop('DATABASE_URL', None)
+SCRATCH = tempfile.mkdtemp()
+os.environ.setdefault('SQLITE_PATH', os.path.join(SCRATCH, 'rate_limits.db'))
+os.environ.setdefault('RIDE_SNAPSHOT_PATH', os.path.join(SCRATCH, 'ride_snapshot.json.gz'))
+os.environ['RATE_LIMIT_PROXY_HOPS'] = '1'
+
+import db
+from benchmarks.seed import seed, seeded_usernames, PASSWORD
+from ratelimit import DEFAULT_LIMITS, RateLimiter
+
+KEYS = {'ip': '203.0.113.7', 'user': 'name:someone'}
+
+
+def per_call_us(fn, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def limiter_costs(args):
+    results = []
+    # Huge budget so the hot key never runs dry
+    hot = RateLimiter({'login': {'ip': DEFAULT_LIMITS['login']['ip']._replace(burst=10 ** 9)}})
+    results.append(('check(), one hot key', per_call_us(lambda i: hot.check('login', KEYS), args.calls)))
+
+    churn = RateLimiter(DEFAULT_LIMITS, max_keys=args.max_keys)
+    for i in range(args.max_keys):
+        churn.check('login', {'ip': f'10.0.{i}', 'user': None})
+    results.append(('check(), new key + eviction', per_call_us(
+        lambda i: churn.check('login', {'ip': f'198.51.{i}', 'user': f'name:{i}'}), args.calls)))
+
+    shared = RateLimiter(DEFAULT_LIMITS, max_keys=args.max_keys)
+    threads = 8
+    per_thread = args.calls // threads
+
+    def worker(n):
+        for i in range(per_thread):
+            shared.check('join_ride', {'ip': f'192.0.{n}.{i % 500}', 'user': f'id:{i % 2000}'})
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    results.append((f'check(), {threads} threads', (time.perf_counter() - started) / (per_thread * threads) * 1e6))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    full = RateLimiter(DEFAULT_LIMITS, max_keys=args.max_keys)
+    for i in range(args.max_keys * 2):
+        full.check('login', {'ip': f'10.1.{i}', 'user': None})
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    stats = full.stats()
+    return results, stats, size
+
+
+def end_to_end(args):
+    db.init_db()
+    with db.get_db() as conn:
+        seed(conn, users=200, vehicles=20)
+    from app import app
+
+    names = seeded_usernames(200, 20)['passengers']
+    victim, bystander = names[0], names[1]
+    statuses = Counter()
+    timings = {}
+    client = app.test_client()
+    for _ in range(args.attempts):
+        started = time.perf_counter()
+        response = client.post('/login', data={'username': victim, 'password': 'wrong'},
+                               headers={'X-Forwarded-For': '203.0.113.50'})
+        timings.setdefault(response.status_code, []).append((time.perf_counter() - started) * 1000)
+        statuses[response.status_code] += 1
+
+    # The hammered username's own bucket is per address, so its owner isn't locked out
+    owner = app.test_client().post('/login', data={'username': victim, 'password': PASSWORD},
+                                   headers={'X-Forwarded-For': '198.51.100.8'})
+    started = time.perf_counter()
+    response = app.test_client().post('/login', data={'username': bystander, 'password': PASSWORD},
+                                      headers={'X-Forwarded-For': '198.51.100.9'})
+    bystander_ms = (time.perf_counter() - started) * 1000
+    return statuses, timings, owner.status_code, response.status_code, bystander_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--max-keys', type=int, default=10000)
+    parser.add_argument('--attempts', type=int, default=100, help='login attempts from the hammering address')
+    args = parser.parse_args()
+
+    results, stats, size = limiter_costs(args)
+    print(f"{'limiter':<32} {'us/call':>8}")
+    for label, us in results:
+        print(f"{label:<32} {us:>8.2f}")
+    print(f"full limiter: {stats['keys']} buckets (max {stats['max_keys']}), {stats['evicted']} evicted, "
+          f"{size / 1024:.0f} KB")
+
+    statuses, timings, owner_status, bystander_status, bystander_ms = end_to_end(args)
+    print(f"\n{args.attempts} bad logins from one address: {dict(statuses)}")
+    for status, samples in sorted(timings.items()):
+        print(f"  HTTP {status}: median {statistics.median(samples):.2f} ms")
+    print(f"account owner login from another address: HTTP {owner_status}")
+    print(f"bystander login from another address: HTTP {bystander_status} in {bystander_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Synthetic data generator for users, vehicles and bookings.
+
+Seeded rows use a 'seed_' username prefix so they can be removed again with
+--clear. Every seeded user's password is 'password'. Users seed_0 .. seed_<d-1>
+are drivers, the rest passengers, and the last --admins users are also admins
+(see seeded_usernames()).
+
+    python -m benchmarks.seed --users 2000 --vehicles 150
+    SQLITE_PATH=/tmp/bench.db python -m benchmarks.seed --users 5000 --clear
+    DATABASE_URL=postgres://... python -m benchmarks.seed --users 2000
+"""
+import argparse
+import os
+import random
+import time
+from werkzeug.security import generate_password_hash
+
+PREFIX = 'seed_'
+PASSWORD = 'password'
+RESIDENCES = ['Unit 1', 'Unit 2', 'Unit 3', 'Foothill', 'Clark Kerr', 'Blackwell',
+              'Northside Apt', 'Southside Apt', 'Co-op', 'Off campus']
+GRADES = ['Freshman', 'Sophomore', 'Junior', 'Senior', 'Grad']
+FIRST = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Chris', 'Jamie', 'Morgan', 'Casey', 'Riley', 'Drew',
+         'Avery', 'Quinn', 'Jesse', 'Cameron', 'Reese', 'Rowan', 'Skyler', 'Hayden', 'Emerson', 'Parker']
+LAST = ['Kim', 'Lee', 'Park', 'Chen', 'Nguyen', 'Garcia', 'Smith', 'Lopez', 'Wong', 'Patel',
+        'Choi', 'Tran', 'Lin', 'Wu', 'Huang', 'Martinez', 'Johnson', 'Brown', 'Davis', 'Yang']
+
+
+def _placeholder():
+    return "%s" if os.environ.get('DATABASE_URL') else "?"
+
+
+def driver_count(users, vehicles):
+    """Drivers seed() creates: one or two pickup locations each"""
+    return max(1, min(users, round(vehicles / 1.5)))
+
+
+def seeded_usernames(users, vehicles, admins=0):
+    """
+    Usernames seed() creates for a given scale.
+
+    Returns:
+        dict: 'drivers', 'passengers' and 'admins' username lists
+    """
+    drivers = driver_count(users, vehicles)
+    return {
+        'drivers': [f'{PREFIX}{i}' for i in range(drivers)],
+        'passengers': [f'{PREFIX}{i}' for i in range(drivers, users)],
+        'admins': [f'{PREFIX}{i}' for i in range(max(drivers, users - admins), users)],
+    }
+
+
+def clear(conn):
+    """Remove everything previously seeded"""
+    cur = conn.cursor()
+    like = f"'{PREFIX}%'"
+    cur.execute(f"DELETE FROM bookings WHERE passenger_id IN (SELECT id FROM users WHERE username LIKE {like})")
+    cur.execute(f"DELETE FROM bookings WHERE vehicle_id IN (SELECT v.id FROM vehicles v JOIN users u ON v.driver_id = u.id WHERE u.username LIKE {like})")
+    cur.execute(f"DELETE FROM vehicles WHERE driver_id IN (SELECT id FROM users WHERE username LIKE {like})")
+    cur.execute(f"DELETE FROM users WHERE username LIKE {like}")
+    conn.commit()
+
+
+def seed(conn, users=2000, vehicles=150, fill=0.8, remembered=0.3, rng_seed=42, admins=0):
+    """
+    Insert a realistic board: drivers with one or two pickup locations each,
+    and passengers booked until drivers are roughly `fill` full.
+
+    Args:
+        conn: Open database connection
+        users: Total users to create (drivers + passengers)
+        vehicles: Pickup locations to create
+        fill: Target fraction of total driver capacity that is booked
+        remembered: Fraction of vehicles with remember_vehicle set
+        rng_seed: Random seed so runs are comparable
+        admins: Passengers (taken from the end) that are also admins
+
+    Returns:
+        dict: Counts of inserted rows
+    """
+    rng = random.Random(rng_seed)
+    ph = _placeholder()
+    cur = conn.cursor()
+    password_hash = generate_password_hash(PASSWORD)
+
+    drivers = driver_count(users, vehicles)
+    admin_names = set(seeded_usernames(users, vehicles, admins)['admins'])
+    user_rows = []
+    for i in range(users):
+        is_driver = i < drivers
+        user_rows.append((
+            f'{PREFIX}{i}', password_hash, f'{rng.choice(FIRST)} {rng.choice(LAST)} {i}',
+            rng.choice(GRADES), is_driver, f'{PREFIX}{i}' in admin_names, f'555-{i:04d}', f'{PREFIX}{i}@example.com',
+            rng.randint(4, 8) if is_driver else None, rng.choice(RESIDENCES)
+        ))
+    cur.executemany(f"""
+        INSERT INTO users (username, password_hash, full_name, grade, is_driver, is_admin,
+                           phone_number, email, driver_capacity, residence)
+        VALUES ({', '.join([ph] * 10)})
+    """, user_rows)
+
+    cur.execute(f"SELECT id, username, driver_capacity FROM users WHERE username LIKE '{PREFIX}%'")
+    rows = cur.fetchall()
+    index_of = {row['username']: row for row in rows}
+    driver_rows = [index_of[f'{PREFIX}{i}'] for i in range(drivers)]
+    passenger_ids = [index_of[f'{PREFIX}{i}']['id'] for i in range(drivers, users)]
+
+    vehicle_rows = []
+    for v in range(vehicles):
+        driver = driver_rows[v % drivers]
+        vehicle_rows.append((driver['id'], f'Stop {v}', rng.random() < remembered))
+    cur.executemany(f"INSERT INTO vehicles (driver_id, vehicle_name, remember_vehicle) VALUES ({ph}, {ph}, {ph})",
+                    vehicle_rows)
+
+    cur.execute(f"""
+        SELECT v.id, v.driver_id, u.driver_capacity FROM vehicles v
+        JOIN users u ON v.driver_id = u.id WHERE u.username LIKE '{PREFIX}%'
+    """)
+    vehicles_by_driver = {}
+    capacity = {}
+    for row in cur.fetchall():
+        vehicles_by_driver.setdefault(row['driver_id'], []).append(row['id'])
+        capacity[row['driver_id']] = row['driver_capacity'] or 0
+
+    # Book passengers until each driver reaches its share of capacity
+    rng.shuffle(passenger_ids)
+    booking_rows = []
+    for driver_id, vehicle_ids in vehicles_by_driver.items():
+        seats = int(capacity[driver_id] * fill)
+        for _ in range(seats):
+            if not passenger_ids:
+                break
+            booking_rows.append((passenger_ids.pop(), rng.choice(vehicle_ids)))
+    cur.executemany(f"INSERT INTO bookings (passenger_id, vehicle_id) VALUES ({ph}, {ph})", booking_rows)
+
+    conn.commit()
+    return {'users': users, 'drivers': drivers, 'admins': len(admin_names), 'vehicles': vehicles,
+            'bookings': len(booking_rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--vehicles', type=int, default=150)
+    parser.add_argument('--fill', type=float, default=0.8, help='fraction of driver capacity booked')
+    parser.add_argument('--admins', type=int, default=1, help='passengers that are also admins')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    parser.add_argument('--clear', action='store_true', help='remove previously seeded rows first')
+    parser.add_argument('--clear-only', action='store_true', help='remove seeded rows and exit')
+    args = parser.parse_args()
+
+    from db import get_db_connection, release_db_connection, init_db
+    init_db()
+    conn = get_db_connection()
+    try:
+        if args.clear or args.clear_only:
+            clear(conn)
+            print("🧹 Removed previously seeded rows")
+        if args.clear_only:
+            return
+        started = time.perf_counter()
+        counts = seed(conn, args.users, args.vehicles, args.fill, rng_seed=args.seed, admins=args.admins)
+        print(f"🌱 Seeded {counts} in {time.perf_counter() - started:.1f}s")
+    finally:
+        release_db_connection(conn)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+SQLite micro-benchmark: connect-per-request vs one persistent connection per thread.
+
+"legacy" reproduces the old db.get_db_connection(): sqlite3.connect() plus
+PRAGMA journal_mode=WAL on every call, closed on release. "per-thread" is the
+current backend (PRAGMAs applied once, connection reused).
+
+Two workloads are measured, each with the same thread count as gunicorn:
+  - db:      the queries behind a /profile view, straight through get_db()
+  - profile: full GET /profile requests through the Flask test client
+
+    python -m benchmarks.sqlite_connections --requests 3000 --threads 2
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+os.environ.pop('DATABASE_URL', None)
+os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'sqlite_bench.db'))
+
+import db
+from benchmarks.seed import seed, PREFIX, PASSWORD
+
+_real_get = db.get_db_connection
+_real_release = db.release_db_connection
+
+
+def legacy_get_db_connection():
+    conn = sqlite3.connect(db.SQLITE_PATH, timeout=30, isolation_level='DEFERRED', check_same_thread=False)
+    conn.row_factory = db._dict_factory
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+
+def legacy_release_db_connection(conn):
+    conn.close()
+
+
+def use_backend(name):
+    if name == 'legacy':
+        db.get_db_connection = legacy_get_db_connection
+        db.release_db_connection = legacy_release_db_connection
+    else:
+        db.get_db_connection = _real_get
+        db.release_db_connection = _real_release
+
+
+def run_threads(threads, requests, fn):
+    per_thread = requests // threads
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(i):
+        barrier.wait()
+        for n in range(per_thread):
+            fn(i, n)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in pool:
+        t.join()
+    return per_thread * threads / (time.perf_counter() - started)
+
+
+def db_workload(user_ids):
+    def request(i, n):
+        user_id = user_ids[(i * 7919 + n) % len(user_ids)]
+        with db.get_db() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id, username, full_name, is_driver, is_admin FROM users WHERE id = ?", (user_id,))
+            cur.fetchone()
+            cur.execute("SELECT username, grade, residence, phone_number, email, driver_capacity FROM users WHERE id = ?", (user_id,))
+            cur.fetchone()
+            cur.execute("SELECT id, vehicle_name, remember_vehicle FROM vehicles WHERE driver_id = ?", (user_id,))
+            cur.fetchall()
+    return request
+
+
+def profile_workload(threads):
+    from app import app
+    clients = []
+    for i in range(threads):
+        client = app.test_client()
+        client.post('/login', data={'username': f'{PREFIX}{i}', 'password': PASSWORD})
+        clients.append(client)
+
+    def request(i, n):
+        response = clients[i].get('/profile')
+        assert response.status_code == 200, response.status_code
+    return request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--users', type=int, default=2000)
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_db() as conn:
+        seed(conn, users=args.users, vehicles=150)
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM users")
+        user_ids = [row['id'] for row in cur.fetchall()]
+
+    results = {}
+    for workload in ('db', 'profile'):
+        for backend in ('legacy', 'per-thread'):
+            use_backend(backend)
+            fn = db_workload(user_ids) if workload == 'db' else profile_workload(args.threads)
+            run_threads(args.threads, min(200, args.requests), fn)  # warm up
+            results[(workload, backend)] = run_threads(args.threads, args.requests, fn)
+    use_backend('per-thread')
+
+    print(f"\n{args.requests} requests, {args.threads} threads ({sqlite3.sqlite_version=})")
+    print(f"{'workload':<10} {'legacy req/s':>14} {'per-thread req/s':>18} {'speedup':>8}")
+    for workload in ('db', 'profile'):
+        legacy = results[(workload, 'legacy')]
+        persistent = results[(workload, 'per-thread')]
+        print(f"{workload:<10} {legacy:>14.0f} {persistent:>18.0f} {persistent / legacy:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
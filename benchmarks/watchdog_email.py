@@ -0,0 +1,70 @@
+"""
+Time the watchdog's backup email: the rides query and the body rendering.
+
+Seeds a scratch database and reports the median of --repeat runs of
+get_all_rides_data(), format_rides_email() and format_rides_text() (skipped
+on older checkouts that don't have it), plus the number of queries.
+
+    python -m benchmarks.watchdog_email --users 2000 --vehicles 200
+    DATABASE_URL=postgres://.../scratch_db python -m benchmarks.watchdog_email
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'watchdog_bench.db'))
+
+import db
+import watchdog_scheduler
+from benchmarks.seed import seed, clear
+from sqltrace import query_budget
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--vehicles', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    db.init_db()
+    with db.get_db() as conn:
+        clear(conn)
+        counts = seed(conn, users=args.users, vehicles=args.vehicles)
+
+    with query_budget(float('inf')) as trace:
+        rides = watchdog_scheduler.get_all_rides_data()
+    status = 'Website returned HTTP 502'
+    html_body = watchdog_scheduler.format_rides_email(rides, status)
+
+    results = [
+        ('get_all_rides_data', median_ms(watchdog_scheduler.get_all_rides_data, args.repeat),
+         f"{len(trace)} queries"),
+        ('format_rides_email', median_ms(lambda: watchdog_scheduler.format_rides_email(rides, status), args.repeat),
+         f"{len(html_body) / 1024:.0f} KB"),
+    ]
+    format_text = getattr(watchdog_scheduler, 'format_rides_text', None)
+    if format_text is not None:
+        results.append(('format_rides_text', median_ms(lambda: format_text(rides, status), args.repeat),
+                        f"{len(format_text(rides, status)) / 1024:.0f} KB"))
+
+    print(f"\n{counts['vehicles']} vehicles, {counts['bookings']} bookings, median of {args.repeat} runs")
+    print(f"{'step':<22} {'ms':>8}  notes")
+    for label, ms, notes in results:
+        print(f"{label:<22} {ms:>8.2f}  {notes}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+In-process caches for hot read paths.
+
+BoardCache holds the ride board (the vehicles/passengers list shown on the
+index page). The board only changes when someone joins, leaves, or a vehicle
+is added/removed, so every mutating route calls board_cache.invalidate() after
+committing. Each invalidation bumps a monotonically increasing version.
+Clients see the version as a tag (ETag, /stream/rides, data-version) that
+also carries a per-process epoch, because the counter starts again at 1 in
+every new process.
+
+TTLCache is a small bounded LRU with per-entry expiry, used for lookups such as
+the logged-in user that would otherwise hit the database on every request.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+# Safety net for writes made by other processes (e.g. the weekly reset job
+# running from GitHub Actions). In-process writes invalidate immediately.
+BOARD_CACHE_TTL = float(os.environ.get('BOARD_CACHE_TTL', '30'))
+
+
+class BoardCache:
+    """Versioned snapshot of the ride board, served from memory"""
+
+    def __init__(self, ttl=BOARD_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._version = 1
+        # Restarts and recycled workers count from 1 again; the epoch keeps their tags apart
+        self.epoch = secrets.token_hex(4)
+        self._data = None
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def tag(self, version):
+        """The version as handed to clients; never repeats across processes"""
+        return f"{self.epoch}-{version}"
+
+    def is_fresh(self):
+        """True if a snapshot is cached and has not expired"""
+        return self._data is not None and (time.monotonic() - self._loaded_at) < self.ttl
+
+    def fresh_version(self):
+        """Current version if a fresh snapshot is cached, else None (never queries)"""
+        with self._lock:
+            return self._version if self.is_fresh() else None
+
+    def get(self, loader):
+        """
+        Return the cached board, calling loader() to rebuild it on a miss.
+
+        Args:
+            loader: Callable returning the board data (list of vehicle dicts)
+
+        Returns:
+            The board data. Callers must treat it as read-only.
+        """
+        return self.snapshot(loader)[1]
+
+    def snapshot(self, loader):
+        """Like get(), but returns (version, data) read together"""
+        with self._lock:
+            if self.is_fresh():
+                self.hits += 1
+                return self._version, self._data
+            self.misses += 1
+            version = self._version
+            previous = self._data
+
+        # Query outside the lock so a slow database doesn't block cache hits
+        data = loader()
+
+        with self._lock:
+            # Only store if nobody invalidated while we were querying,
+            # otherwise we'd cache pre-write data under the new version
+            if self._version == version:
+                # Expired (not invalidated) and content changed under us:
+                # another process wrote to the database, so move the version on
+                if previous is not None and previous != data:
+                    self._version += 1
+                self._data = data
+                self._loaded_at = time.monotonic()
+                return self._version, data
+        # Invalidated while loading - the data is still newer than what the
+        # caller had, but report the version it was loaded under
+        return version, data
+
+    def invalidate(self):
+        """Drop the cached board and bump the version (call after commit)"""
+        with self._lock:
+            self._version += 1
+            self._data = None
+            return self._version
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'version': self._version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        # Bumped on every delete/clear so a load that raced an invalidation
+        # can't store stale data (see set(..., generation=...))
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            # Evict least recently used entries beyond the size bound
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# Shared instance used by the web app
+board_cache = BoardCache()
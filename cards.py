@@ -0,0 +1,192 @@
+"""
+Ride board cards, rendered once per vehicle instead of once per page view.
+
+index.html used to loop over every vehicle and passenger on every request,
+although a booking only changes a card or two. Each card's HTML now comes
+from templates/_vehicle_card.html and is kept until that vehicle's content
+(name, driver, seat counts, passengers) changes.
+
+What depends on the viewer is left out of the cached HTML as <!--@slot-->
+markers: the YOU badge, the ✕ buttons and the join button. VehicleCard keeps
+the text between the markers plus each slot's pre-rendered HTML. Most viewers
+see a card exactly like everyone else in their group (guests; members with or
+without a seat; admins with or without a seat), so each group's version of a
+card is joined once and reused. Only cards the viewer is on, as driver or
+passenger, are filled in per request. A full board is then one join over
+cached strings plus one or two small fills.
+"""
+import re
+import threading
+from collections import namedtuple
+
+from flask import current_app
+from markupsafe import Markup
+
+CARD_TEMPLATE = '_vehicle_card.html'
+SLOT = re.compile(r'<!--@(\w+)(?::(\d+))?-->')
+
+# Stands in for "has a seat in some other vehicle" when filling a group's version of a card
+ELSEWHERE = -1
+
+Viewer = namedtuple('Viewer', ['user_id', 'is_admin', 'vehicle_id'])
+
+
+def join_state(car_id, is_full, viewer):
+    """Which join button a viewer gets on a card (see the join macro)"""
+    if viewer is None:
+        return 'full' if is_full else 'login'
+    if viewer.vehicle_id is None and not is_full:
+        return 'add'
+    if viewer.vehicle_id == car_id:
+        return 'none'
+    return 'full' if is_full else 'booked'
+
+
+def content_key(car):
+    """Everything a card's cached HTML depends on"""
+    return (car['name'], car['driver'], car['driver_phone'], car['driver_id'], car['driver_capacity'],
+            car['driver_total_passengers'], car['is_full'],
+            tuple((person['id'], person['full_name']) for person in car['passengers']))
+
+
+class VehicleCard:
+    """One vehicle's card: cached HTML with the viewer-dependent slots left open"""
+
+    def __init__(self, car):
+        macros = current_app.jinja_env.get_template(CARD_TEMPLATE).module
+        self.vehicle_id = car['id']
+        self.driver_id = car['driver_id']
+        self.is_full = car['is_full']
+        self.passenger_ids = frozenset(person['id'] for person in car['passengers'])
+        self._views = {}
+
+        html = str(macros.card(car))
+        self._parts = []
+        end = 0
+        for match in SLOT.finditer(html):
+            self._parts.append(html[end:match.start()])
+            kind, passenger_id = match.group(1), match.group(2)
+            passenger_id = int(passenger_id) if passenger_id else None
+            if kind == 'remove_vehicle':
+                slot = str(macros.remove_vehicle(car))
+            elif kind == 'you':
+                slot = str(macros.you())
+            elif kind == 'remove_passenger':
+                slot = str(macros.remove_passenger(car, passenger_id))
+            else:
+                slot = {state: str(macros.join(car, state)) for state in ('add', 'full', 'booked', 'login', 'none')}
+            self._parts.append((kind, passenger_id, slot))
+            end = match.end()
+        self._parts.append(html[end:])
+
+    def _fill(self, viewer):
+        user_id = viewer.user_id if viewer else None
+        is_admin = bool(viewer and viewer.is_admin)
+        out = []
+        for part in self._parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            kind, passenger_id, slot = part
+            if kind == 'join':
+                out.append(slot[join_state(self.vehicle_id, self.is_full, viewer)])
+            elif kind == 'remove_vehicle':
+                if viewer and (is_admin or self.driver_id == user_id):
+                    out.append(slot)
+            elif kind == 'you':
+                if viewer and passenger_id == user_id:
+                    out.append(slot)
+            elif viewer and (is_admin or passenger_id == user_id):
+                out.append(slot)
+        return ''.join(out)
+
+    def html(self, viewer):
+        """
+        The card as viewer sees it.
+
+        Args:
+            viewer: Viewer, or None for a guest
+
+        Returns:
+            str: Escaped HTML
+        """
+        if viewer is not None and (viewer.user_id == self.driver_id or viewer.user_id in self.passenger_ids):
+            return self._fill(viewer)
+        group = None if viewer is None else (bool(viewer.is_admin), viewer.vehicle_id is not None)
+        html = self._views.get(group)
+        if html is None:
+            stand_in = None if group is None else Viewer(None, group[0], ELSEWHERE if group[1] else None)
+            html = self._views[group] = self._fill(stand_in)
+        return html
+
+
+class CardCache:
+    """The current board's VehicleCards; only vehicles whose content changed are re-rendered"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._board = None      # board_cache's data list the cards below were built from
+        self._cards = []
+        self._seats = {}        # passenger id -> vehicle id
+        self._by_vehicle = {}   # vehicle id -> (content_key, VehicleCard)
+        self.rendered = 0
+        self.reused = 0
+
+    def cards(self, board):
+        """
+        Cards for a ride board from board_cache, in board order.
+
+        board_cache hands out the same list until the board changes, so the
+        usual case is an identity check.
+
+        Returns:
+            tuple: ([VehicleCard], {passenger id: vehicle id})
+        """
+        with self._lock:
+            if board is self._board:
+                return self._cards, self._seats
+            cards, seats, by_vehicle = [], {}, {}
+            for car in board:
+                key = content_key(car)
+                cached = self._by_vehicle.get(car['id'])
+                if cached is not None and cached[0] == key:
+                    card = cached[1]
+                    self.reused += 1
+                else:
+                    card = VehicleCard(car)
+                    self.rendered += 1
+                by_vehicle[car['id']] = (key, card)
+                cards.append(card)
+                for person in car['passengers']:
+                    seats[person['id']] = car['id']
+            self._board, self._cards, self._seats, self._by_vehicle = board, cards, seats, by_vehicle
+            return cards, seats
+
+    def stats(self):
+        return {
+            'cards': len(self._cards),
+            'rendered': self.rendered,
+            'reused': self.reused,
+        }
+
+
+card_cache = CardCache()
+
+
+def render_board(board, user):
+    """
+    The ride board's cards as HTML for a user, plus the vehicle they have a seat in.
+
+    Args:
+        board: Vehicle dicts from board_cache (load_ride_board)
+        user: current_user
+
+    Returns:
+        tuple: (Markup, vehicle id or None)
+    """
+    cards, seats = card_cache.cards(board)
+    if not user.is_authenticated:
+        return Markup(''.join([card.html(None) for card in cards])), None
+    my_vehicle = seats.get(user.id)
+    viewer = Viewer(user.id, bool(user.is_admin), my_vehicle)
+    return Markup(''.join([card.html(viewer) for card in cards])), my_vehicle
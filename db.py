@@ -1,188 +1,382 @@
 import os
-import sqlite3
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2 import pool
-from contextlib import contextmanager
+import sys
+import threading
 import time
+from contextlib import contextmanager
+from db_pool import ConnectionPool, PoolTimeout
+import sqltrace
+
+# The driver that isn't in use is never imported: psycopg2 and sqlite3 are
+# imported inside the functions below, which only run for their own database.
+# That keeps psycopg2 (~10 ms) off a local start and sqlite3 off a cold start
+# in production.
+
+# Local SQLite database file (override for scratch databases, e.g. benchmarks)
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'church_ride.db')
+
+# PostgreSQL pool sizing - Leapcell free tier can handle 2-10 connections
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '2'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))  # seconds a checkout may wait
+DB_POOL_MAX_AGE = float(os.environ.get('DB_POOL_MAX_AGE', '1800'))  # recycle connections after 30 min
 
 # PostgreSQL connection pool for production (prevents connection exhaustion)
 _pg_pool = None
+_pg_pool_lock = threading.Lock()
+
+def green_mode():
+    """
+    True when gevent has monkey-patched this process (WORKER_MODE=gevent, see
+    gunicorn.conf.py). Threads and thread-locals are then greenlets, so
+    blocking calls must yield to the event loop instead of stalling it.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+def _gevent_wait(conn, timeout=None):
+    """psycopg2 wait callback: let other greenlets run while PostgreSQL works (like psycogreen)"""
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+def _pg_connect():
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    return psycopg2.connect(
+        os.environ['DATABASE_URL'],
+        cursor_factory=RealDictCursor,
+        connect_timeout=10,
+        options='-c statement_timeout=30000'
+    )
+
+def _pg_reset(conn):
+    """Roll back anything left open; False if the connection is unusable"""
+    from psycopg2 import extensions
+    if conn.closed:
+        return False
+    status = conn.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    return True
+
+def _pg_ping(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT 1")
+    cur.close()
+    conn.rollback()
+    return True
 
 def _get_pg_pool():
     """Get or create PostgreSQL connection pool (singleton pattern)"""
     global _pg_pool
-    if _pg_pool is None:
-        database_url = os.environ.get('DATABASE_URL')
-        if database_url:
-            # Create connection pool with 2-10 connections
-            # Leapcell free tier can handle this range
-            _pg_pool = pool.SimpleConnectionPool(
-                minconn=2,  # Minimum connections
-                maxconn=10,  # Maximum connections (safe for free tier)
-                dsn=database_url,
-                cursor_factory=RealDictCursor,
-                connect_timeout=10,
-                options='-c statement_timeout=30000'
-            )
+    if _pg_pool is None and os.environ.get('DATABASE_URL'):
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                if green_mode():
+                    # Without this every query blocks the whole worker, not just its greenlet
+                    from psycopg2 import extensions
+                    extensions.set_wait_callback(_gevent_wait)
+                _pg_pool = ConnectionPool(
+                    _pg_connect,
+                    minconn=DB_POOL_MIN,
+                    maxconn=DB_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_age=DB_POOL_MAX_AGE,
+                    reset=_pg_reset,
+                    ping=_pg_ping
+                )
     return _pg_pool
 
-def get_db_connection():
-    """Get database connection with retry logic for SQLite locking issues"""
-    database_url = os.environ.get('DATABASE_URL')
+def pool_stats():
+    """Connection pool statistics (None when connections aren't pooled, i.e. threaded SQLite)"""
+    pool = _pg_pool or _sqlite_pool
+    return pool.stats() if pool else None
 
-    if database_url:
-        # Production (Leapcell/PostgreSQL) - use connection pooling
-        pg_pool = _get_pg_pool()
-        if pg_pool:
-            try:
-                conn = pg_pool.getconn()
-                return conn
-            except pool.PoolError:
-                # Pool exhausted, fall back to direct connection
-                return psycopg2.connect(
-                    database_url,
-                    cursor_factory=RealDictCursor,
-                    connect_timeout=10,
-                    options='-c statement_timeout=30000'
-                )
-    else:
-        # Development (Local SQLite) - with retry logic for rapid clicks
-        max_retries = 5
-        retry_delay = 0.1  # 100ms between retries
+# Applied once when a thread opens its SQLite connection (not on every request)
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),      # readers don't block the writer
+    ('synchronous', 'NORMAL'),    # safe with WAL, far fewer fsyncs than FULL
+    ('cache_size', '-16000'),     # ~16 MB page cache per connection
+    ('mmap_size', '268435456'),   # memory-map up to 256 MB of the file
+    ('busy_timeout', '30000'),    # wait up to 30s for a lock instead of failing
+    ('foreign_keys', 'ON'),       # SQLite ignores ON DELETE CASCADE unless this is on
+)
 
-        for attempt in range(max_retries):
-            try:
-                conn = sqlite3.connect(
-                    'church_ride.db',
-                    timeout=30,  # Increased from 10 to 30 seconds
-                    isolation_level='DEFERRED',  # Less aggressive locking
-                    check_same_thread=False  # Allow multi-threaded access
+_sqlite_local = threading.local()
+
+# Green mode only: greenlets live for one request, so a connection per
+# greenlet would be opened and thrown away every time. They borrow from a
+# bounded pool instead, which also caps open connections however many
+# clients are connected.
+_sqlite_pool = None
+_sqlite_pool_lock = threading.Lock()
+
+def _sqlite_connect():
+    import sqlite3
+    conn = sqlite3.connect(
+        SQLITE_PATH,
+        timeout=30,
+        isolation_level='DEFERRED'
+    )
+    # Dict rows so code can use row['col'] and row.get() like RealDictCursor
+    conn.row_factory = _dict_factory
+    for name, value in SQLITE_PRAGMAS:
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+def _sqlite_reset(conn):
+    if conn.in_transaction:
+        conn.rollback()
+    return True
+
+def _get_sqlite_pool():
+    global _sqlite_pool
+    if _sqlite_pool is None:
+        with _sqlite_pool_lock:
+            if _sqlite_pool is None:
+                _sqlite_pool = ConnectionPool(
+                    _sqlite_connect,
+                    maxconn=DB_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_age=0,  # never recycled, like the per-thread connections
+                    reset=_sqlite_reset
                 )
-                conn.row_factory = sqlite3.Row
-                # Enable WAL mode for better concurrent access
-                conn.execute('PRAGMA journal_mode=WAL')
-                return conn
-            except sqlite3.OperationalError as e:
-                if 'database is locked' in str(e) and attempt < max_retries - 1:
-                    # Database locked, retry after brief delay
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    # Max retries exceeded or different error
-                    raise
+    return _sqlite_pool
 
+def _get_sqlite_connection():
+    """This thread's (or greenlet's) SQLite connection, opened (and PRAGMAs applied) on first use"""
+    conn = getattr(_sqlite_local, 'conn', None)
+    if conn is None:
+        pooled = green_mode()
+        conn = _get_sqlite_pool().getconn() if pooled else _sqlite_connect()
+        _sqlite_local.conn = conn
+        _sqlite_local.pooled = pooled
+        _sqlite_local.depth = 0
+    # Nested checkouts share the connection; only the outermost release resets it
+    _sqlite_local.depth += 1
     return conn
 
-def release_db_connection(conn):
-    """Properly release database connection back to pool or close it"""
-    database_url = os.environ.get('DATABASE_URL')
+def close_thread_connection():
+    """Close the calling thread's SQLite connection (e.g. before deleting the file)"""
+    conn = getattr(_sqlite_local, 'conn', None)
+    if conn is not None:
+        _sqlite_local.conn = None
+        if _sqlite_local.pooled:
+            _sqlite_pool.putconn(conn, discard=True)
+        else:
+            conn.close()
+
+def _dict_factory(cursor, row):
+    """SQLite row factory returning plain dicts (matches psycopg2's RealDictCursor)"""
+    return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
+
+class QueryStats:
+    """Database work done by one request (see begin_query_stats)"""
+    __slots__ = ('queries', 'db_time', 'pool_wait')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0    # seconds in execute/commit/rollback
+        self.pool_wait = 0.0  # seconds waiting for a pooled connection
+
+_query_stats = threading.local()
+
+def begin_query_stats():
+    """Start counting this thread's queries; returns the QueryStats being filled in"""
+    stats = QueryStats()
+    _query_stats.current = stats
+    return stats
+
+def end_query_stats():
+    """Stop counting and return what was recorded (None if never started)"""
+    stats = getattr(_query_stats, 'current', None)
+    _query_stats.current = None
+    return stats
+
+def _record_db_time(elapsed, query=False):
+    stats = getattr(_query_stats, 'current', None)
+    if stats is not None:
+        stats.db_time += elapsed
+        if query:
+            stats.queries += 1
+
+class _InstrumentedCursor:
+    """Cursor proxy that times execute()/executemany() (and traces them, see sqltrace.py)"""
+    __slots__ = ('_cursor',)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
 
-    if database_url and _pg_pool:
-        # Return connection to pool
+    def execute(self, sql, params=None):
+        started = time.perf_counter()
         try:
-            _pg_pool.putconn(conn)
-        except:
-            # If pool is full or error, just close it
+            result = self._cursor.execute(sql) if params is None else self._cursor.execute(sql, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            _record_db_time(elapsed, query=True)
+            if sqltrace.active():
+                sqltrace.record(sql, params, elapsed)
+        return self if result is self._cursor else result
+
+    def executemany(self, sql, seq_of_params):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.executemany(sql, seq_of_params)
+        finally:
+            elapsed = time.perf_counter() - started
+            _record_db_time(elapsed, query=True)
+            if sqltrace.active():
+                sqltrace.record(sql, seq_of_params, elapsed)
+        return self if result is self._cursor else result
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name == '_cursor':
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+class _InstrumentedConnection:
+    """Connection proxy handed out by get_db_connection(); feeds QueryStats"""
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self, *args, **kwargs):
+        return _InstrumentedCursor(self.raw.cursor(*args, **kwargs))
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            self.raw.commit()
+        finally:
+            _record_db_time(time.perf_counter() - started)
+
+    def rollback(self):
+        started = time.perf_counter()
+        try:
+            self.raw.rollback()
+        finally:
+            _record_db_time(time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+def get_db_connection():
+    """Get a database connection; pair every call with release_db_connection()"""
+    database_url = os.environ.get('DATABASE_URL')
+
+    # Production (Leapcell/PostgreSQL) blocks until a pooled connection is
+    # free, raising PoolTimeout after DB_POOL_TIMEOUT seconds. Development
+    # (local SQLite) keeps one persistent connection per thread, or borrows
+    # from a pool per greenlet in green mode.
+    started = time.perf_counter()
+    try:
+        conn = _get_pg_pool().getconn() if database_url else _get_sqlite_connection()
+    finally:
+        stats = getattr(_query_stats, 'current', None)
+        if stats is not None:
+            stats.pool_wait += time.perf_counter() - started
+    return _InstrumentedConnection(conn)
+
+def release_db_connection(conn):
+    """Properly release database connection back to pool or close it"""
+    if conn is None:
+        return
+    if isinstance(conn, _InstrumentedConnection):
+        conn = conn.raw
+    if os.environ.get('DATABASE_URL') and _pg_pool:
+        # Return connection to pool (rolls back open transactions, drops broken ones)
+        _pg_pool.putconn(conn)
+    elif conn is getattr(_sqlite_local, 'conn', None):
+        # SQLite - keep the thread's connection open for the next request
+        _sqlite_local.depth -= 1
+        if _sqlite_local.depth <= 0:
+            _sqlite_local.depth = 0
+            if _sqlite_local.pooled:
+                # Green mode - hand it back for the next greenlet (the pool rolls back)
+                _sqlite_local.conn = None
+                _sqlite_pool.putconn(conn)
+                return
+            import sqlite3
             try:
-                conn.close()
-            except:
-                pass
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                # Broken connection - drop it so the next checkout reconnects
+                _sqlite_local.conn = None
+                try:
+                    conn.close()
+                except Exception:
+                    pass
     else:
-        # SQLite - just close normally
         try:
             conn.close()
-        except:
+        except Exception:
             pass
 
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Determine if we're using PostgreSQL or SQLite
-    is_postgres = os.environ.get('DATABASE_URL') is not None
-
-    if is_postgres:
-        # PostgreSQL syntax
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username VARCHAR(50) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            full_name VARCHAR(100) NOT NULL,
-            grade VARCHAR(20),
-            is_driver BOOLEAN DEFAULT FALSE,
-            is_admin BOOLEAN DEFAULT FALSE,
-            phone_number VARCHAR(20),
-            email VARCHAR(100),
-            driver_capacity INTEGER,
-            residence VARCHAR(100)
-        );
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS vehicles (
-            id SERIAL PRIMARY KEY,
-            driver_id INTEGER REFERENCES users(id),
-            vehicle_name VARCHAR(50),
-            remember_vehicle BOOLEAN DEFAULT FALSE
-        );
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS bookings (
-            id SERIAL PRIMARY KEY,
-            passenger_id INTEGER UNIQUE REFERENCES users(id),
-            vehicle_id INTEGER REFERENCES vehicles(id)
-        );
-        """)
+def iter_rows(conn, sql, params=None, batch_size=500):
+    """
+    Yield the rows of a query without loading the whole result into memory.
+
+    On PostgreSQL this uses a server-side (named) cursor so rows arrive in
+    batches; SQLite cursors already step through results lazily.
+    """
+    if os.environ.get('DATABASE_URL'):
+        cur = conn.cursor(name=f'iter_rows_{threading.get_ident()}_{id(sql)}')
     else:
-        # SQLite syntax
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            full_name TEXT NOT NULL,
-            grade TEXT,
-            is_driver INTEGER DEFAULT 0,
-            is_admin INTEGER DEFAULT 0,
-            phone_number TEXT,
-            email TEXT,
-            driver_capacity INTEGER,
-            residence TEXT
-        );
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS vehicles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            driver_id INTEGER REFERENCES users(id),
-            vehicle_name TEXT,
-            remember_vehicle INTEGER DEFAULT 0
-        );
-        """)
-
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            passenger_id INTEGER UNIQUE REFERENCES users(id),
-            vehicle_id INTEGER REFERENCES vehicles(id)
-        );
-        """)
-
-    conn.commit()
-    conn.close()
+        cur = conn.cursor()
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close()
+
+def init_db():
+    """Create/upgrade the schema by applying pending migrations (see migrate.py)"""
+    from migrate import apply_migrations
+    apply_migrations(verbose=False)
 
 @contextmanager
 def get_db():
-    """Context manager for database connections - ensures proper cleanup"""
+    """
+    Context manager for database connections - always returns the connection
+    to the pool, even if the block raises or returns early.
+
+        with get_db() as conn:
+            cur = conn.cursor()
+            ...
+    """
     conn = get_db_connection()
     try:
         yield conn
     finally:
-        try:
-            conn.close()
-        except:
-            pass
\ No newline at end of file
+        release_db_connection(conn)
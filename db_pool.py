@@ -0,0 +1,199 @@
+"""
+Thread-safe blocking connection pool.
+
+Replaces psycopg2's SimpleConnectionPool, which isn't thread-safe and raises
+PoolError when empty. Here a checkout waits (up to a timeout) for a connection
+to come back instead of opening unpooled ones. Connections are recycled after
+max_age seconds or when they come back broken, and stats() reports in-use /
+idle counts, checkout totals and wait times.
+
+The pool is driver-agnostic: db.py passes in functions that open, check and
+reset connections.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the checkout timeout"""
+
+
+class ConnectionPool:
+    def __init__(self, connect, maxconn=10, minconn=0, timeout=5.0, max_age=1800.0,
+                 reset=None, ping=None, ping_after=30.0):
+        """
+        Args:
+            connect: Callable that opens a new connection
+            maxconn: Maximum connections open at once (idle + in use)
+            minconn: Connections to open up front
+            timeout: Seconds a checkout waits before raising PoolTimeout
+            max_age: Seconds after which a connection is closed and replaced
+            reset: Callable(conn) -> bool run on return; False discards the conn
+            ping: Callable(conn) -> bool run on checkout after ping_after idle seconds
+            ping_after: Idle seconds before a connection is pinged on checkout
+        """
+        self._connect = connect
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_age = max_age
+        self._reset = reset
+        self._ping = ping
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()    # (conn, created_at, returned_at)
+        self._in_use = {}       # id(conn) -> created_at
+        self._size = 0          # idle + in use + being opened
+        self._closed = False
+
+        # Stats
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.waiting = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+        for _ in range(min(minconn, maxconn)):
+            conn = self._connect()
+            self._size += 1
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+
+    def getconn(self, timeout=None):
+        """Check out a connection, blocking up to `timeout` seconds"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            idle = self._take(deadline, timeout)
+            if idle is None:
+                break
+            conn, created_at, returned_at = idle
+            # Checked without the lock: a slow ping or close must not hold up other checkouts
+            now = time.monotonic()
+            if self._expired(conn, created_at, now) or (
+                    self._ping and now - returned_at > self.ping_after and not self._safe(self._ping, conn)):
+                self._close(conn)
+                with self._cond:
+                    self._forget()
+                continue
+            with self._cond:
+                self._checked_out(conn, created_at, started)
+            return conn
+
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._checked_out(conn, time.monotonic(), started)
+        return conn
+
+    def _take(self, deadline, timeout):
+        """
+        Pop an idle entry, or reserve a slot for a new connection (returns None).
+
+        Either way the connection keeps its place in _size until the caller
+        checks it out or forgets it.
+        """
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        return self._idle.pop()
+                    if self._size < self.maxconn:
+                        # Reserve a slot, then connect without holding the lock
+                        self._size += 1
+                        return None
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f"No database connection available after {timeout:.1f}s "
+                                          f"({self.maxconn} in use)")
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+    def putconn(self, conn, discard=False):
+        """Return a connection; broken, expired or unknown connections are closed"""
+        healthy = not discard and (self._reset is None or self._safe(self._reset, conn))
+
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+            # Not ours (or returned twice): don't let it into the pool
+            keep = created_at is not None
+            if keep and (not healthy or self._closed or self._expired(conn, created_at, time.monotonic())):
+                self._forget()
+                keep = False
+            elif keep:
+                self._idle.append((conn, created_at, time.monotonic()))
+                self._cond.notify()
+        if not keep:
+            self._close(conn)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [entry[0] for entry in self._idle]
+            self._idle.clear()
+            for _ in idle:
+                self._forget()
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max': self.maxconn,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiting': self.waiting,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'discarded': self.discarded,
+                'wait_ms_total': round(self.wait_time_total * 1000, 1),
+                'wait_ms_max': round(self.wait_time_max * 1000, 1),
+            }
+
+    # --- internals (_checked_out and _forget need self._cond held) ---
+
+    def _checked_out(self, conn, created_at, started):
+        waited = time.monotonic() - started
+        self._in_use[id(conn)] = created_at
+        self.checkouts += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+
+    def _expired(self, conn, created_at, now):
+        return getattr(conn, 'closed', False) or (self.max_age and now - created_at > self.max_age)
+
+    def _forget(self):
+        """Free the slot of a connection the caller is closing (outside the lock)"""
+        self._size -= 1
+        self.discarded += 1
+        self._cond.notify()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _safe(check, conn):
+        try:
+            return bool(check(conn))
+        except Exception:
+            return False
@@ -0,0 +1,200 @@
+"""
+Admin exports streamed straight from the database.
+
+Both exports read passengers grouped by driver in batches of EXPORT_BATCH_SIZE
+rows and yield output as they go, so memory stays flat no matter how many
+passengers there are. Each batch is its own keyset-paginated query (as in
+admin_sections.py) and gives its connection back before any of its rows are
+sent, so a slow download never holds a pooled connection. The PDF keeps the layout of the old in-browser
+jsPDF export: a title, today's date, then one "Driver: ..." table per driver.
+"""
+import csv
+import io
+import os
+from datetime import datetime
+
+from db import get_db
+from pdfstream import PDFWriter, Canvas, MM, fit_text
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+
+# {where} takes the keyset condition, {placeholder} the LIMIT
+PASSENGERS_BY_DRIVER_SQL = """
+    SELECT d.id as driver_id, d.full_name as driver_name, v.vehicle_name,
+           u.full_name, u.residence, u.email, b.id as booking_id
+    FROM bookings b
+    JOIN users u ON b.passenger_id = u.id
+    JOIN vehicles v ON b.vehicle_id = v.id
+    JOIN users d ON v.driver_id = d.id
+    {where}
+    ORDER BY d.full_name, d.id, u.full_name, b.id
+    LIMIT {placeholder}
+"""
+# Sort key of PASSENGERS_BY_DRIVER_SQL, and the same values' names in each row
+EXPORT_KEY = ('d.full_name', 'd.id', 'u.full_name', 'b.id')
+EXPORT_KEY_FIELDS = ('driver_name', 'driver_id', 'full_name', 'booking_id')
+
+CSV_COLUMNS = ['Driver', 'Pickup Location', 'Passenger', 'Residence', 'Email']
+
+
+def export_date():
+    """Today in the church's timezone (matches the weekly reset)"""
+    # Imported here so only exports pay for loading pytz, not every cold start
+    import pytz
+    return datetime.now(pytz.timezone('America/Los_Angeles')).date()
+
+
+def passengers_by_driver(batch_size=None):
+    """
+    Yield booked passengers ordered by driver, batch_size (default EXPORT_BATCH_SIZE) rows per query.
+
+    No connection is held between batches. A booking made mid-export shows up
+    only if it sorts after the rows already sent.
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    placeholder = "%s" if os.environ.get('DATABASE_URL') else "?"
+    after = None
+    while True:
+        where, params = '', []
+        if after is not None:
+            # Row-value comparison: strictly after the last row of the previous batch
+            where = f"WHERE ({', '.join(EXPORT_KEY)}) > ({', '.join([placeholder] * len(EXPORT_KEY))})"
+            params.extend(after)
+        params.append(batch_size)
+        with get_db() as conn:
+            cur = conn.cursor()
+            cur.execute(PASSENGERS_BY_DRIVER_SQL.format(where=where, placeholder=placeholder), params)
+            rows = cur.fetchall()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = [rows[-1][field] for field in EXPORT_KEY_FIELDS]
+
+
+def _csv_cell(value):
+    value = '' if value is None else str(value)
+    # Keep spreadsheet apps from evaluating user-entered text as a formula
+    if value[:1] in ('=', '+', '-', '@'):
+        value = "'" + value
+    return value
+
+
+def passengers_csv(rows, flush_every=200):
+    """
+    Yield CSV text for the passenger export.
+
+    Args:
+        rows: Iterable of rows from passengers_by_driver()
+        flush_every: Rows buffered per yielded chunk
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM so Excel opens the file as UTF-8
+    writer.writerow(CSV_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_cell(row['driver_name']), _csv_cell(row['vehicle_name']),
+                         _csv_cell(row['full_name']), _csv_cell(row['residence']), _csv_cell(row['email'])])
+        if count % flush_every == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _PassengerReport:
+    """Page layout for the passenger PDF (sizes follow the old jsPDF autotable export)"""
+
+    LEFT = 14 * MM
+    TOP = 14 * MM
+    COLUMN = 90 * MM
+    PADDING = 2 * MM
+    BODY_SIZE, HEAD_SIZE = 8, 9
+    ROW_HEIGHT = BODY_SIZE * 1.15 + 2 * PADDING
+    HEAD_HEIGHT = HEAD_SIZE * 1.15 + 2 * PADDING
+    HEAD_FILL = (13 / 255, 110 / 255, 253 / 255)  # Bootstrap primary blue
+    GRID = (200 / 255, 200 / 255, 200 / 255)
+
+    def __init__(self, writer, title, subtitle):
+        self.writer = writer
+        self.bottom = writer.height - 14 * MM
+        self.page = Canvas(writer.height)
+        self.page.text(self.LEFT, 20 * MM, title, size=18)
+        self.page.text(self.LEFT, 28 * MM, subtitle, size=10)
+        self.y = 35 * MM
+        self.sections = 0
+
+    def _new_page(self):
+        data = self.writer.page(self.page)
+        self.page = Canvas(self.writer.height)
+        self.y = self.TOP
+        return data
+
+    def _cells(self, values, height, size, bold=False, fill=None, color=(0, 0, 0)):
+        for i, value in enumerate(values):
+            x = self.LEFT + i * self.COLUMN
+            self.page.rect(x, self.y, self.COLUMN, height, fill=fill, stroke=self.GRID, line_width=0.1 * MM)
+            text = fit_text(value or '', size, self.COLUMN - 2 * self.PADDING)
+            self.page.text(x + self.PADDING, self.y + self.PADDING + size * 0.9, text, size=size, bold=bold, color=color)
+        self.y += height
+
+    def _table_head(self):
+        self._cells(['Name', 'Residence'], self.HEAD_HEIGHT, self.HEAD_SIZE, bold=True,
+                    fill=self.HEAD_FILL, color=(1, 1, 1))
+
+    def section(self, driver_name):
+        """Start a driver's table; returns any finished page bytes"""
+        data = b''
+        if self.sections:
+            self.y += 10 * MM
+        self.sections += 1
+        # Keep the heading together with the table header and its first row
+        if self.y + 5 * MM + self.HEAD_HEIGHT + self.ROW_HEIGHT > self.bottom:
+            data = self._new_page()
+        self.page.text(self.LEFT, self.y, f"Driver: {driver_name}", size=12, bold=True)
+        self.y += 5 * MM
+        self._table_head()
+        return data
+
+    def row(self, name, residence):
+        """Add a passenger row; returns any finished page bytes"""
+        data = b''
+        if self.y + self.ROW_HEIGHT > self.bottom:
+            data = self._new_page()
+            self._table_head()
+        self._cells([name, residence], self.ROW_HEIGHT, self.BODY_SIZE)
+        return data
+
+    def empty(self):
+        self.page.text(self.LEFT, self.y + 5 * MM, "No passengers assigned to rides yet.", size=10)
+
+    def finish(self):
+        return self.writer.page(self.page) + self.writer.end()
+
+
+def passengers_pdf(rows, today=None):
+    """
+    Yield the passenger PDF (grouped by driver) page by page.
+
+    Args:
+        rows: Iterable of rows from passengers_by_driver()
+        today: Date printed under the title (default: export_date())
+    """
+    today = today or export_date()
+    writer = PDFWriter()
+    yield writer.begin()
+
+    report = _PassengerReport(writer, 'All Passengers', f"{today:%A}, {today:%B} {today.day}, {today.year}")
+    current_driver = None
+    for row in rows:
+        if row['driver_id'] != current_driver:
+            current_driver = row['driver_id']
+            data = report.section(row['driver_name'])
+            if data:
+                yield data
+        data = report.row(row['full_name'], row['residence'])
+        if data:
+            yield data
+
+    if current_driver is None:
+        report.empty()
+    yield report.finish()
@@ -0,0 +1,50 @@
+"""
+Gunicorn settings for the web process (Procfile: gunicorn app:app -c gunicorn.conf.py).
+
+WORKER_MODE picks how the single worker serves requests:
+
+  threads (default)  gthread worker with GUNICORN_THREADS (8) threads. Each
+                     request, and each open /stream/rides connection, holds a
+                     thread until it finishes.
+  gevent             gevent worker: every connection is a greenlet, up to
+                     GUNICORN_WORKER_CONNECTIONS (1000) at once. Slow clients
+                     and live streams cost a few KB each instead of a thread.
+                     db.py sees the monkey-patching and makes PostgreSQL
+                     queries yield to other greenlets (SQLite checkouts come
+                     from a bounded pool), so DB_POOL_MAX still caps database
+                     connections. Needs the gevent package.
+
+Before a worker takes its first request, post_worker_init warms it up
+(startup.py: database pool, templates, ride board and its cards). WARM_UP=0
+skips that.
+
+Both modes run one worker (WEB_CONCURRENCY) to fit the free tier's memory and
+recycle it after ~GUNICORN_MAX_REQUESTS (1000) requests.
+"""
+import os
+
+WORKER_MODE = os.environ.get('WORKER_MODE', 'threads')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+timeout = 60
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))  # 0 = never recycle
+max_requests_jitter = 100
+
+if WORKER_MODE == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+elif WORKER_MODE == 'threads':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+else:
+    raise ValueError(f"WORKER_MODE must be 'threads' or 'gevent', not {WORKER_MODE!r}")
+
+
+def post_worker_init(worker):
+    from startup import WARM_UP, startup_timeline, warm_up
+    # The first workers started with the server; a recycled one is timed from its own fork
+    if worker.age <= worker.cfg.workers:
+        startup_timeline.start_from(worker.ppid)
+    if WARM_UP:
+        warm_up(worker.wsgi)
@@ -0,0 +1,200 @@
+"""
+Live ride-board updates over Server-Sent Events.
+
+After a booking or vehicle change, the app reloads the board once and diffs
+it against the last published board. Compact deltas (passenger added, driver
+now full, ...) are then pushed to every open /stream/rides connection.
+Subscribers only wait on an in-memory queue, so they never hold a database
+connection.
+
+Each open stream does occupy a gunicorn thread, so the number of streams is
+capped (SSE_MAX_SUBSCRIBERS). Under the gevent worker (WORKER_MODE=gevent) a
+stream is only a greenlet, so the default cap is much higher. Streams also
+close after SSE_MAX_STREAM_SECONDS, and the browser's EventSource reconnects
+on its own.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+from cache import board_cache
+
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS', '500' if os.environ.get('WORKER_MODE') == 'gevent' else '4'))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_MAX_STREAM_SECONDS = float(os.environ.get('SSE_MAX_STREAM_SECONDS', '300'))
+SSE_RETRY_MS = 3000
+
+
+def diff_boards(old, new):
+    """
+    Compare two ride boards (lists of vehicle dicts from load_ride_board).
+
+    Returns:
+        list: Delta dictionaries, each with a 'type' key
+    """
+    old_vehicles = {v['id']: v for v in old}
+    new_vehicles = {v['id']: v for v in new}
+    changes = []
+
+    for vehicle_id in old_vehicles.keys() - new_vehicles.keys():
+        changes.append({'type': 'vehicle_removed', 'vehicle_id': vehicle_id})
+
+    for vehicle_id, vehicle in new_vehicles.items():
+        before = old_vehicles.get(vehicle_id)
+        if before is None:
+            changes.append({'type': 'vehicle_added', 'vehicle': vehicle})
+            continue
+
+        if (before['name'], before['driver'], before['driver_phone']) != \
+                (vehicle['name'], vehicle['driver'], vehicle['driver_phone']):
+            changes.append({'type': 'vehicle_updated', 'vehicle_id': vehicle_id, 'name': vehicle['name'],
+                            'driver': vehicle['driver'], 'driver_phone': vehicle['driver_phone']})
+
+        old_passengers = {p['id']: p for p in before['passengers']}
+        new_passengers = {p['id']: p for p in vehicle['passengers']}
+        for passenger_id in old_passengers.keys() - new_passengers.keys():
+            changes.append({'type': 'passenger_removed', 'vehicle_id': vehicle_id, 'passenger_id': passenger_id})
+        for passenger_id in new_passengers.keys() - old_passengers.keys():
+            changes.append({'type': 'passenger_added', 'vehicle_id': vehicle_id,
+                            'passenger': new_passengers[passenger_id]})
+
+    # Capacity is per driver (summed across their vehicles)
+    def driver_state(board):
+        return {v['driver_id']: (v['driver_total_passengers'], v['driver_capacity'], v['is_full']) for v in board}
+
+    old_drivers = driver_state(old)
+    for driver_id, state in driver_state(new).items():
+        if old_drivers.get(driver_id) != state:
+            total, capacity, is_full = state
+            changes.append({'type': 'driver_capacity', 'driver_id': driver_id, 'total': total,
+                            'capacity': capacity, 'is_full': is_full})
+
+    return changes
+
+
+def format_event(event, data, event_id=None):
+    """Encode one SSE message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class RideBroadcaster:
+    """Fan-out of board deltas to SSE subscribers (one queue per stream)"""
+
+    def __init__(self, max_subscribers=SSE_MAX_SUBSCRIBERS, tag=str):
+        """tag turns a board version into what clients see (board_cache.tag)"""
+        self.max_subscribers = max_subscribers
+        self.tag = tag
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+        self._subscribers = set()
+        self._last_board = None
+        self.published = 0
+        self.rejected = 0
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        """Register a stream; returns its queue, or None if the cap is reached"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            q = queue.Queue(maxsize=100)
+            self._subscribers.add(q)
+            return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def set_baseline(self, board):
+        """Board the next diff is computed against (the one a new subscriber saw)"""
+        with self._publish_lock:
+            if self._last_board is None:
+                self._last_board = board
+
+    def board_changed(self, snapshot):
+        """
+        Publish the deltas for a committed change.
+
+        Args:
+            snapshot: Callable returning (version, board) - normally
+                      board_cache.snapshot(load_ride_board), which also re-primes the cache
+        """
+        with self._publish_lock:
+            if not self._subscribers:
+                # Nobody listening: forget the baseline so a later subscriber
+                # doesn't get deltas it has already rendered
+                self._last_board = None
+                return
+            version, board = snapshot()
+            previous, self._last_board = self._last_board, board
+            if previous is None:
+                return
+            changes = diff_boards(previous, board)
+            if changes:
+                self._broadcast(version, format_event('board', {'version': self.tag(version), 'changes': changes},
+                                                      event_id=self.tag(version)))
+
+    def _broadcast(self, version, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((version, message))
+            except queue.Full:
+                # Client isn't keeping up: replace its backlog with a resync
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait((version, format_event('resync', {'version': self.tag(version)})))
+        self.published += 1
+
+    def stream(self, q, current_version):
+        """
+        Generator of SSE messages for one subscriber.
+
+        Args:
+            q: Queue returned by subscribe()
+            current_version: Callable returning the board's current version (no DB access)
+        """
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        try:
+            sent_version = current_version()
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            yield format_event('hello', {'version': self.tag(sent_version)}, event_id=self.tag(sent_version))
+            while time.monotonic() < deadline:
+                try:
+                    sent_version, message = q.get(timeout=SSE_HEARTBEAT_SECONDS)
+                    yield message
+                except queue.Empty:
+                    version = current_version()
+                    if version > sent_version:
+                        # Changed without a delta (e.g. the reset job) - client reloads
+                        sent_version = version
+                        yield format_event('resync', {'version': self.tag(version)}, event_id=self.tag(version))
+                    else:
+                        # Comment line keeps proxies from closing an idle connection
+                        yield ": heartbeat\n\n"
+        finally:
+            self.unsubscribe(q)
+
+    def stats(self):
+        return {
+            'subscribers': len(self._subscribers),
+            'max_subscribers': self.max_subscribers,
+            'published': self.published,
+            'rejected': self.rejected,
+        }
+
+
+# Shared instance used by the web app
+broadcaster = RideBroadcaster(tag=board_cache.tag)
@@ -0,0 +1,313 @@
+"""
+Email delivery with one SMTP session per batch and a local retry queue.
+
+send_batch() connects, upgrades to TLS and logs in once, then sends every
+message over that session (reconnecting once if the server drops it). Any
+message that can't be delivered is written to MAIL_QUEUE_DIR as one JSON file,
+and flush_queue() retries it later with exponential backoff. After
+MAIL_MAX_ATTEMPTS failures the file is moved to MAIL_QUEUE_DIR/dead.
+
+    send_to_all(['a@example.com', 'b@example.com'], subject, html_body, text_body)
+    flush_queue()                  # retry whatever is due
+
+    python mailer.py --flush       # retry due messages now
+    python mailer.py --status      # list queued messages
+
+Settings come from the same variables the watchdog always used: SMTP_SERVER,
+SMTP_PORT (465 means implicit TLS), SENDER_EMAIL and SENDER_PASSWORD. For a
+local SMTP stand-in without TLS or auth, set SMTP_REQUIRE_TLS=0 and leave
+SENDER_PASSWORD empty.
+"""
+import json
+import os
+import random
+import smtplib
+import sys
+import tempfile
+import time
+import uuid
+from collections import namedtuple
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+MAIL_QUEUE_DIR = os.environ.get('MAIL_QUEUE_DIR', 'mail_queue')
+MAIL_RETRY_BASE_SECONDS = float(os.environ.get('MAIL_RETRY_BASE_SECONDS', '300'))
+MAIL_RETRY_MAX_SECONDS = float(os.environ.get('MAIL_RETRY_MAX_SECONDS', '21600'))
+MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', '8'))
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', '30'))
+
+Email = namedtuple('Email', 'to subject html_body text_body')
+
+
+class MailConfigError(Exception):
+    """SENDER_EMAIL (or SENDER_PASSWORD for a real server) is missing"""
+
+
+def smtp_settings():
+    """SMTP settings from the environment (read per call so scripts can set them late)"""
+    return {
+        'server': os.environ.get('SMTP_SERVER', 'smtp.gmail.com'),
+        'port': int(os.environ.get('SMTP_PORT', '587')),
+        'sender': os.environ.get('SENDER_EMAIL'),
+        'password': os.environ.get('SENDER_PASSWORD'),
+        'require_tls': os.environ.get('SMTP_REQUIRE_TLS', '1').lower() not in ('0', 'false', 'no', 'off'),
+    }
+
+
+def parse_recipients(value):
+    """'a@x.org, b@x.org; c@x.org' -> ['a@x.org', 'b@x.org', 'c@x.org'] (order kept, duplicates dropped)"""
+    recipients = []
+    for address in (value or '').replace(';', ',').split(','):
+        address = address.strip()
+        if address and address.lower() not in (r.lower() for r in recipients):
+            recipients.append(address)
+    return recipients
+
+
+def build_message(sender, email):
+    """MIME message with the plain-text part first (clients show the last one they support)"""
+    message = MIMEMultipart('alternative')
+    message['Subject'] = email.subject
+    message['From'] = sender
+    message['To'] = email.to
+    if email.text_body is not None:
+        message.attach(MIMEText(email.text_body, 'plain'))
+    message.attach(MIMEText(email.html_body, 'html'))
+    return message
+
+
+class SMTPSession:
+    """One authenticated SMTP connection, opened on first send and reused until close()"""
+
+    def __init__(self, settings=None):
+        self.settings = settings or smtp_settings()
+        if not self.settings['sender']:
+            raise MailConfigError("SENDER_EMAIL is not set")
+        if self.settings['require_tls'] and not self.settings['password']:
+            raise MailConfigError("SENDER_PASSWORD is not set")
+        self._server = None
+        self.connections = 0
+
+    def _connect(self):
+        s = self.settings
+        if s['port'] == 465:
+            server = smtplib.SMTP_SSL(s['server'], s['port'], timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(s['server'], s['port'], timeout=SMTP_TIMEOUT)
+            server.ehlo()
+            if server.has_extn('starttls'):
+                server.starttls()
+                server.ehlo()
+            elif s['require_tls']:
+                server.close()
+                raise smtplib.SMTPNotSupportedError(f"{s['server']} does not offer STARTTLS")
+        if s['password']:
+            server.login(s['sender'], s['password'])
+        self.connections += 1
+        return server
+
+    def open(self):
+        """Connect and log in now (send() does this lazily)"""
+        if self._server is None:
+            self._server = self._connect()
+
+    def send(self, email):
+        message = build_message(self.settings['sender'], email)
+        self.open()
+        try:
+            self._server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Idle timeout between messages: reconnect once and resend
+            self._server = self._connect()
+            self._server.send_message(message)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except smtplib.SMTPException:
+                self._server.close()
+            except OSError:
+                pass
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Retry queue (one JSON file per message) ---
+
+def _write_entry(entry, queue_dir):
+    os.makedirs(queue_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp.', dir=queue_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, os.path.join(queue_dir, f"{entry['id']}.json"))
+
+
+def retry_delay(attempts):
+    """Seconds to wait after `attempts` failures: doubling from the base, capped, +-20% jitter"""
+    delay = min(MAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), MAIL_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def enqueue(email, error, queue_dir=MAIL_QUEUE_DIR, attempts=1, entry_id=None):
+    """Persist a failed message for a later flush_queue()"""
+    now = time.time()
+    _write_entry({
+        'id': entry_id or f"{int(now)}-{uuid.uuid4().hex[:12]}",
+        'email': email._asdict(),
+        'attempts': attempts,
+        'last_error': str(error),
+        'next_attempt': now + retry_delay(attempts),
+    }, queue_dir)
+
+
+def queued(queue_dir=MAIL_QUEUE_DIR):
+    """Queued entries (dicts), oldest first; unreadable files are skipped"""
+    if not os.path.isdir(queue_dir):
+        return []
+    entries = []
+    for name in sorted(os.listdir(queue_dir)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(queue_dir, name)) as f:
+                entries.append(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Skipping unreadable mail queue file {name}: {e}")
+    return entries
+
+
+def _remove_entry(entry_id, queue_dir):
+    try:
+        os.remove(os.path.join(queue_dir, f"{entry_id}.json"))
+    except FileNotFoundError:
+        pass
+
+
+def _retire_entry(entry, queue_dir):
+    """Give up on an entry: keep it under dead/ for inspection"""
+    dead_dir = os.path.join(queue_dir, 'dead')
+    os.makedirs(dead_dir, exist_ok=True)
+    os.replace(os.path.join(queue_dir, f"{entry['id']}.json"), os.path.join(dead_dir, f"{entry['id']}.json"))
+
+
+# --- Sending ---
+
+def _deliver(emails, settings=None):
+    """Send over one session; returns [(email, error or None)] in input order"""
+    if not emails:
+        return []
+    try:
+        session = SMTPSession(settings)
+    except MailConfigError as e:
+        print(f"ERROR: {e}")
+        return [(email, e) for email in emails]
+
+    outcomes = []
+    with session:
+        try:
+            session.open()
+        except (smtplib.SMTPException, OSError) as e:
+            # Server unreachable or login refused: every message fails the same way
+            print(f"❌ Could not open SMTP session: {e}")
+            return [(email, e) for email in emails]
+        for email in emails:
+            try:
+                session.send(email)
+                outcomes.append((email, None))
+                print(f"✅ Email sent successfully to {email.to}")
+            except (smtplib.SMTPException, OSError) as e:
+                print(f"❌ Error sending email to {email.to}: {e}")
+                outcomes.append((email, e))
+                if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                    # The session itself is broken; the next message reconnects
+                    session.close()
+    return outcomes
+
+
+def send_batch(emails, queue_dir=MAIL_QUEUE_DIR, settings=None):
+    """
+    Send emails over one SMTP session; failures go to the retry queue.
+
+    Args:
+        emails: Iterable of Email tuples
+        queue_dir: Retry queue directory (None to skip queueing)
+        settings: Override smtp_settings()
+
+    Returns:
+        tuple: (sent, queued) lists of Email
+    """
+    outcomes = _deliver(list(emails), settings)
+    failed = [(email, error) for email, error in outcomes if error is not None]
+    if queue_dir is not None:
+        for email, error in failed:
+            enqueue(email, error, queue_dir)
+        if failed:
+            print(f"📥 Queued {len(failed)} email(s) for retry in {queue_dir}")
+    return [email for email, error in outcomes if error is None], [email for email, _ in failed]
+
+
+def send_to_all(recipients, subject, html_body, text_body=None, queue_dir=MAIL_QUEUE_DIR):
+    """
+    Send the same email to each recipient (one message each, so addresses stay private).
+
+    Returns:
+        tuple: (sent, queued) lists of Email
+    """
+    return send_batch([Email(to, subject, html_body, text_body) for to in recipients], queue_dir)
+
+
+def flush_queue(queue_dir=MAIL_QUEUE_DIR, now=None, settings=None):
+    """
+    Retry every queued message whose backoff has expired, over one session.
+
+    Returns:
+        dict: Counts of 'sent', 'requeued', 'dead' and 'waiting' messages
+    """
+    now = time.time() if now is None else now
+    entries = queued(queue_dir)
+    due = [entry for entry in entries if entry['next_attempt'] <= now]
+    result = {'sent': 0, 'requeued': 0, 'dead': 0, 'waiting': len(entries) - len(due)}
+    if not due:
+        return result
+
+    outcomes = _deliver([Email(**entry['email']) for entry in due], settings)
+    for entry, (email, error) in zip(due, outcomes):
+        if error is None:
+            _remove_entry(entry['id'], queue_dir)
+            result['sent'] += 1
+        elif entry['attempts'] + 1 >= MAIL_MAX_ATTEMPTS:
+            _retire_entry(entry, queue_dir)
+            print(f"💀 Giving up on email to {email.to} after {entry['attempts'] + 1} attempts: {error}")
+            result['dead'] += 1
+        else:
+            enqueue(email, error, queue_dir, attempts=entry['attempts'] + 1, entry_id=entry['id'])
+            result['requeued'] += 1
+    return result
+
+
+def main(argv):
+    if argv == ['--flush']:
+        result = flush_queue()
+        print(f"📬 Mail queue: {result['sent']} sent, {result['requeued']} requeued, "
+              f"{result['dead']} given up, {result['waiting']} not due yet")
+        return 0 if not result['requeued'] and not result['dead'] else 1
+    if argv == ['--status']:
+        entries = queued()
+        now = time.time()
+        for entry in entries:
+            print(f"{entry['id']}  to={entry['email']['to']}  attempts={entry['attempts']}  "
+                  f"retry in {max(0, entry['next_attempt'] - now):.0f}s  last error: {entry['last_error']}")
+        print(f"{len(entries)} queued message(s) in {MAIL_QUEUE_DIR}")
+        return 0
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,229 @@
+"""
+Per-route request metrics in Prometheus text format.
+
+init_app(app) registers request hooks. Each request's duration, DB query count,
+DB time and pool wait (from db.begin_query_stats) are recorded in histograms
+labelled by Flask endpoint. /metrics renders them along with pool, cache and
+live-stream gauges.
+
+The in-flight gauge shows the age of the oldest request still running per
+endpoint. It reveals routes creeping toward gunicorn's 60s timeout before the
+worker is killed (a killed request never reaches after_request).
+
+/metrics requires a logged-in admin or the METRICS_TOKEN, sent as
+"Authorization: Bearer <token>" or ?token=<token>.
+"""
+import hmac
+import os
+import threading
+import time
+from flask import request, g
+
+from db import begin_query_stats, end_query_stats
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Seconds; the top buckets bracket gunicorn's --timeout 60
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+PREFIX = 'church_rides_'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+
+    def __init__(self, name, documentation, buckets, labelnames=('endpoint',)):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            items = [(labels, list(series)) for labels, series in items]
+        for labelvalues, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {count}')
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {series[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labelvalues)} {_number(series[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labelvalues)} {series[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labelvalues)} {value}')
+        return lines
+
+
+def _gauge(name, documentation, samples, kind='gauge'):
+    """Render a gauge (or counter) from (labels_dict, value) pairs collected at scrape time"""
+    lines = [f"# HELP {PREFIX}{name} {documentation}", f"# TYPE {PREFIX}{name} {kind}"]
+    for labels, value in samples:
+        lines.append(f'{PREFIX}{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}')
+    return lines
+
+
+request_duration = Histogram('request_duration_seconds', 'Time to build the response, by endpoint.',
+                             DURATION_BUCKETS)
+request_queries = Histogram('request_db_queries', 'Database queries executed per request, by endpoint.',
+                            QUERY_COUNT_BUCKETS)
+request_db_time = Histogram('request_db_seconds', 'Time spent in database calls per request, by endpoint.',
+                            DURATION_BUCKETS)
+request_pool_wait = Histogram('request_db_pool_wait_seconds',
+                              'Time spent waiting for a pooled connection per request, by endpoint.',
+                              DURATION_BUCKETS)
+requests_total = Counter('requests_total', 'Requests by endpoint, method and status.',
+                         ('endpoint', 'method', 'status'))
+
+_inflight_lock = threading.Lock()
+_inflight = {}  # token -> (endpoint, started)
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    begin_query_stats()
+    token = object()
+    g.metrics_token = token
+    with _inflight_lock:
+        _inflight[token] = (_endpoint(), g.metrics_started)
+
+
+def measure_whole_stream():
+    """
+    Call from a view whose streamed body runs queries: the request is then
+    recorded once the body has been sent (or the client went away), so the
+    duration and DB stats include the streaming.
+    """
+    g.metrics_whole_stream = True
+
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    args = (_endpoint(), request.method, str(response.status_code), started)
+    if response.is_streamed and g.pop('metrics_whole_stream', False):
+        # Runs on this thread after the last chunk; the query stats keep counting until then
+        response.call_on_close(lambda: _observe(*args))
+    else:
+        _observe(*args)
+    return response
+
+
+def _observe(endpoint, method, status, started):
+    request_duration.observe(time.perf_counter() - started, endpoint)
+    requests_total.inc(endpoint, method, status)
+    stats = end_query_stats()
+    if stats is not None:
+        request_queries.observe(stats.queries, endpoint)
+        request_db_time.observe(stats.db_time, endpoint)
+        request_pool_wait.observe(stats.pool_wait, endpoint)
+
+
+def _teardown_request(exc):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        with _inflight_lock:
+            _inflight.pop(token, None)
+
+
+def inflight_ages():
+    """Oldest running request per endpoint, in seconds"""
+    now = time.perf_counter()
+    oldest = {}
+    with _inflight_lock:
+        for endpoint, started in _inflight.values():
+            oldest[endpoint] = max(oldest.get(endpoint, 0.0), now - started)
+    return oldest
+
+
+def authorized(user):
+    """True if the caller may read /metrics (admin session or METRICS_TOKEN)"""
+    if user.is_authenticated and user.is_admin:
+        return True
+    if not METRICS_TOKEN:
+        return False
+    supplied = request.args.get('token', '')
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        supplied = header[len('Bearer '):]
+    return hmac.compare_digest(supplied.encode(), METRICS_TOKEN.encode())
+
+
+def render(gauges=()):
+    """
+    Prometheus text exposition of all metrics.
+
+    Args:
+        gauges: (name, help, samples[, kind]) tuples collected by the caller, where
+                samples is a list of (labels_dict, value) and kind defaults to 'gauge'
+    """
+    lines = []
+    for metric in (request_duration, request_queries, request_db_time, request_pool_wait, requests_total):
+        lines.extend(metric.render())
+    lines.extend(_gauge('request_inflight_oldest_seconds', 'Age of the oldest running request, by endpoint.',
+                        [({'endpoint': endpoint}, round(age, 3)) for endpoint, age in sorted(inflight_ages().items())]))
+    for gauge in gauges:
+        lines.extend(_gauge(*gauge))
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Register the request hooks; call right after creating the app so every other hook is timed"""
+    app.before_request(_start_request)
+    # after_request hooks run in reverse order, so registered first means it runs last
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,190 @@
+"""
+Schema migration runner.
+
+Migrations live in migrations/ as NNNN_description.<dialect>.sql, one file per
+dialect (sqlite / postgres). Applied versions are recorded in the
+schema_version table, and each migration runs in its own transaction.
+
+Usage:
+    python migrate.py            # apply all pending migrations
+    python migrate.py up --to 3  # apply pending migrations up to version 3
+    python migrate.py status     # list applied / pending migrations
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from db import get_db_connection, release_db_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+_FILENAME_RE = re.compile(r'^(\d{4})_(\w+)\.(sqlite|postgres)\.sql$')
+
+# Arbitrary key so two deploys can't migrate the same PostgreSQL database at once
+_PG_LOCK_KEY = 7393
+
+
+def current_dialect():
+    return 'postgres' if os.environ.get('DATABASE_URL') else 'sqlite'
+
+
+def discover_migrations(dialect=None):
+    """
+    Find migration files for a dialect.
+
+    Returns:
+        list: (version, name, path) tuples sorted by version
+    """
+    dialect = dialect or current_dialect()
+    found = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _FILENAME_RE.match(filename)
+        if match and match.group(3) == dialect:
+            found.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    found.sort()
+
+    versions = [version for version, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return found
+
+
+def split_statements(sql):
+    """Split a migration file into statements (no ';' inside string literals)"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def _ensure_version_table(conn):
+    cur = conn.cursor()
+    if current_dialect() == 'postgres':
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    else:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    conn.commit()
+
+
+def applied_versions(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT version FROM schema_version ORDER BY version")
+    return {row['version'] for row in cur.fetchall()}
+
+
+def apply_migrations(target=None, verbose=True):
+    """
+    Apply pending migrations in order.
+
+    Args:
+        target: Highest version to apply (default: all)
+        verbose: Print progress
+
+    Returns:
+        list: Versions applied by this call
+    """
+    is_postgres = current_dialect() == 'postgres'
+    placeholder = "%s" if is_postgres else "?"
+    applied_now = []
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        if is_postgres:
+            cur.execute("SELECT pg_advisory_lock(%s)", (_PG_LOCK_KEY,))
+            conn.commit()
+        else:
+            # Table rebuilds need this off; it can't change inside a transaction
+            conn.commit()
+            cur.execute("PRAGMA foreign_keys=OFF")
+
+        _ensure_version_table(conn)
+        done = applied_versions(conn)
+
+        for version, name, path in discover_migrations():
+            if version in done or (target is not None and version > target):
+                continue
+            with open(path) as f:
+                statements = split_statements(f.read())
+
+            started = time.perf_counter()
+            try:
+                if not is_postgres:
+                    cur.execute("BEGIN")
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute(f"INSERT INTO schema_version (version, name) VALUES ({placeholder}, {placeholder})",
+                            (version, name))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Migration {version:04d}_{name} failed: {e}")
+                raise
+            applied_now.append(version)
+            if verbose:
+                print(f"✓ Applied {version:04d}_{name} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+
+        if not is_postgres:
+            cur.execute("PRAGMA foreign_key_check")
+            problems = cur.fetchall()
+            if problems:
+                raise RuntimeError(f"Foreign key violations after migrating: {problems[:5]}")
+    finally:
+        if not is_postgres:
+            # Connections are reused per thread, so never leave enforcement off
+            conn.rollback()
+            conn.cursor().execute("PRAGMA foreign_keys=ON")
+        else:
+            try:
+                conn.rollback()
+                conn.cursor().execute("SELECT pg_advisory_unlock(%s)", (_PG_LOCK_KEY,))
+                conn.commit()
+            except Exception:
+                pass
+        release_db_connection(conn)
+
+    if verbose and not applied_now:
+        print("✓ Schema is up to date")
+    return applied_now
+
+
+def print_status():
+    conn = get_db_connection()
+    try:
+        _ensure_version_table(conn)
+        done = applied_versions(conn)
+    finally:
+        release_db_connection(conn)
+
+    print(f"Dialect: {current_dialect()}")
+    for version, name, _ in discover_migrations():
+        state = 'applied' if version in done else 'pending'
+        print(f"  {version:04d}_{name:<30} {state}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply database schema migrations")
+    sub = parser.add_subparsers(dest='command')
+    up = sub.add_parser('up', help='apply pending migrations (default)')
+    up.add_argument('--to', type=int, default=None, help='stop after this version')
+    sub.add_parser('status', help='show applied and pending migrations')
+    args = parser.parse_args(argv)
+
+    if args.command == 'status':
+        print_status()
+    else:
+        apply_migrations(target=getattr(args, 'to', None))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
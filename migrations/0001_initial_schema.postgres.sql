@@ -0,0 +1,28 @@
+-- Baseline schema (what db.init_db() used to create). IF NOT EXISTS keeps
+-- this a no-op on databases created before migrations existed.
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    full_name VARCHAR(100) NOT NULL,
+    grade VARCHAR(20),
+    is_driver BOOLEAN DEFAULT FALSE,
+    is_admin BOOLEAN DEFAULT FALSE,
+    phone_number VARCHAR(20),
+    email VARCHAR(100),
+    driver_capacity INTEGER,
+    residence VARCHAR(100)
+);
+
+CREATE TABLE IF NOT EXISTS vehicles (
+    id SERIAL PRIMARY KEY,
+    driver_id INTEGER REFERENCES users(id),
+    vehicle_name VARCHAR(50),
+    remember_vehicle BOOLEAN DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    id SERIAL PRIMARY KEY,
+    passenger_id INTEGER UNIQUE REFERENCES users(id),
+    vehicle_id INTEGER REFERENCES vehicles(id)
+);
@@ -0,0 +1,28 @@
+-- Baseline schema (what db.init_db() used to create). IF NOT EXISTS keeps
+-- this a no-op on databases created before migrations existed.
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    grade TEXT,
+    is_driver INTEGER DEFAULT 0,
+    is_admin INTEGER DEFAULT 0,
+    phone_number TEXT,
+    email TEXT,
+    driver_capacity INTEGER,
+    residence TEXT
+);
+
+CREATE TABLE IF NOT EXISTS vehicles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    driver_id INTEGER REFERENCES users(id),
+    vehicle_name TEXT,
+    remember_vehicle INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    passenger_id INTEGER UNIQUE REFERENCES users(id),
+    vehicle_id INTEGER REFERENCES vehicles(id)
+);
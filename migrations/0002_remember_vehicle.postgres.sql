@@ -0,0 +1,3 @@
+-- Replaces run_migration_once.add_remember_vehicle_column() for production
+-- databases created before the column existed.
+ALTER TABLE vehicles ADD COLUMN IF NOT EXISTS remember_vehicle BOOLEAN DEFAULT FALSE;
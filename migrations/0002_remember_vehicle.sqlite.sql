@@ -0,0 +1 @@
+-- Nothing to do: local SQLite databases always had remember_vehicle (see 0001).
@@ -0,0 +1,16 @@
+-- Deleting a user removes their vehicles and bookings; deleting a vehicle
+-- removes its bookings. Constraint names are PostgreSQL's defaults from 0001.
+ALTER TABLE vehicles
+    DROP CONSTRAINT IF EXISTS vehicles_driver_id_fkey,
+    ADD CONSTRAINT vehicles_driver_id_fkey
+        FOREIGN KEY (driver_id) REFERENCES users(id) ON DELETE CASCADE;
+
+ALTER TABLE bookings
+    DROP CONSTRAINT IF EXISTS bookings_passenger_id_fkey,
+    ADD CONSTRAINT bookings_passenger_id_fkey
+        FOREIGN KEY (passenger_id) REFERENCES users(id) ON DELETE CASCADE;
+
+ALTER TABLE bookings
+    DROP CONSTRAINT IF EXISTS bookings_vehicle_id_fkey,
+    ADD CONSTRAINT bookings_vehicle_id_fkey
+        FOREIGN KEY (vehicle_id) REFERENCES vehicles(id) ON DELETE CASCADE;
@@ -0,0 +1,22 @@
+-- SQLite can't alter a foreign key, so rebuild vehicles and bookings
+-- (the runner turns foreign_keys off while migrating).
+CREATE TABLE vehicles_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    driver_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    vehicle_name TEXT,
+    remember_vehicle INTEGER DEFAULT 0
+);
+INSERT INTO vehicles_new (id, driver_id, vehicle_name, remember_vehicle)
+    SELECT id, driver_id, vehicle_name, remember_vehicle FROM vehicles;
+DROP TABLE vehicles;
+ALTER TABLE vehicles_new RENAME TO vehicles;
+
+CREATE TABLE bookings_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    passenger_id INTEGER UNIQUE REFERENCES users(id) ON DELETE CASCADE,
+    vehicle_id INTEGER REFERENCES vehicles(id) ON DELETE CASCADE
+);
+INSERT INTO bookings_new (id, passenger_id, vehicle_id)
+    SELECT id, passenger_id, vehicle_id FROM bookings;
+DROP TABLE bookings;
+ALTER TABLE bookings_new RENAME TO bookings;
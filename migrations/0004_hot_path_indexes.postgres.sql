@@ -0,0 +1,4 @@
+-- Every board/admin/booking JOIN filters on these columns.
+-- (bookings.passenger_id is already indexed by its UNIQUE constraint.)
+CREATE INDEX IF NOT EXISTS idx_bookings_vehicle_id ON bookings (vehicle_id);
+CREATE INDEX IF NOT EXISTS idx_vehicles_driver_id ON vehicles (driver_id);
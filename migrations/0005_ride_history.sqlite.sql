@@ -0,0 +1,27 @@
+-- The weekly reset moves last week's bookings and pickup locations here
+-- instead of deleting them. No foreign keys: history outlives deleted users
+-- and vehicles, so names are copied at archive time.
+CREATE TABLE IF NOT EXISTS booking_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    week_of TEXT NOT NULL,
+    booking_id INTEGER NOT NULL,
+    passenger_id INTEGER,
+    passenger_name TEXT,
+    vehicle_id INTEGER,
+    vehicle_name TEXT,
+    driver_id INTEGER,
+    driver_name TEXT,
+    archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_booking_history_week_of ON booking_history (week_of);
+
+CREATE TABLE IF NOT EXISTS vehicle_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    week_of TEXT NOT NULL,
+    vehicle_id INTEGER NOT NULL,
+    vehicle_name TEXT,
+    driver_id INTEGER,
+    driver_name TEXT,
+    archived_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_vehicle_history_week_of ON vehicle_history (week_of);
@@ -0,0 +1,19 @@
+-- Weekly rollups written by the weekly reset as it archives each batch, read by
+-- /admin/stats. One row per driver (or residence) per week, so reads stay
+-- small no matter how much history piles up.
+CREATE TABLE IF NOT EXISTS weekly_driver_stats (
+    week_of DATE NOT NULL,
+    driver_id INTEGER NOT NULL,
+    driver_name TEXT,
+    vehicles INTEGER NOT NULL DEFAULT 0,
+    capacity INTEGER NOT NULL DEFAULT 0,
+    riders INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (week_of, driver_id)
+);
+
+CREATE TABLE IF NOT EXISTS weekly_residence_stats (
+    week_of DATE NOT NULL,
+    residence TEXT NOT NULL,
+    riders INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (week_of, residence)
+);
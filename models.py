@@ -1,5 +1,14 @@
+import os
 from flask_login import UserMixin
-from db import get_db_connection, release_db_connection
+from db import get_db
+from cache import TTLCache
+
+# Logged-in users are looked up on every request by Flask-Login, so keep the
+# identity columns in memory. Routes that change them call User.invalidate().
+user_cache = TTLCache(
+    maxsize=int(os.environ.get('USER_CACHE_SIZE', '2048')),
+    ttl=float(os.environ.get('USER_CACHE_TTL', '300'))
+)
 
 class User(UserMixin):
     def __init__(self, id, username, full_name, is_driver, is_admin=False):
@@ -11,24 +20,44 @@ class User(UserMixin):
 
     @staticmethod
     def get(user_id):
+        key = str(user_id)
+        cached = user_cache.get(key)
+        if cached is not None:
+            # Fresh object per request so route code can't mutate the cache
+            return User(*cached)
+
         try:
-            conn = get_db_connection()
-            cur = conn.cursor()
+            generation = user_cache.generation
+            with get_db() as conn:
+                cur = conn.cursor()
 
-            # Use the correct placeholder based on database type
-            import os
-            placeholder = "%s" if os.environ.get('DATABASE_URL') else "?"
+                # Use the correct placeholder based on database type
+                placeholder = "%s" if os.environ.get('DATABASE_URL') else "?"
 
-            cur.execute(f"SELECT * FROM users WHERE id = {placeholder}", (user_id,))
-            user_data = cur.fetchone()
-            release_db_connection(conn)
+                cur.execute(f"SELECT id, username, full_name, is_driver, is_admin FROM users WHERE id = {placeholder}", (user_id,))
+                user_data = cur.fetchone()
             if not user_data:
                 return None
-            return User(user_data['id'], user_data['username'], user_data['full_name'], user_data['is_driver'], user_data.get('is_admin', False))
+            User.remember(user_data, generation)
+            return User(*user_cache_row(user_data))
         except Exception as e:
             print(f"Error loading user {user_id}: {e}")
             return None
 
+    @staticmethod
+    def remember(user_data, generation=None):
+        """Store a users row in the identity cache (e.g. right after login)"""
+        user_cache.set(str(user_data['id']), user_cache_row(user_data), generation)
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drop a cached user so role/profile changes apply on the next request"""
+        user_cache.delete(str(user_id))
+
+def user_cache_row(user_data):
+    return (user_data['id'], user_data['username'], user_data['full_name'],
+            user_data['is_driver'], user_data.get('is_admin', False))
+
 # Inheritance Example
 class Student(User):
     def __init__(self, id, username, full_name):
@@ -39,13 +68,11 @@ class Driver(User):
         super().__init__(id, username, full_name, is_driver=True)
 
     def add_vehicle(self, vehicle_name, capacity):
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with get_db() as conn:
+            cur = conn.cursor()
 
-        import os
-        placeholder = "%s" if os.environ.get('DATABASE_URL') else "?"
+            placeholder = "%s" if os.environ.get('DATABASE_URL') else "?"
 
-        cur.execute(f"INSERT INTO vehicles (driver_id, vehicle_name, capacity) VALUES ({placeholder}, {placeholder}, {placeholder})",
-                    (self.id, vehicle_name, capacity))
-        conn.commit()
-        release_db_connection(conn)
\ No newline at end of file
+            cur.execute(f"INSERT INTO vehicles (driver_id, vehicle_name, capacity) VALUES ({placeholder}, {placeholder}, {placeholder})",
+                        (self.id, vehicle_name, capacity))
+            conn.commit()
@@ -0,0 +1,173 @@
+"""
+Password hashing off the request threads.
+
+Hashing is deliberately slow, so running it inline lets a burst of logins pin
+the CPU and stall every other page. Here each hash or check runs on a small
+pool of PASSWORD_HASH_WORKERS hashing threads. hashlib's scrypt and pbkdf2
+release the GIL, so page requests keep running meanwhile. On Linux each
+hashing thread is also niced by PASSWORD_HASH_NICE so page requests win the
+CPU.
+
+At most PASSWORD_HASH_QUEUE jobs may be running or waiting at once. Any
+request past that gets HashingBusy (503) straight away instead of piling up.
+The default is half of gunicorn's 8 threads, so a login storm can never tie
+up every request thread and the other pages keep loading. A job that hasn't
+finished within PASSWORD_HASH_WAIT seconds also gives HashingBusy.
+
+Under gevent (WORKER_MODE=gevent) patched threads are greenlets, which would
+hash on the event loop. There the hashing threads come from gevent's
+executor, which uses real OS threads and lets the request greenlet wait
+cooperatively.
+
+PASSWORD_HASH_METHOD is any werkzeug method string, e.g. 'scrypt:32768:8:1' or
+'pbkdf2:sha256:600000'. Stored hashes made with a different method or cost
+are replaced after the next successful login (see needs_rehash()).
+
+    hashed = hash_password('secret')
+    verify_password(hashed, 'secret')   # True
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from db import green_mode
+
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '1'))  # 0 = hash on the request thread
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', '4'))  # jobs running or waiting
+PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', '10'))  # seconds a queued job may take
+PASSWORD_HASH_NICE = int(os.environ.get('PASSWORD_HASH_NICE', '10'))
+
+
+class HashingBusy(Exception):
+    """Too many password hashes queued; the caller should answer 503"""
+
+
+_niced_threads = set()
+
+
+def _lower_priority(increment):
+    """On Linux a thread id is a valid PRIO_PROCESS target, so only the calling thread is niced"""
+    thread_id = threading.get_native_id()
+    if thread_id in _niced_threads:
+        return
+    _niced_threads.add(thread_id)
+    try:
+        os.setpriority(os.PRIO_PROCESS, thread_id, os.getpriority(os.PRIO_PROCESS, thread_id) + increment)
+    except (AttributeError, OSError):
+        pass
+
+
+def _niced(increment, fn, *args):
+    # gevent's executor ignores `initializer`, so each job nices its thread (once)
+    _lower_priority(increment)
+    return fn(*args)
+
+
+class PasswordHasher:
+    """Bounded thread pool for password hashing; one per process"""
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=PASSWORD_HASH_WORKERS,
+                 queue_limit=PASSWORD_HASH_QUEUE, wait=PASSWORD_HASH_WAIT, nice=PASSWORD_HASH_NICE):
+        self.method = method
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.wait = wait
+        self.nice = nice
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._policy_prefix = None
+        self.jobs = 0
+        self.rejected = 0
+        self.rehashed = 0
+
+    def _get_executor(self):
+        # Created lazily so gunicorn workers each start their own threads after forking
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if green_mode():
+                        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+                        self._executor = NativeThreadPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers,
+                            thread_name_prefix='password-hash')
+        return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy(f"{self.queue_limit} password hashes already queued")
+        self.jobs += 1
+        if self.workers <= 0:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+
+        try:
+            future = self._get_executor().submit(_niced, self.nice, fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot stays taken until the job really finishes, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.wait)
+        except FutureTimeout:
+            self.rejected += 1
+            raise HashingBusy(f"password hash did not finish within {self.wait:.0f}s")
+
+    def hash(self, password):
+        """Hash a new password with the current policy"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        """True if password matches stored_hash"""
+        if not stored_hash:
+            return False
+        return self._run(check_password_hash, stored_hash, password)
+
+    def policy_prefix(self):
+        """
+        What hashes made with the current policy start with.
+
+        Costs one hash the first time, done directly rather than through the
+        pool: it is asked right after a successful login, which must not then
+        fail with HashingBusy.
+        """
+        if self._policy_prefix is None:
+            # werkzeug fills in default parameters ('scrypt' -> 'scrypt:32768:8:1'),
+            # so compare against what it actually writes
+            self._policy_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._policy_prefix
+
+    def needs_rehash(self, stored_hash):
+        """True if stored_hash was made with a different method or cost than the policy"""
+        return stored_hash.split('$', 1)[0] != self.policy_prefix()
+
+    def stats(self):
+        return {
+            'method': self.method,
+            'workers': self.workers,
+            'queue_limit': self.queue_limit,
+            'jobs': self.jobs,
+            'rejected': self.rejected,
+            'rehashed': self.rehashed,
+        }
+
+
+# Shared instance used by the web app
+password_hasher = PasswordHasher()
+
+
+def hash_password(password):
+    return password_hasher.hash(password)
+
+
+def verify_password(stored_hash, password):
+    return password_hasher.verify(stored_hash, password)
@@ -0,0 +1,149 @@
+"""
+Minimal PDF writer that emits the document incrementally.
+
+Each page is written (and can be sent to the client) as soon as it is full.
+Only the byte offsets needed for the final cross-reference table are kept, so
+memory stays flat however many pages there are. Text uses the built-in
+Helvetica fonts, so nothing is embedded.
+
+    writer = PDFWriter()
+    yield writer.begin()
+    page = Canvas(writer.height)
+    page.text(40, 40, "Hello", size=18, bold=True)
+    yield writer.page(page)
+    yield writer.end()
+"""
+import zlib
+
+A4 = (595.28, 841.89)  # points
+MM = 72 / 25.4
+
+# Helvetica advance widths (1/1000 em) for ASCII 32..126, from the standard AFM
+_HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+
+
+def text_width(text, size):
+    """Approximate width in points of text set in Helvetica"""
+    units = 0
+    for ch in text:
+        code = ord(ch)
+        units += _HELVETICA_WIDTHS[code - 32] if 32 <= code <= 126 else 556
+    return units * size / 1000
+
+
+def fit_text(text, size, max_width):
+    """Truncate text with '...' so it fits in max_width points"""
+    if text_width(text, size) <= max_width:
+        return text
+    while text and text_width(text + '...', size) > max_width:
+        text = text[:-1]
+    return text + '...'
+
+
+def _pdf_string(text):
+    # Standard fonts use WinAnsiEncoding (close to latin-1)
+    raw = str(text).encode('cp1252', errors='replace')
+    return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _num(value):
+    return f"{value:.2f}".rstrip('0').rstrip('.')
+
+
+class Canvas:
+    """Drawing operations for one page; y is measured from the top edge"""
+
+    def __init__(self, height=A4[1]):
+        self.height = height
+        self._ops = []
+
+    def text(self, x, y, text, size=10, bold=False, color=(0, 0, 0)):
+        """Draw text with its baseline at y"""
+        font = b'/F2' if bold else b'/F1'
+        r, g, b = color
+        self._ops.append(b'BT %s %s Tf %s %s %s rg %s %s Td %s Tj ET' % (
+            font, _num(size).encode(), _num(r).encode(), _num(g).encode(), _num(b).encode(),
+            _num(x).encode(), _num(self.height - y).encode(), _pdf_string(text)))
+
+    def rect(self, x, y, width, height, fill=None, stroke=None, line_width=0.3):
+        """Rectangle whose top-left corner is (x, y); colors are 0..1 RGB tuples"""
+        ops = [b'%s w' % _num(line_width).encode()]
+        if fill:
+            ops.append(b'%s %s %s rg' % tuple(_num(c).encode() for c in fill))
+        if stroke:
+            ops.append(b'%s %s %s RG' % tuple(_num(c).encode() for c in stroke))
+        ops.append(b'%s %s %s %s re' % (_num(x).encode(), _num(self.height - y - height).encode(),
+                                          _num(width).encode(), _num(height).encode()))
+        ops.append(b'B' if fill and stroke else b'f' if fill else b'S')
+        self._ops.append(b' '.join(ops))
+
+    def content(self):
+        return b'\n'.join(self._ops)
+
+
+class PDFWriter:
+    """Serializes a PDF piece by piece; every method returns the next bytes to send"""
+
+    # Fixed object numbers: 1 catalog, 2 page tree, 3/4 fonts; pages start at 5
+    _CATALOG, _PAGES, _FONT, _FONT_BOLD = 1, 2, 3, 4
+
+    def __init__(self, size=A4, compress=True):
+        self.width, self.height = size
+        self.compress = compress
+        self._position = 0
+        self._offsets = {}
+        self._next_id = 5
+        self._page_ids = []
+
+    def _object(self, number, body):
+        self._offsets[number] = self._position
+        data = b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        self._position += len(data)
+        return data
+
+    def _raw(self, data):
+        self._position += len(data)
+        return data
+
+    def begin(self):
+        return (self._raw(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+                + self._object(self._FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                                           b'/Encoding /WinAnsiEncoding >>')
+                + self._object(self._FONT_BOLD, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold '
+                                                b'/Encoding /WinAnsiEncoding >>'))
+
+    def page(self, canvas):
+        content = canvas.content()
+        if self.compress:
+            content = zlib.compress(content)
+            stream = b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content)
+        else:
+            stream = b'<< /Length %d >>\nstream\n' % len(content)
+        content_id, page_id = self._next_id, self._next_id + 1
+        self._next_id += 2
+        self._page_ids.append(page_id)
+        return (self._object(content_id, stream + content + b'\nendstream')
+                + self._object(page_id, b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] '
+                                        b'/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> /Contents %d 0 R >>' % (
+                                            self._PAGES, _num(self.width).encode(), _num(self.height).encode(),
+                                            self._FONT, self._FONT_BOLD, content_id)))
+
+    def end(self):
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self._page_ids)
+        data = (self._object(self._PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._page_ids)))
+                + self._object(self._CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % self._PAGES))
+        xref_at = self._position
+        size = self._next_id
+        lines = [b'xref', b'0 %d' % size, b'0000000000 65535 f ']
+        for number in range(1, size):
+            lines.append(b'%010d 00000 n ' % self._offsets[number])
+        data += b'\n'.join(lines) + b'\n'
+        data += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, self._CATALOG, xref_at)
+        return self._raw(data)
@@ -0,0 +1,195 @@
+"""
+Concurrent health prober used by the watchdog.
+
+Every target (by default /health, / and the DB-backed /ready) is checked at
+the same time with asyncio. A target only counts as down after
+PROBE_CONFIRM_FAILURES consecutive failed attempts. Between attempts it waits
+with jittered exponential backoff, so one slow cold start is retried instead
+of triggering an alert. Each attempt has the target's own timeout, and the
+whole run is bounded by PROBE_TOTAL_SECONDS.
+
+Plain asyncio streams are used for HTTP (GET, up to 3 redirects), so nothing
+beyond the standard library is needed and a hung attempt can be cancelled.
+
+    python prober.py https://church-rides.up.railway.app/health
+    python prober.py http://127.0.0.1:8000/health http://127.0.0.1:8000/ready
+"""
+import asyncio
+import os
+import random
+import ssl
+import sys
+import time
+from collections import namedtuple
+from urllib.parse import urljoin, urlsplit
+
+PROBE_TIMEOUT = float(os.environ.get('PROBE_TIMEOUT', '10'))
+PROBE_CONFIRM_FAILURES = int(os.environ.get('PROBE_CONFIRM_FAILURES', '3'))
+PROBE_RETRY_DELAY = float(os.environ.get('PROBE_RETRY_DELAY', '2'))
+PROBE_TOTAL_SECONDS = float(os.environ.get('PROBE_TOTAL_SECONDS', '60'))
+
+# Paths checked next to WEBSITE_URL unless WATCHDOG_TARGETS says otherwise
+DEFAULT_PATHS = ('/health', '/', '/ready')
+
+MAX_REDIRECTS = 3
+USER_AGENT = 'church-rides-watchdog'
+
+Target = namedtuple('Target', 'name url timeout')
+ProbeResult = namedtuple('ProbeResult', 'target ok status detail attempts elapsed')
+
+
+class ProbeError(Exception):
+    """An attempt failed before an HTTP status was received"""
+
+
+def parse_targets(base_url, spec=None, timeout=PROBE_TIMEOUT):
+    """
+    Build the target list.
+
+    Args:
+        base_url: WEBSITE_URL; its origin is used to resolve relative paths
+        spec: Comma-separated paths or URLs, each optionally '=<timeout seconds>',
+              e.g. "/health=5,/,/ready=10" (default: DEFAULT_PATHS plus base_url)
+        timeout: Per-attempt timeout for entries without their own
+
+    Returns:
+        list: Target tuples, de-duplicated by URL
+    """
+    entries = [item.strip() for item in spec.split(',')] if spec else [base_url, *DEFAULT_PATHS]
+    targets, seen = [], set()
+    for entry in entries:
+        if not entry:
+            continue
+        path, _, seconds = entry.rpartition('=')
+        if not seconds.replace('.', '', 1).isdigit():
+            path, seconds = entry, ''  # '=' belongs to a query string
+        url = urljoin(base_url, path.strip())
+        if url in seen:
+            continue
+        seen.add(url)
+        name = urlsplit(url).path or '/'
+        targets.append(Target(name, url, float(seconds) if seconds else timeout))
+    return targets
+
+
+async def fetch_status(url, redirects=MAX_REDIRECTS):
+    """
+    GET url and return its HTTP status code (following redirects).
+
+    Raises:
+        ProbeError: Connection refused, bad response, too many redirects
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ProbeError(f"unsupported URL {url}")
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+    try:
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=ssl.create_default_context() if secure else None)
+    except OSError as e:
+        raise ProbeError(f"connection failed ({e.strerror or e})")
+    try:
+        writer.write((f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: {USER_AGENT}\r\n"
+                      f"Accept: */*\r\nConnection: close\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        fields = status_line.decode('latin-1').split(None, 2)
+        if len(fields) < 2 or not fields[0].startswith('HTTP/') or not fields[1].isdigit():
+            raise ProbeError("invalid HTTP response" if status_line else "connection closed without a response")
+        status = int(fields[1])
+
+        location = None
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'location':
+                location = value.strip()
+    except (OSError, asyncio.IncompleteReadError) as e:
+        raise ProbeError(f"connection error ({e})")
+    finally:
+        writer.close()
+
+    if status in (301, 302, 303, 307, 308) and location:
+        if redirects <= 0:
+            raise ProbeError("too many redirects")
+        return await fetch_status(urljoin(url, location), redirects - 1)
+    return status
+
+
+async def probe_target(target, deadline, confirm_failures=PROBE_CONFIRM_FAILURES, retry_delay=PROBE_RETRY_DELAY):
+    """
+    Check one target until it answers 200, fails confirm_failures times in a
+    row, or the deadline (time.monotonic() value) passes.
+
+    Returns:
+        ProbeResult
+    """
+    started = time.monotonic()
+    status, detail, attempts = None, 'not checked', 0
+    while attempts < confirm_failures:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            detail += ' (run time limit reached)'
+            break
+        attempts += 1
+        timeout = min(target.timeout, remaining)
+        try:
+            status = await asyncio.wait_for(fetch_status(target.url), timeout)
+            if status == 200:
+                return ProbeResult(target, True, status, f"HTTP {status}", attempts, time.monotonic() - started)
+            detail = f"HTTP {status}"
+        except asyncio.TimeoutError:
+            status, detail = None, f"timed out after {timeout:.0f}s"
+        except ProbeError as e:
+            status, detail = None, str(e)
+
+        if attempts < confirm_failures:
+            # Exponential backoff, jittered +-50% so retries from several targets spread out
+            delay = random.uniform(0.5, 1.5) * retry_delay * 2 ** (attempts - 1)
+            await asyncio.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+
+    return ProbeResult(target, False, status, detail, attempts, time.monotonic() - started)
+
+
+async def probe_all(targets, total_seconds=PROBE_TOTAL_SECONDS, **options):
+    """Probe every target concurrently; returns ProbeResults in target order"""
+    deadline = time.monotonic() + total_seconds
+    return await asyncio.gather(*(probe_target(target, deadline, **options) for target in targets))
+
+
+def check_targets(targets, total_seconds=PROBE_TOTAL_SECONDS, **options):
+    """
+    Run the prober and summarize it for the watchdog.
+
+    Returns:
+        tuple: (is_healthy: bool, status_message: str, results: list of ProbeResult)
+    """
+    results = asyncio.run(probe_all(targets, total_seconds, **options))
+    failed = [r for r in results if not r.ok]
+    if not failed:
+        return True, f"All {len(results)} checks passed", results
+    message = '; '.join(f"{r.target.name}: {r.detail} ({r.attempts} attempts)" for r in failed)
+    return False, message, results
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 2
+    targets = [Target(urlsplit(url).path or '/', url, PROBE_TIMEOUT) for url in argv]
+    is_healthy, message, results = check_targets(targets)
+    for r in results:
+        print(f"{'✅' if r.ok else '❌'} {r.target.url}  {r.detail}  "
+              f"({r.attempts} attempt{'s' if r.attempts != 1 else ''}, {r.elapsed:.2f}s)")
+    print(message)
+    return 0 if is_healthy else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
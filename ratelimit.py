@@ -0,0 +1,203 @@
+"""
+In-process token-bucket rate limiting for the expensive routes.
+
+Each limited route has its own budgets, one per client IP and one per user (the
+logged-in user, or for login the submitted username from that IP). A budget is a Limit:
+`burst` requests, refilled evenly over `period` seconds. A request must find a
+token in every bucket that applies to it. If one is empty, the route raises
+RateLimited before the view runs, i.e. before any database connection or
+password hash. The app answers 429 with Retry-After.
+
+Buckets live in one LRU dict capped at RATE_LIMIT_MAX_KEYS entries. When it is
+full, the least recently used bucket is dropped. Idle buckets refill to full
+anyway, so dropping one only forgets a client that has gone quiet.
+
+Limits can be overridden with RATE_LIMITS, e.g.
+    RATE_LIMITS="login.ip=60/60,join_ride.user=30/60"
+(route.kind=burst/period seconds). RATE_LIMIT_ENABLED=0 turns limiting off.
+
+Behind a proxy the socket peer is the proxy, so the client IP is taken from
+X-Forwarded-For, RATE_LIMIT_PROXY_HOPS entries from the right (default 1 in
+production, where DATABASE_URL is set, and 0 locally).
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import request
+from flask_login import current_user
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1').lower() not in ('0', 'false', 'no', 'off')
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '10000'))
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '1' if os.environ.get('DATABASE_URL') else '0'))
+
+Limit = namedtuple('Limit', 'burst period')
+
+# Per-IP budgets are generous because everyone on the church wifi shares one address
+DEFAULT_LIMITS = {
+    'login': {'ip': Limit(30, 60), 'user': Limit(5, 60)},
+    'register': {'ip': Limit(10, 600)},
+    'join_ride': {'ip': Limit(120, 60), 'user': Limit(20, 60)},
+    'delete_account': {'ip': Limit(10, 3600), 'user': Limit(3, 3600)},
+}
+
+
+class RateLimited(Exception):
+    """A request ran out of budget; retry_after is in seconds"""
+
+    def __init__(self, route, retry_after):
+        super().__init__(f"{route} rate limit exceeded, retry in {retry_after:.1f}s")
+        self.route = route
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def parse_limits(spec, defaults=DEFAULT_LIMITS):
+    """
+    Apply a RATE_LIMITS override to the defaults.
+
+    Args:
+        spec: 'route.kind=burst/period' entries separated by commas
+
+    Returns:
+        dict: route -> {kind: Limit}
+
+    Raises:
+        ValueError: Malformed entry
+    """
+    limits = {route: dict(kinds) for route, kinds in defaults.items()}
+    for entry in (spec or '').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            name, value = entry.split('=')
+            route, kind = name.strip().split('.')
+            burst, period = value.split('/')
+            limit = Limit(int(burst), float(period))
+        except ValueError:
+            raise ValueError(f"bad RATE_LIMITS entry {entry!r} (expected route.kind=burst/seconds)")
+        if limit.burst < 1 or limit.period <= 0:
+            raise ValueError(f"bad RATE_LIMITS entry {entry!r} (burst and period must be positive)")
+        limits.setdefault(route, {})[kind] = limit
+    return limits
+
+
+class RateLimiter:
+    """Token buckets keyed by (route, kind, key), in a bounded LRU dict"""
+
+    def __init__(self, limits=DEFAULT_LIMITS, max_keys=RATE_LIMIT_MAX_KEYS, clock=time.monotonic):
+        self.limits = limits
+        self.max_keys = max_keys
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # (route, kind, key) -> (tokens, updated)
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def check(self, route, keys):
+        """
+        Take one token from each of route's buckets for keys, or none if any is empty.
+
+        Args:
+            route: Key of limits
+            keys: {kind: key}; kinds without a limit and None keys are skipped
+
+        Returns:
+            float: 0 if allowed, otherwise seconds until a token is available
+        """
+        route_limits = self.limits.get(route, {})
+        with self._lock:
+            now = self.clock()
+            refilled = []
+            wait = 0.0
+            for kind, key in keys.items():
+                limit = route_limits.get(kind)
+                if limit is None or key is None:
+                    continue
+                bucket_key = (route, kind, key)
+                rate = limit.burst / limit.period
+                state = self._buckets.get(bucket_key)
+                tokens = limit.burst if state is None else min(limit.burst, state[0] + (now - state[1]) * rate)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                refilled.append((bucket_key, tokens))
+
+            if wait:
+                self.rejected += 1
+                return wait
+
+            for bucket_key, tokens in refilled:
+                self._buckets[bucket_key] = (tokens - 1, now)
+                self._buckets.move_to_end(bucket_key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+            self.allowed += 1
+            return 0.0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        return {
+            'enabled': RATE_LIMIT_ENABLED,
+            'keys': len(self._buckets),
+            'max_keys': self.max_keys,
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'evicted': self.evicted,
+        }
+
+
+def client_ip(hops=RATE_LIMIT_PROXY_HOPS):
+    """The caller's address: the hops-th X-Forwarded-For entry from the right, else the socket peer"""
+    if hops > 0:
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.remote_addr
+
+
+def request_keys():
+    """Bucket keys for the current request: client IP, and the user if we know who it is"""
+    ip = client_ip()
+    if current_user.is_authenticated:
+        user = f"id:{current_user.id}"
+    else:
+        # A submitted username proves nothing, so its bucket is per address: otherwise
+        # anyone could spend it and lock the real user out of their account
+        username = request.form.get('username', '').strip().lower()
+        user = f"name:{ip}:{username}" if username else None
+    return {'ip': ip, 'user': user}
+
+
+# Shared instance used by the web app
+limiter = RateLimiter(parse_limits(os.environ.get('RATE_LIMITS')))
+
+
+def rate_limited(route, methods=('POST',)):
+    """
+    View decorator: raise RateLimited when route's budget is spent.
+
+    Put it below @login_required so the user is known. Only requests with one
+    of `methods` are counted (showing the login form is free).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if RATE_LIMIT_ENABLED and request.method in methods:
+                retry_after = limiter.check(route, request_keys())
+                if retry_after:
+                    raise RateLimited(route, retry_after)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
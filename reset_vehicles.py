@@ -1,71 +1,273 @@
 """
 Vehicle Reset Script - Run every Monday at 12:00 AM PST
 This script:
-1. Clears all passenger bookings
-2. Deletes vehicles that don't have 'remember_vehicle' enabled
+1. Archives all passenger bookings to booking_history and removes them
+2. Archives vehicles that don't have 'remember_vehicle' enabled to vehicle_history and removes them
 3. Keeps vehicles with 'remember_vehicle' enabled (but clears their passengers)
+4. Adds the week's riders, seats and residences to the weekly rollups (see ride_stats.py)
+
+Rows are moved in batches of RESET_BATCH_SIZE, each in its own short
+transaction (BEGIN IMMEDIATE on SQLite, row locks on PostgreSQL), with a short
+pause between batches so the site stays responsive during a large reset. Only
+rows that existed when the reset started are touched: anyone who books a
+remembered vehicle while it runs keeps their seat.
+
+    python reset_vehicles.py                  # run the reset
+    python reset_vehicles.py --dry-run        # only report what would be archived
+    python reset_vehicles.py --batch-size 200
+
+The history and rollup tables come from migrations 0005 and 0006. Production
+skips init_db(), so the reset applies any pending migrations itself before it
+archives anything (migrate.py holds an advisory lock on PostgreSQL).
 """
 
+import argparse
+import math
 import os
-import sqlite3
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 import pytz
+from cache import board_cache
+from snapshot import snapshot_writer
+from db import get_db
+from migrate import apply_migrations
+from ride_stats import record_drivers, record_bookings
+import sqltrace
+
+RESET_BATCH_SIZE = int(os.environ.get('RESET_BATCH_SIZE', '500'))
+RESET_BATCH_PAUSE = float(os.environ.get('RESET_BATCH_PAUSE', '0.05'))  # seconds between batches
+
+
+class PhaseTiming:
+    """Batch count, rows moved and time spent in one reset phase"""
+
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.longest = 0.0  # longest single transaction (how long locks were held)
+
+    def record(self, rows, seconds):
+        self.batches += 1
+        self.rows += rows
+        self.seconds += seconds
+        self.longest = max(self.longest, seconds)
+
+    def summary(self):
+        average = self.seconds / self.batches if self.batches else 0.0
+        return (f"{self.name}: {self.rows} rows in {self.batches} batches, {self.seconds * 1000:.1f} ms "
+                f"(avg {average * 1000:.1f} ms, longest {self.longest * 1000:.1f} ms per batch)")
+
 
-def reset_vehicles():
-    """Reset vehicles and clear bookings every Monday at 12am PST"""
+def _week_of(now):
+    """Monday of the week being archived (the reset runs just after it ends)"""
+    day = (now - timedelta(days=1)).date()
+    return (day - timedelta(days=day.weekday())).isoformat()
 
-    database_url = os.environ.get('DATABASE_URL')
 
-    if database_url:
-        # PostgreSQL
-        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
-        placeholder = "%s"
-    else:
-        # SQLite
-        conn = sqlite3.connect('church_ride.db')
-        conn.row_factory = sqlite3.Row
-        placeholder = "?"
+def _not_remembered(is_postgres):
+    if is_postgres:
+        return "(v.remember_vehicle = FALSE OR v.remember_vehicle IS NULL)"
+    return "(v.remember_vehicle = 0 OR v.remember_vehicle IS NULL)"
 
+
+def _archive_bookings_sql(placeholder, where):
+    """INSERT ... SELECT copying bookings (with names) into booking_history"""
+    return f"""
+        INSERT INTO booking_history (week_of, booking_id, passenger_id, passenger_name,
+                                     vehicle_id, vehicle_name, driver_id, driver_name)
+        SELECT {placeholder}, b.id, b.passenger_id, p.full_name, b.vehicle_id, v.vehicle_name,
+               v.driver_id, d.full_name
+        FROM bookings b
+        LEFT JOIN users p ON p.id = b.passenger_id
+        LEFT JOIN vehicles v ON v.id = b.vehicle_id
+        LEFT JOIN users d ON d.id = v.driver_id
+        WHERE {where}
+    """
+
+
+def count_pending(cur, placeholder, is_postgres, booking_cutoff, vehicle_cutoff):
+    """Rows the reset would move; the cutoffs are the highest ids at start"""
+    not_remembered = _not_remembered(is_postgres)
+    cur.execute(f"""
+        SELECT
+            (SELECT COUNT(*) FROM bookings WHERE id <= {placeholder}) as bookings,
+            (SELECT COUNT(*) FROM vehicles v WHERE v.id <= {placeholder} AND {not_remembered}) as vehicles,
+            (SELECT COUNT(*) FROM vehicles v WHERE NOT {not_remembered}) as kept
+    """, (booking_cutoff, vehicle_cutoff))
+    return cur.fetchone()
+
+
+def _begin(cur, is_postgres):
+    if not is_postgres:
+        # Take the write lock up front, like rides.book_seat
+        cur.execute("BEGIN IMMEDIATE")
+
+
+def archive_bookings(conn, placeholder, is_postgres, week_of, cutoff, batch_size, pause):
+    """Move bookings with id <= cutoff into booking_history, batch_size per transaction"""
+    timing = PhaseTiming('bookings')
+    lock = " FOR UPDATE" if is_postgres else ""
     cur = conn.cursor()
+    while True:
+        started = time.perf_counter()
+        try:
+            _begin(cur, is_postgres)
+            cur.execute(f"SELECT id FROM bookings WHERE id <= {placeholder} ORDER BY id LIMIT {placeholder}{lock}",
+                        (cutoff, batch_size))
+            ids = [row['id'] for row in cur.fetchall()]
+            if not ids:
+                conn.rollback()
+                break
+            in_list = ', '.join([placeholder] * len(ids))
+            record_bookings(cur, week_of, f"b.id IN ({in_list})", ids)
+            cur.execute(_archive_bookings_sql(placeholder, f"b.id IN ({in_list})"), (week_of, *ids))
+            cur.execute(f"DELETE FROM bookings WHERE id IN ({in_list})", ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        timing.record(len(ids), time.perf_counter() - started)
+        time.sleep(pause)
+    return timing
 
-    try:
-        # Step 1: Delete all bookings (clear all passengers from all vehicles)
-        cur.execute("DELETE FROM bookings")
-        deleted_bookings = cur.rowcount
-        print(f"Cleared {deleted_bookings} passenger bookings")
-
-        # Step 2: Delete vehicles that don't have remember_vehicle enabled
-        if database_url:
-            # PostgreSQL
-            cur.execute("DELETE FROM vehicles WHERE remember_vehicle = FALSE OR remember_vehicle IS NULL")
-        else:
-            # SQLite
-            cur.execute("DELETE FROM vehicles WHERE remember_vehicle = 0 OR remember_vehicle IS NULL")
-
-        deleted_vehicles = cur.rowcount
-        print(f"Deleted {deleted_vehicles} vehicles (not marked as 'Remember Vehicle')")
-
-        # Step 3: Count remaining vehicles (those with remember_vehicle enabled)
-        cur.execute("SELECT COUNT(*) as count FROM vehicles")
-        result = cur.fetchone()
-        remaining_vehicles = result['count'] if database_url else result[0]
-        print(f"Kept {remaining_vehicles} vehicles marked as 'Remember Vehicle'")
-
-        conn.commit()
-
-        pst = pytz.timezone('America/Los_Angeles')
-        current_time = datetime.now(pst)
-        print(f"Vehicle reset completed successfully at {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
 
-    except Exception as e:
+def archive_vehicles(conn, placeholder, is_postgres, week_of, cutoff, batch_size, pause):
+    """
+    Move non-remembered vehicles with id <= cutoff into vehicle_history,
+    together with any bookings made on them since archive_bookings() ran.
+    """
+    timing = PhaseTiming('vehicles')
+    lock = " FOR UPDATE OF v" if is_postgres else ""
+    not_remembered = _not_remembered(is_postgres)
+    cur = conn.cursor()
+    while True:
+        started = time.perf_counter()
+        try:
+            _begin(cur, is_postgres)
+            cur.execute(f"""
+                SELECT v.id FROM vehicles v
+                WHERE v.id <= {placeholder} AND {not_remembered}
+                ORDER BY v.id LIMIT {placeholder}{lock}
+            """, (cutoff, batch_size))
+            ids = [row['id'] for row in cur.fetchall()]
+            if not ids:
+                conn.rollback()
+                break
+            in_list = ', '.join([placeholder] * len(ids))
+            # Archive the passengers first; deleting the vehicle would cascade them away
+            record_bookings(cur, week_of, f"b.vehicle_id IN ({in_list})", ids)
+            cur.execute(_archive_bookings_sql(placeholder, f"b.vehicle_id IN ({in_list})"), (week_of, *ids))
+            cur.execute(f"DELETE FROM bookings WHERE vehicle_id IN ({in_list})", ids)
+            cur.execute(f"""
+                INSERT INTO vehicle_history (week_of, vehicle_id, vehicle_name, driver_id, driver_name)
+                SELECT {placeholder}, v.id, v.vehicle_name, v.driver_id, d.full_name
+                FROM vehicles v
+                LEFT JOIN users d ON d.id = v.driver_id
+                WHERE v.id IN ({in_list})
+            """, (week_of, *ids))
+            cur.execute(f"DELETE FROM vehicles WHERE id IN ({in_list})", ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        timing.record(len(ids), time.perf_counter() - started)
+        time.sleep(pause)
+    return timing
+
+
+def reset_vehicles(dry_run=False, batch_size=RESET_BATCH_SIZE, pause=RESET_BATCH_PAUSE):
+    """
+    Reset vehicles and clear bookings every Monday at 12am PST.
+
+    Args:
+        dry_run: Only count what would be archived; nothing is changed
+        batch_size: Rows per transaction
+        pause: Seconds to sleep between batches
+
+    Returns:
+        dict: Counts ('bookings', 'vehicles', 'kept') and, unless dry_run, the
+              PhaseTiming of each phase under 'timings'
+    """
+    is_postgres = os.environ.get('DATABASE_URL') is not None
+    placeholder = "%s" if is_postgres else "?"
+    pst = pytz.timezone('America/Los_Angeles')
+    week_of = _week_of(datetime.now(pst))
+
+    if not dry_run:
+        # Otherwise the first reset after a deploy fails on a missing history table
+        apply_migrations()
+
+    with get_db() as conn, sqltrace.trace('reset_vehicles'):
+        cur = conn.cursor()
+
+        # Anything created after this point belongs to the new week
+        cur.execute("SELECT (SELECT MAX(id) FROM bookings) as bookings, (SELECT MAX(id) FROM vehicles) as vehicles")
+        cutoffs = cur.fetchone()
+        booking_cutoff = cutoffs['bookings'] or 0
+        vehicle_cutoff = cutoffs['vehicles'] or 0
+
+        counts = count_pending(cur, placeholder, is_postgres, booking_cutoff, vehicle_cutoff)
         conn.rollback()
-        print(f"Error during vehicle reset: {e}")
-        raise
-    finally:
-        cur.close()
-        conn.close()
+        result = {'bookings': counts['bookings'], 'vehicles': counts['vehicles'], 'kept': counts['kept']}
+
+        if dry_run:
+            batches = math.ceil(result['bookings'] / batch_size) + math.ceil(result['vehicles'] / batch_size)
+            print(f"Dry run for week of {week_of} (nothing changed):")
+            print(f"  {result['bookings']} passenger bookings would be archived")
+            print(f"  {result['vehicles']} vehicles would be archived (not marked as 'Remember Vehicle')")
+            print(f"  {result['kept']} vehicles marked as 'Remember Vehicle' would be kept")
+            print(f"  about {batches} batches of up to {batch_size} rows")
+            return result
+
+        started = time.perf_counter()
+        try:
+            # Seats offered this week, before any vehicle is archived
+            record_drivers(cur, week_of, vehicle_cutoff)
+            conn.commit()
+            bookings = archive_bookings(conn, placeholder, is_postgres, week_of, booking_cutoff, batch_size, pause)
+            print(f"Archived and cleared {bookings.rows} passenger bookings")
+            vehicles = archive_vehicles(conn, placeholder, is_postgres, week_of, vehicle_cutoff, batch_size, pause)
+            print(f"Archived and deleted {vehicles.rows} vehicles (not marked as 'Remember Vehicle')")
+            print(f"Kept {result['kept']} vehicles marked as 'Remember Vehicle'")
+        except Exception as e:
+            conn.rollback()
+            # Batches already committed stay archived; running the reset again finishes the job
+            print(f"Error during vehicle reset: {e}")
+            raise
+        finally:
+            # Drops the cached board when run inside the web process; when run as a
+            # separate job the app picks the change up once BOARD_CACHE_TTL expires
+            version = board_cache.invalidate()
+        elapsed = time.perf_counter() - started
+
+    # Rewrite the offline backup now; a separate job process has no background writer
+    try:
+        snapshot_writer.write_now(version)
+    except Exception as e:
+        print(f"⚠️ Ride snapshot not updated: {e}")
+
+    print("⏱️ Reset timing:")
+    for timing in (bookings, vehicles):
+        print(f"  {timing.summary()}")
+    print(f"  total: {elapsed * 1000:.1f} ms wall time ({pause * 1000:.0f} ms pause after each batch)")
+
+    current_time = datetime.now(pst)
+    print(f"Vehicle reset completed successfully at {current_time.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+    result['timings'] = {'bookings': bookings, 'vehicles': vehicles}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help="report counts without changing anything")
+    parser.add_argument('--batch-size', type=int, default=RESET_BATCH_SIZE, help="rows per transaction")
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    reset_vehicles(dry_run=args.dry_run, batch_size=args.batch_size)
+
 
 if __name__ == '__main__':
-    reset_vehicles()
+    main()
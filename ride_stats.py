@@ -0,0 +1,174 @@
+"""
+Weekly ride statistics, rolled up during the weekly reset.
+
+reset_vehicles.py calls record_drivers() once before it starts archiving, then
+record_bookings() inside each archive batch, in the same transaction that
+deletes those bookings. Each batch adds its riders to the week's counters, so
+a reset that fails part-way and is run again never counts a booking twice.
+
+    weekly_driver_stats     week, driver: vehicles, capacity (seats), riders
+    weekly_residence_stats  week, residence: riders
+
+load_stats() only reads these two tables for a window of recent weeks. It
+never touches booking_history, so /admin/stats stays fast as years of history
+pile up.
+"""
+import os
+from datetime import date, timedelta
+
+from cache import TTLCache
+from db import get_db
+
+ADMIN_STATS_TTL = float(os.environ.get('ADMIN_STATS_TTL', '300'))
+DEFAULT_WEEKS = 12
+MAX_WEEKS = 520
+TOP_DRIVERS = 10
+
+# Rollups only change once a week, so a short cache just absorbs repeat loads
+stats_cache = TTLCache(maxsize=32, ttl=ADMIN_STATS_TTL)
+
+
+def _dialect():
+    is_postgres = os.environ.get('DATABASE_URL') is not None
+    return is_postgres, "%s" if is_postgres else "?"
+
+
+def record_drivers(cur, week_of, vehicle_cutoff):
+    """
+    Record each driver's vehicles and seats for the week (riders start at 0).
+
+    Args:
+        cur: Cursor inside the caller's transaction
+        week_of: ISO date of the week's Monday
+        vehicle_cutoff: Highest vehicle id that belongs to this week
+    """
+    is_postgres, placeholder = _dialect()
+    greatest = "GREATEST" if is_postgres else "MAX"
+    # On a re-run some vehicles are already archived; keep the larger count
+    cur.execute(f"""
+        INSERT INTO weekly_driver_stats (week_of, driver_id, driver_name, vehicles, capacity, riders)
+        SELECT {placeholder}, d.id, d.full_name, COUNT(v.id), COALESCE(d.driver_capacity, 0), 0
+        FROM vehicles v
+        JOIN users d ON d.id = v.driver_id
+        WHERE v.id <= {placeholder}
+        GROUP BY d.id, d.full_name, d.driver_capacity
+        ON CONFLICT (week_of, driver_id) DO UPDATE SET
+            driver_name = excluded.driver_name,
+            vehicles = {greatest}(weekly_driver_stats.vehicles, excluded.vehicles),
+            capacity = excluded.capacity
+    """, (week_of, vehicle_cutoff))
+
+
+def record_bookings(cur, week_of, where, params):
+    """
+    Add a batch of bookings to the week's rider counts (call before deleting them).
+
+    Args:
+        cur: Cursor inside the caller's transaction
+        week_of: ISO date of the week's Monday
+        where: SQL condition on bookings aliased as b, e.g. "b.id IN (?, ?)"
+        params: Values for the placeholders in where
+    """
+    _, placeholder = _dialect()
+    cur.execute(f"""
+        INSERT INTO weekly_driver_stats (week_of, driver_id, driver_name, riders)
+        SELECT {placeholder}, v.driver_id, d.full_name, COUNT(*)
+        FROM bookings b
+        JOIN vehicles v ON v.id = b.vehicle_id
+        JOIN users d ON d.id = v.driver_id
+        WHERE {where}
+        GROUP BY v.driver_id, d.full_name
+        ON CONFLICT (week_of, driver_id) DO UPDATE SET
+            riders = weekly_driver_stats.riders + excluded.riders
+    """, (week_of, *params))
+    cur.execute(f"""
+        INSERT INTO weekly_residence_stats (week_of, residence, riders)
+        SELECT {placeholder}, COALESCE(p.residence, ''), COUNT(*)
+        FROM bookings b
+        JOIN users p ON p.id = b.passenger_id
+        WHERE {where}
+        GROUP BY COALESCE(p.residence, '')
+        ON CONFLICT (week_of, residence) DO UPDATE SET
+            riders = weekly_residence_stats.riders + excluded.riders
+    """, (week_of, *params))
+
+
+def _utilization(riders, seats):
+    return round(riders / seats, 3) if seats else None
+
+
+def load_stats(weeks=DEFAULT_WEEKS, today=None):
+    """
+    Rollups for the last `weeks` completed weeks (three queries on the rollup tables).
+
+    Returns:
+        dict: 'since' (first Monday included), 'weeks' (newest first, with riders,
+              drivers, vehicles, seats, utilization), 'busiest_drivers' (top
+              TOP_DRIVERS by riders) and 'residences' (riders per residence)
+    """
+    weeks = max(1, min(weeks, MAX_WEEKS))
+    today = today or date.today()
+    since = (today - timedelta(days=today.weekday()) - timedelta(weeks=weeks)).isoformat()
+
+    key = (weeks, since)
+    stats = stats_cache.get(key)
+    if stats is not None:
+        return stats
+
+    _, placeholder = _dialect()
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT week_of, SUM(riders) as riders, COUNT(*) as drivers,
+                   SUM(vehicles) as vehicles, SUM(capacity) as seats
+            FROM weekly_driver_stats
+            WHERE week_of >= {placeholder}
+            GROUP BY week_of
+            ORDER BY week_of DESC
+        """, (since,))
+        week_rows = cur.fetchall()
+        cur.execute(f"""
+            SELECT driver_id, MAX(driver_name) as driver_name, COUNT(*) as weeks,
+                   SUM(riders) as riders, SUM(capacity) as seats
+            FROM weekly_driver_stats
+            WHERE week_of >= {placeholder}
+            GROUP BY driver_id
+            ORDER BY riders DESC, driver_id
+            LIMIT {TOP_DRIVERS}
+        """, (since,))
+        driver_rows = cur.fetchall()
+        cur.execute(f"""
+            SELECT residence, SUM(riders) as riders, COUNT(*) as weeks
+            FROM weekly_residence_stats
+            WHERE week_of >= {placeholder}
+            GROUP BY residence
+            ORDER BY riders DESC, residence
+        """, (since,))
+        residence_rows = cur.fetchall()
+
+    stats = {
+        'since': since,
+        'weeks': [{
+            'week_of': str(row['week_of']),
+            'riders': int(row['riders']),
+            'drivers': row['drivers'],
+            'vehicles': int(row['vehicles']),
+            'seats': int(row['seats']),
+            'utilization': _utilization(row['riders'], row['seats']),
+        } for row in week_rows],
+        'busiest_drivers': [{
+            'driver_id': row['driver_id'],
+            'driver_name': row['driver_name'],
+            'weeks': row['weeks'],
+            'riders': int(row['riders']),
+            'seats': int(row['seats']),
+            'utilization': _utilization(row['riders'], row['seats']),
+        } for row in driver_rows],
+        'residences': [{
+            'residence': row['residence'] or None,
+            'riders': int(row['riders']),
+            'weeks': row['weeks'],
+        } for row in residence_rows],
+    }
+    stats_cache.set(key, stats)
+    return stats
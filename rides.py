@@ -0,0 +1,219 @@
+"""
+Ride board data access shared by the web routes.
+"""
+import os
+from db import get_db
+
+# Outcomes of book_seat()
+BOOKED = 'booked'
+ALREADY_BOOKED = 'already_booked'
+FULL = 'full'
+NO_SUCH_VEHICLE = 'no_such_vehicle'
+
+
+def load_ride_board():
+    """
+    Build the ride board: every vehicle with its driver and passengers.
+
+    Returns:
+        list: Vehicle dictionaries with 'passengers', 'driver_total_passengers'
+              and 'is_full' filled in
+    """
+    with get_db() as conn:
+        cur = conn.cursor()
+
+        # Single query with JOIN to get all data at once (avoids N+1 queries)
+        cur.execute("""
+            SELECT
+                v.id as vehicle_id,
+                v.vehicle_name,
+                v.driver_id,
+                u.full_name as driver_name,
+                u.phone_number as driver_phone,
+                u.driver_capacity,
+                p.full_name as passenger_name,
+                p.id as passenger_id
+            FROM vehicles v
+            JOIN users u ON v.driver_id = u.id
+            LEFT JOIN bookings b ON b.vehicle_id = v.id
+            LEFT JOIN users p ON b.passenger_id = p.id
+            ORDER BY u.full_name, v.vehicle_name, p.full_name
+        """)
+        rows = cur.fetchall()
+
+    # Process results into structured data
+    vehicles_dict = {}
+    driver_totals = {}
+
+    for row in rows:
+        vehicle_id = row['vehicle_id']
+        driver_id = row['driver_id']
+
+        # Initialize vehicle if not seen before
+        if vehicle_id not in vehicles_dict:
+            vehicles_dict[vehicle_id] = {
+                'id': vehicle_id,
+                'name': row['vehicle_name'],
+                'driver': row['driver_name'],
+                'driver_phone': row['driver_phone'],
+                'driver_id': driver_id,
+                'driver_capacity': row['driver_capacity'] or 0,
+                'passengers': []
+            }
+
+            # Only initialize driver total if we haven't seen this DRIVER before.
+            # Do not reset it just because we found a new vehicle.
+            if driver_id not in driver_totals:
+                driver_totals[driver_id] = 0
+
+        # Add passenger if exists
+        if row['passenger_id']:
+            passenger = {
+                'full_name': row['passenger_name'],
+                'id': row['passenger_id']
+            }
+            # Avoid duplicates (in case of data issues)
+            if passenger not in vehicles_dict[vehicle_id]['passengers']:
+                vehicles_dict[vehicle_id]['passengers'].append(passenger)
+                driver_totals[driver_id] += 1
+
+    # Add driver totals and capacity check to each vehicle
+    vehicles_data = []
+    for vehicle in vehicles_dict.values():
+        driver_id = vehicle['driver_id']
+        driver_total = driver_totals.get(driver_id, 0)
+        vehicle['driver_total_passengers'] = driver_total
+        vehicle['is_full'] = driver_total >= vehicle['driver_capacity']
+        vehicles_data.append(vehicle)
+
+    return vehicles_data
+
+
+def load_ride_roster():
+    """
+    Every vehicle with its driver's and passengers' contact details, for the
+    watchdog's backup email and the offline snapshot.
+
+    Returns:
+        list: Ride dictionaries ordered by driver name
+    """
+    with get_db() as conn:
+        cur = conn.cursor()
+
+        # One ordered JOIN (rows for a vehicle are adjacent) instead of a query per vehicle
+        cur.execute("""
+            SELECT v.id, v.vehicle_name,
+                   u.full_name as driver_name,
+                   u.phone_number as driver_phone,
+                   u.email as driver_email,
+                   u.driver_capacity,
+                   p.full_name as passenger_name,
+                   p.phone_number as passenger_phone,
+                   p.email as passenger_email,
+                   p.residence as passenger_residence
+            FROM vehicles v
+            JOIN users u ON v.driver_id = u.id
+            LEFT JOIN bookings b ON b.vehicle_id = v.id
+            LEFT JOIN users p ON b.passenger_id = p.id
+            ORDER BY u.full_name, v.id, p.full_name
+        """)
+        rows = cur.fetchall()
+
+    rides_data = []
+    current_id = None
+    for row in rows:
+        if row['id'] != current_id:
+            current_id = row['id']
+            ride = {
+                'vehicle_name': row['vehicle_name'],
+                'driver_name': row['driver_name'],
+                'driver_phone': row['driver_phone'],
+                'driver_email': row['driver_email'],
+                'driver_capacity': row['driver_capacity'],
+                'passengers': []
+            }
+            rides_data.append(ride)
+        # LEFT JOIN gives one row with NULL passenger columns for an empty vehicle
+        if row['passenger_name'] is not None:
+            ride['passengers'].append({
+                'name': row['passenger_name'],
+                'phone': row['passenger_phone'],
+                'email': row['passenger_email'],
+                'residence': row['passenger_residence']
+            })
+
+    return rides_data
+
+
+def book_seat(conn, passenger_id, vehicle_id):
+    """
+    Atomically book a seat, enforcing the driver's total capacity.
+
+    The capacity check and the INSERT are one conditional statement, run while
+    holding the driver's lock (BEGIN IMMEDIATE on SQLite, a row lock on the
+    driver's users row on PostgreSQL), so two simultaneous clicks can't both
+    take the last seat. The passenger_id UNIQUE constraint stops double booking.
+
+    Args:
+        conn: Open database connection (committed or rolled back here)
+        passenger_id: User joining the ride
+        vehicle_id: Vehicle (pickup location) to join
+
+    Returns:
+        str: BOOKED, ALREADY_BOOKED, FULL or NO_SUCH_VEHICLE
+    """
+    is_postgres = os.environ.get('DATABASE_URL') is not None
+    placeholder = "%s" if is_postgres else "?"
+    cur = conn.cursor()
+
+    # Insert only if the vehicle exists and the driver's passengers across
+    # ALL their vehicles are still below driver_capacity
+    conditional_insert = f"""
+        INSERT {'' if is_postgres else 'OR IGNORE '}INTO bookings (passenger_id, vehicle_id)
+        SELECT {placeholder}, v.id
+        FROM vehicles v
+        JOIN users d ON d.id = v.driver_id
+        WHERE v.id = {placeholder}
+          AND (SELECT COUNT(*) FROM bookings b
+               JOIN vehicles dv ON b.vehicle_id = dv.id
+               WHERE dv.driver_id = v.driver_id) < COALESCE(d.driver_capacity, 0)
+        {'ON CONFLICT (passenger_id) DO NOTHING' if is_postgres else ''}
+    """
+
+    try:
+        if is_postgres:
+            # One round trip: lock the driver row, then insert. In READ COMMITTED
+            # each statement gets a fresh snapshot, so the INSERT's COUNT sees
+            # every booking committed by whoever held the lock before us.
+            cur.execute(f"""
+                SELECT d.id FROM users d
+                WHERE d.id = (SELECT driver_id FROM vehicles WHERE id = {placeholder})
+                FOR UPDATE;
+            """ + conditional_insert, (vehicle_id, passenger_id, vehicle_id))
+        else:
+            # Take the write lock up front; a deferred transaction could fail
+            # to upgrade its stale read snapshot under WAL
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(conditional_insert, (passenger_id, vehicle_id))
+
+        if cur.rowcount == 1:
+            conn.commit()
+            return BOOKED
+
+        # Nothing inserted - work out why (only runs on the failure path)
+        cur.execute(f"""
+            SELECT
+                (SELECT COUNT(*) FROM bookings WHERE passenger_id = {placeholder}) as booked,
+                (SELECT COUNT(*) FROM vehicles WHERE id = {placeholder}) as vehicle_exists
+        """, (passenger_id, vehicle_id))
+        row = cur.fetchone()
+        conn.rollback()
+
+        if row['booked']:
+            return ALREADY_BOOKED
+        if not row['vehicle_exists']:
+            return NO_SUCH_VEHICLE
+        return FULL
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,232 @@
+"""
+Offline snapshot of the ride roster for outage backups.
+
+After every committed booking or vehicle change the app schedules a rewrite of
+RIDE_SNAPSHOT_PATH: gzip-compressed JSON with every vehicle, its driver and its
+passengers' contact details (the same data as the watchdog email). Writes are
+debounced on a background thread, so a burst of joins turns into one write
+SNAPSHOT_DEBOUNCE_SECONDS after the burst ends (but never later than
+SNAPSHOT_MAX_DELAY_SECONDS after the first change). The file is written to a
+temporary name and renamed over the old one, so readers never see a partial
+snapshot.
+
+The watchdog reads the file with read_snapshot() instead of querying, so the
+backup email still goes out when the database itself is down. A watchdog on
+the same disk (a cron job next to the app) reads the app's file directly. One
+elsewhere (the GitHub Actions workflow) calls fetch_snapshot() on every run
+to copy /api/ride_snapshot into its own RIDE_SNAPSHOT_PATH, and keeps that
+copy between runs. When the app itself is down it then has the copy from the
+last run on which the app answered. Set RIDE_SNAPSHOT_PATH to an empty
+string to turn snapshots off.
+"""
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from rides import load_ride_roster
+
+RIDE_SNAPSHOT_PATH = os.environ.get('RIDE_SNAPSHOT_PATH', 'ride_snapshot.json.gz')
+SNAPSHOT_DEBOUNCE_SECONDS = float(os.environ.get('SNAPSHOT_DEBOUNCE_SECONDS', '2'))
+SNAPSHOT_MAX_DELAY_SECONDS = float(os.environ.get('SNAPSHOT_MAX_DELAY_SECONDS', '10'))
+
+# Bumped if the file layout changes; read_snapshot() rejects other formats
+SNAPSHOT_FORMAT = 1
+
+
+class Snapshot(namedtuple('Snapshot', 'rides version written_at')):
+    """A snapshot read back from disk; written_at is an aware UTC datetime"""
+
+    @property
+    def age(self):
+        """Seconds since the snapshot was written"""
+        return max(0.0, (datetime.now(timezone.utc) - self.written_at).total_seconds())
+
+
+def write_snapshot(rides, version, path=RIDE_SNAPSHOT_PATH):
+    """
+    Atomically replace the snapshot file.
+
+    Args:
+        rides: Ride dictionaries from rides.load_ride_roster()
+        version: Board version the data was loaded at
+        path: Destination file
+
+    Returns:
+        int: Compressed size in bytes
+    """
+    payload = {
+        'format': SNAPSHOT_FORMAT,
+        'version': version,
+        'written_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'rides': rides,
+    }
+    data = gzip.compress(json.dumps(payload, separators=(',', ':')).encode(), mtime=0)
+
+    # Same directory as the target so the rename can't cross filesystems
+    fd, tmp_path = tempfile.mkstemp(prefix='.ride_snapshot.', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(data)
+
+
+def read_snapshot(path=RIDE_SNAPSHOT_PATH):
+    """
+    Load the snapshot file.
+
+    Returns:
+        Snapshot, or None if snapshots are off or no file has been written yet
+
+    Raises:
+        ValueError: The file is corrupt or in an unknown format
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, 'rb') as f:
+            payload = json.load(f)
+    except (OSError, EOFError) as e:
+        raise ValueError(f"unreadable snapshot {path}: {e}")
+    if not isinstance(payload, dict) or payload.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"unknown snapshot format in {path}")
+    return Snapshot(payload['rides'], payload['version'], datetime.fromisoformat(payload['written_at']))
+
+
+def fetch_snapshot(url, token, path=RIDE_SNAPSHOT_PATH, timeout=10):
+    """
+    Download the app's snapshot (GET /api/ride_snapshot) over the local copy.
+
+    The download is checked with read_snapshot() before it replaces the file,
+    so a bad response never overwrites a good copy.
+
+    Args:
+        url: The app's /api/ride_snapshot URL
+        token: METRICS_TOKEN, sent as a Bearer token
+        path: Local copy to replace
+        timeout: Seconds for the request
+
+    Returns:
+        Snapshot: What was downloaded
+
+    Raises:
+        OSError: Request failed (urllib.error.HTTPError for non-200 answers)
+        ValueError: The response isn't a snapshot
+    """
+    import urllib.request
+    request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        data = response.read()
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.ride_snapshot.', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        snapshot = read_snapshot(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return snapshot
+
+
+class SnapshotWriter:
+    """Debounced background writer; schedule() is cheap and never touches the database"""
+
+    def __init__(self, loader, path=RIDE_SNAPSHOT_PATH, debounce=SNAPSHOT_DEBOUNCE_SECONDS,
+                 max_delay=SNAPSHOT_MAX_DELAY_SECONDS):
+        self.loader = loader
+        self.path = path
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pending = None  # newest board version waiting to be written
+        self._first_change = 0.0
+        self._last_change = 0.0
+        self.scheduled = 0
+        self.writes = 0
+        self.errors = 0
+        self.last_version = None
+        self.last_written = None
+        self.last_bytes = 0
+
+    def schedule(self, version):
+        """Ask for a rewrite reflecting board `version` (call after commit)"""
+        if not self.path:
+            return
+        with self._cond:
+            now = time.monotonic()
+            if self._pending is None:
+                self._first_change = now
+            self._pending = version
+            self._last_change = now
+            self.scheduled += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ride-snapshot', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                # Wait for the burst to go quiet, bounded by max_delay
+                while True:
+                    due = min(self._last_change + self.debounce, self._first_change + self.max_delay)
+                    remaining = due - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                version, self._pending = self._pending, None
+            try:
+                self.write_now(version)
+            except Exception as e:
+                # Keep the previous file; the next change tries again
+                print(f"⚠️ Ride snapshot write failed: {e}")
+
+    def write_now(self, version):
+        """Load the roster and write the snapshot on the calling thread"""
+        if not self.path:
+            return
+        try:
+            size = write_snapshot(self.loader(), version, self.path)
+        except Exception:
+            self.errors += 1
+            raise
+        self.writes += 1
+        self.last_version = version
+        self.last_written = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        self.last_bytes = size
+
+    def stats(self):
+        return {
+            'path': self.path or None,
+            'scheduled': self.scheduled,
+            'writes': self.writes,
+            'errors': self.errors,
+            'last_version': self.last_version,
+            'last_written': self.last_written,
+            'bytes': self.last_bytes,
+        }
+
+
+# Shared instance used by the web app
+snapshot_writer = SnapshotWriter(load_ride_roster)
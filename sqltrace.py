@@ -0,0 +1,206 @@
+"""
+Opt-in SQL tracing for connections from db.get_db_connection().
+
+While a trace is active on the current thread, every execute() is recorded
+with its normalized SQL, parameter count, duration and call site (first frame
+outside db.py). A trace is active:
+  - for every web request when TRACE_SQL=1 (see init_app)
+  - inside `with trace('label'):` blocks in scripts, when TRACE_SQL=1
+  - inside `with query_budget(n):` blocks, even with TRACE_SQL off
+
+Queries slower than SLOW_QUERY_MS are written to the slow-query log (stdout, or
+SLOW_QUERY_LOG if set). When a trace ends, any statement that ran
+N_PLUS_ONE_THRESHOLD or more times is reported as a likely N+1 pattern.
+
+query_budget() lets a check assert how many queries a route may run:
+
+    with query_budget(3, max_repeats=1):
+        client.get('/')
+"""
+import os
+import re
+import sys
+import threading
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+TRACE_SQL = os.environ.get('TRACE_SQL', '').lower() in ('1', 'true', 'yes', 'on')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', '5'))
+
+QueryRecord = namedtuple('QueryRecord', 'sql params duration_ms site')
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+# Frames from these files are skipped when looking for the caller
+_INTERNAL_FILES = ('db.py', 'sqltrace.py', 'contextlib.py')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_COMMENT_RE = re.compile(r'--[^\n]*')
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A query_budget() block ran more (or more repeated) queries than allowed"""
+
+
+class Trace:
+    """Queries recorded between start and end of one request / block"""
+
+    def __init__(self, label):
+        self.label = label
+        self.queries = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(q.duration_ms for q in self.queries)
+
+    def repeated(self, threshold=2):
+        """
+        Statements executed at least `threshold` times.
+
+        Returns:
+            list: (normalized sql, count, call sites) tuples, most repeated first
+        """
+        counts = Counter(q.sql for q in self.queries)
+        result = []
+        for sql, count in counts.most_common():
+            if count < threshold:
+                break
+            sites = sorted({q.site for q in self.queries if q.sql == sql})
+            result.append((sql, count, sites))
+        return result
+
+    def summary(self):
+        lines = [f"{len(self.queries)} queries, {self.total_ms:.1f} ms ({self.label})"]
+        for q in self.queries:
+            lines.append(f"  {q.duration_ms:8.2f} ms  {q.site:<32} {q.sql}  [{q.params} params]")
+        return '\n'.join(lines)
+
+
+def normalize(sql):
+    """Drop comments, collapse whitespace and replace literals/placeholders with '?' so equal statements compare equal"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _COMMENT_RE.sub('', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _SPACE_RE.sub(' ', sql).strip()
+    return _IN_LIST_RE.sub('(...)', sql)
+
+
+def _call_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.basename(frame.f_code.co_filename)
+        if filename not in _INTERNAL_FILES:
+            return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return '?'
+
+
+def active():
+    """True if the calling thread is currently being traced (cheap; called on every query)"""
+    return bool(getattr(_local, 'stack', None))
+
+
+def record(sql, params, elapsed):
+    """Called by db.py's instrumented cursor for each statement while active()"""
+    # For executemany() this is the number of rows (-1 for a consumed iterator)
+    param_count = 0 if params is None else len(params) if hasattr(params, '__len__') else -1
+    entry = QueryRecord(normalize(sql), param_count, elapsed * 1000, _call_site())
+    for trace_ in _local.stack:
+        trace_.queries.append(entry)
+    if entry.duration_ms >= SLOW_QUERY_MS:
+        _log(f"SLOW {entry.duration_ms:.1f} ms  {entry.site}  {entry.sql}  [{entry.params} params] "
+             f"({_local.stack[0].label})")
+
+
+def _log(message):
+    line = f"{datetime.now().isoformat(timespec='seconds')} {message}"
+    if SLOW_QUERY_LOG:
+        with _log_lock, open(SLOW_QUERY_LOG, 'a') as f:
+            f.write(line + '\n')
+    else:
+        print(f"🐢 {line}")
+
+
+def start(label):
+    trace_ = Trace(label)
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    _local.stack.append(trace_)
+    return trace_
+
+
+def finish(trace_, report=True):
+    """End a trace and report N+1 patterns found in it"""
+    stack = getattr(_local, 'stack', [])
+    if trace_ in stack:
+        stack.remove(trace_)
+    if report:
+        for sql, count, sites in trace_.repeated(N_PLUS_ONE_THRESHOLD):
+            _log(f"N+1 {count}x in {trace_.label}: {sql}  (from {', '.join(sites)})")
+    return trace_
+
+
+@contextmanager
+def trace(label):
+    """Trace the queries run inside the block when TRACE_SQL is on (yields the Trace or None)"""
+    if not TRACE_SQL:
+        yield None
+        return
+    trace_ = start(label)
+    try:
+        yield trace_
+    finally:
+        finish(trace_)
+
+
+@contextmanager
+def query_budget(max_queries, max_repeats=None, label='query budget'):
+    """
+    Fail if the block runs more than max_queries statements, or any single
+    statement more than max_repeats times.
+
+    Raises:
+        QueryBudgetExceeded: With the offending queries listed
+    """
+    trace_ = start(label)
+    try:
+        yield trace_
+    finally:
+        finish(trace_, report=False)
+    if len(trace_) > max_queries:
+        raise QueryBudgetExceeded(f"{label}: {len(trace_)} queries > budget of {max_queries}\n{trace_.summary()}")
+    if max_repeats is not None:
+        repeated = trace_.repeated(max_repeats + 1)
+        if repeated:
+            sql, count, sites = repeated[0]
+            raise QueryBudgetExceeded(f"{label}: statement ran {count}x (max {max_repeats}) from "
+                                      f"{', '.join(sites)}: {sql}")
+
+
+def init_app(app):
+    """Trace every request when TRACE_SQL is on"""
+    if not TRACE_SQL:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _start_sql_trace():
+        g.sql_trace = start(f"{request.method} {request.path}")
+
+    @app.teardown_request
+    def _finish_sql_trace(exc):
+        trace_ = g.pop('sql_trace', None)
+        if trace_ is not None:
+            finish(trace_)
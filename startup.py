@@ -0,0 +1,155 @@
+"""
+Cold-start timing and warm-up.
+
+After the host puts the app to sleep, the first visitor waits for the whole
+start-up: the interpreter, the imports, opening database connections,
+compiling templates and loading the ride board. startup_timeline records when
+each stage finished, in seconds since the process started. Under gunicorn
+the clock starts with the master process. /metrics reports it, and so does
+/health for admins and METRICS_TOKEN holders:
+
+    imported     app.py finished importing
+    warmed_up    warm_up() finished
+    first_byte   the first response was ready to send
+
+warm_up() does the first request's one-time work ahead of time. It opens the
+pool's connections, compiles every template, loads the ride board into
+board_cache and renders its cards (cards.py). It also starts working out the
+password policy in the background. gunicorn.conf.py calls it in
+post_worker_init, before the worker accepts connections. WARM_UP=0 turns it
+off.
+"""
+import os
+import threading
+import time
+
+from flask import request
+
+from cache import board_cache
+from cards import card_cache
+from db import get_db
+from passwords import password_hasher
+from rides import load_ride_board
+
+WARM_UP = os.environ.get('WARM_UP', '1').lower() not in ('0', 'false', 'no', 'off')
+
+
+def process_start_time(pid=None):
+    """Wall-clock time a process started, from /proc (None where that isn't available)"""
+    try:
+        with open(f'/proc/{pid or os.getpid()}/stat') as f:
+            # Field 22 is the start time in clock ticks since boot; the command name can hold spaces
+            ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return time.time() - uptime + ticks / os.sysconf('SC_CLK_TCK')
+
+
+class StartupTimeline:
+    """Wall-clock times of the start-up stages; one per process"""
+
+    def __init__(self):
+        self.started = process_start_time() or time.time()
+        self.first_path = None
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def start_from(self, pid):
+        """Count from another process's start instead (the gunicorn master)"""
+        self.started = process_start_time(pid) or self.started
+
+    def mark(self, stage):
+        """Record that stage just finished; True the first time only"""
+        if stage in self._stages:
+            return False
+        with self._lock:
+            if stage in self._stages:
+                return False
+            self._stages[stage] = time.time()
+            return True
+
+    def seconds(self, stage):
+        """Seconds from process start to stage (None if it hasn't happened)"""
+        finished = self._stages.get(stage)
+        return None if finished is None else round(finished - self.started, 3)
+
+    def stats(self):
+        return {
+            'imported_s': self.seconds('imported'),
+            'warmed_up_s': self.seconds('warmed_up'),
+            'first_byte_s': self.seconds('first_byte'),
+            'first_path': self.first_path,
+        }
+
+
+startup_timeline = StartupTimeline()
+
+
+def _open_database():
+    # Creating the pool opens DB_POOL_MIN connections; this also imports the driver
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+
+
+def _compile_templates(app):
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+
+def _render_board_cards(app):
+    with app.app_context():
+        card_cache.cards(board_cache.snapshot(load_ride_board)[1])
+
+
+def _start_password_policy():
+    # One full hash (~100 ms of CPU); it runs on the niced hashing thread, so don't wait for it
+    threading.Thread(target=password_hasher.policy_prefix, name='warm-up-passwords', daemon=True).start()
+
+
+def warm_up(app):
+    """
+    Run the one-time start-up work before the first request.
+
+    A step that fails is logged and skipped, so a slow database can't stop
+    the worker booting; the first request that needs it will try again.
+
+    Returns:
+        dict: Step name -> milliseconds (None if it failed)
+    """
+    steps = (
+        ('database', _open_database),
+        ('templates', lambda: _compile_templates(app)),
+        ('password policy', _start_password_policy),
+        ('ride board', lambda: board_cache.get(load_ride_board)),
+        ('board cards', lambda: _render_board_cards(app)),
+    )
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+            timings[name] = round((time.perf_counter() - started) * 1000, 1)
+        except Exception as e:
+            print(f"⚠️ Warm-up step '{name}' failed: {e}")
+            timings[name] = None
+    startup_timeline.mark('warmed_up')
+    summary = ', '.join(f"{name} {'failed' if ms is None else f'{ms:.0f} ms'}" for name, ms in timings.items())
+    print(f"🔥 Warmed up in {startup_timeline.seconds('warmed_up'):.2f}s after start ({summary})")
+    return timings
+
+
+def init_app(app):
+    """Mark the end of the import and time the first response; call at the end of app.py"""
+    startup_timeline.mark('imported')
+
+    @app.after_request
+    def record_first_byte(response):
+        if startup_timeline.mark('first_byte'):
+            startup_timeline.first_path = f"{request.method} {request.path}"
+            print(f"🚀 First response ({startup_timeline.first_path}) "
+                  f"{startup_timeline.seconds('first_byte'):.2f}s after start")
+        return response
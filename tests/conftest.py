@@ -0,0 +1,32 @@
+"""
+Shared set-up for the test suite.
+
+Settings are read from the environment when modules are imported, so they are
+set here, before any test imports the app. Without DATABASE_URL the tests run
+against a scratch SQLite file. With it they run against that PostgreSQL
+database; point it at a scratch one, because the tests insert and delete rows.
+
+    python -m pytest
+    DATABASE_URL=postgresql://localhost/scratch python -m pytest
+"""
+import os
+import tempfile
+
+import pytest
+
+_scratch = tempfile.mkdtemp(prefix='church-rides-tests-')
+if not os.environ.get('DATABASE_URL'):
+    # Some modules only check that DATABASE_URL is set, so an empty one would mean PostgreSQL
+    os.environ.pop('DATABASE_URL', None)
+    os.environ['SQLITE_PATH'] = os.path.join(_scratch, 'tests.db')
+os.environ['RIDE_SNAPSHOT_PATH'] = os.path.join(_scratch, 'ride_snapshot.json.gz')
+os.environ.setdefault('ADMIN_PASSWORD', 'test-admin')
+os.environ.setdefault('WARM_UP', '0')
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+
+@pytest.fixture(scope='session')
+def database():
+    """Schema migrated to the latest version"""
+    from db import init_db
+    init_db()
@@ -0,0 +1,107 @@
+"""
+rides.book_seat() under contention: a driver's capacity is never exceeded.
+
+Runs the PostgreSQL path (driver row lock + ON CONFLICT) when DATABASE_URL is
+set, and the SQLite path (BEGIN IMMEDIATE + INSERT OR IGNORE) otherwise.
+"""
+import random
+import threading
+from collections import Counter
+
+import pytest
+
+from benchmarks.booking_stress import cleanup, seed
+from db import get_db, get_db_connection, release_db_connection
+from rides import ALREADY_BOOKED, BOOKED, book_seat
+
+CAPACITY = 5
+
+
+@pytest.fixture
+def drivers(database):
+    """{driver id: [vehicle ids]} and passenger ids; three drivers with two vehicles each"""
+    cleanup()
+    yield seed(drivers=3, capacity=CAPACITY, passengers=60)
+    cleanup()
+
+
+def booked_per_driver(driver_ids):
+    """{driver id: bookings} for the given drivers (a shared database may hold others)"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT v.driver_id, COUNT(b.id) as booked
+            FROM bookings b JOIN vehicles v ON b.vehicle_id = v.id
+            GROUP BY v.driver_id
+        """)
+        return {row['driver_id']: row['booked'] for row in cur.fetchall() if row['driver_id'] in driver_ids}
+    finally:
+        release_db_connection(conn)
+
+
+def run_together(targets):
+    """Start one thread per (passenger id, vehicle ids) and release them all at once"""
+    outcomes = Counter()
+    booked_for = Counter()
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(targets))
+
+    def worker(passenger_id, attempts):
+        barrier.wait()
+        for driver_id, vehicle_id in attempts:
+            try:
+                with get_db() as conn:
+                    outcome = book_seat(conn, passenger_id, vehicle_id)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            with lock:
+                outcomes[outcome] += 1
+                if outcome == BOOKED:
+                    booked_for[driver_id] += 1
+
+    threads = [threading.Thread(target=worker, args=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes, booked_for, errors
+
+
+# A race doesn't show up on every run, so try a few different interleavings
+@pytest.mark.parametrize('rng_seed', range(5))
+def test_concurrent_bookings_never_exceed_capacity(drivers, rng_seed):
+    driver_vehicles, passenger_ids = drivers
+    vehicles = [(driver_id, vehicle_id) for driver_id, ids in driver_vehicles.items() for vehicle_id in ids]
+    rng = random.Random(rng_seed)
+    # 60 passengers, two attempts each, for 15 seats
+    targets = [(passenger_id, [rng.choice(vehicles) for _ in range(2)]) for passenger_id in passenger_ids]
+
+    outcomes, booked_for, errors = run_together(targets)
+
+    assert errors == []
+    in_database = booked_per_driver(driver_vehicles)
+    for driver_id in driver_vehicles:
+        assert in_database.get(driver_id, 0) <= CAPACITY, f"driver {driver_id} overbooked"
+        assert in_database.get(driver_id, 0) == booked_for[driver_id]
+    # Enough demand that every driver filled up, so the limit was actually contended
+    assert outcomes[BOOKED] == CAPACITY * len(driver_vehicles)
+
+
+def test_double_click_books_one_seat(drivers):
+    driver_vehicles, passenger_ids = drivers
+    driver_id, (vehicle_id, other_vehicle_id) = next(iter(driver_vehicles.items()))
+    passenger_id = passenger_ids[0]
+
+    outcomes, _, errors = run_together([
+        (passenger_id, [(driver_id, vehicle_id)]),
+        (passenger_id, [(driver_id, vehicle_id)]),
+        (passenger_id, [(driver_id, other_vehicle_id)]),
+    ])
+
+    assert errors == []
+    assert outcomes == Counter({BOOKED: 1, ALREADY_BOOKED: 2})
+    assert booked_per_driver(driver_vehicles) == {driver_id: 1}
@@ -0,0 +1,88 @@
+"""
+ConnectionPool checks idle connections without holding its lock, so one
+slow ping or close doesn't hold up every other checkout.
+"""
+import threading
+import time
+
+from db_pool import ConnectionPool
+
+
+class FakeConn:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(ping, maxconn=2):
+    names = iter(range(100))
+    return ConnectionPool(lambda: FakeConn(next(names)), maxconn=maxconn, timeout=2, ping=ping, ping_after=0)
+
+
+def fill(pool, count):
+    """Open `count` connections and return them all to the idle list"""
+    conns = [pool.getconn() for _ in range(count)]
+    for conn in conns:
+        pool.putconn(conn)
+    time.sleep(0.01)  # idle for longer than ping_after
+    return conns
+
+
+def test_blocked_ping_does_not_hold_up_other_checkouts():
+    release = threading.Event()
+    pinging = threading.Event()
+    first_ping = threading.Lock()
+
+    def ping(conn):
+        if first_ping.acquire(blocking=False):
+            pinging.set()
+            release.wait(5)   # half-dead connection: the round trip hangs
+        return True
+
+    pool = make_pool(ping)
+    fill(pool, 2)
+    stuck = {}
+    thread = threading.Thread(target=lambda: stuck.setdefault('conn', pool.getconn()))
+    thread.start()
+    try:
+        assert pinging.wait(2)
+        started = time.monotonic()
+        other = pool.getconn(timeout=1)
+        assert time.monotonic() - started < 0.5
+        pool.putconn(other)
+        assert pool.stats()['idle'] == 1
+    finally:
+        release.set()
+        thread.join(5)
+    assert stuck['conn'] is not other
+    pool.putconn(stuck['conn'])
+
+
+def test_failed_ping_discards_and_retries():
+    pool = make_pool(lambda conn: conn.name != 1)
+    dead, alive = fill(pool, 2)[::-1]   # the idle list is LIFO: conn 1 comes out first
+
+    conn = pool.getconn()
+
+    assert conn is alive
+    assert dead.closed
+    stats = pool.stats()
+    assert (stats['discarded'], stats['in_use'], stats['idle']) == (1, 1, 0)
+    # The freed slot can be used for a new connection
+    assert pool.getconn(timeout=0.1).name == 2
+
+
+def test_discarded_slot_wakes_a_waiter():
+    pool = make_pool(lambda conn: True, maxconn=1)
+    conn = pool.getconn()
+    waiter = {}
+    thread = threading.Thread(target=lambda: waiter.setdefault('conn', pool.getconn(timeout=2)))
+    thread.start()
+    time.sleep(0.05)
+    pool.putconn(conn, discard=True)
+    thread.join(3)
+    assert conn.closed
+    assert waiter['conn'].name == 1
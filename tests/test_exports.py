@@ -0,0 +1,105 @@
+"""
+The passenger export reads in keyset batches, holds no connection while the
+client downloads, and its streamed queries count towards the request's metrics.
+"""
+import contextlib
+import csv
+import functools
+import io
+
+import pytest
+
+import exports
+import metrics
+from benchmarks.seed import PASSWORD, clear, seed, seeded_usernames
+from db import get_db
+
+USERS, VEHICLES = 120, 10
+BATCH = 7
+HTTPS = 'https://localhost'
+
+
+@pytest.fixture(scope='module')
+def admin(database):
+    """Test client logged in as a seeded admin"""
+    with get_db() as conn:
+        clear(conn)
+        seed(conn, users=USERS, vehicles=VEHICLES, admins=1)
+    from app import app
+    client = app.test_client()
+    username = seeded_usernames(USERS, VEHICLES, admins=1)['admins'][0]
+    response = client.post('/login', data={'username': username, 'password': PASSWORD}, base_url=HTTPS)
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def tracked_connections(monkeypatch):
+    """Counts exports' open get_db() blocks and how many were opened"""
+    state = {'open': 0, 'opened': 0}
+
+    @contextlib.contextmanager
+    def counting_get_db():
+        state['open'] += 1
+        state['opened'] += 1
+        try:
+            with get_db() as conn:
+                yield conn
+        finally:
+            state['open'] -= 1
+
+    monkeypatch.setattr(exports, 'get_db', counting_get_db)
+    monkeypatch.setattr(exports, 'EXPORT_BATCH_SIZE', BATCH)
+    return state
+
+
+def all_rows():
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute(exports.PASSENGERS_BY_DRIVER_SQL.format(where='', placeholder='1000000').replace(
+            'LIMIT 1000000', ''))
+        return [dict(row) for row in cur.fetchall()]
+
+
+def test_batches_match_one_query(admin):
+    expected = all_rows()
+    assert len(expected) > BATCH * 3
+    for batch_size in (1, BATCH, len(expected), len(expected) + 1):
+        assert [dict(row) for row in exports.passengers_by_driver(batch_size)] == expected
+
+
+def test_no_connection_held_during_download(admin, tracked_connections, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'passengers_csv', functools.partial(exports.passengers_csv, flush_every=3))
+    expected = len(all_rows())
+    response = admin.get('/admin/export/passengers.csv', base_url=HTTPS, buffered=False)
+    assert response.status_code == 200
+    chunks = iter(response.response)
+
+    body = next(chunks)
+    # Paused mid-download, like a slow client: one batch read, and its connection back in the pool
+    assert tracked_connections == {'open': 0, 'opened': 1}
+    body += b''.join(chunks)
+    response.close()
+
+    assert len(list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))) == expected + 1
+    assert tracked_connections['opened'] == expected // BATCH + 1
+
+
+@pytest.mark.parametrize('endpoint, url, magic', [
+    ('export_passengers_csv', '/admin/export/passengers.csv', b'\xef\xbb\xbf'),
+    ('export_rides_pdf', '/admin/export/rides.pdf', b'%PDF'),
+])
+def test_streamed_queries_are_counted(admin, monkeypatch, endpoint, url, magic):
+    monkeypatch.setattr(exports, 'EXPORT_BATCH_SIZE', BATCH)
+    series = metrics.request_queries._series
+    before = list(series.get((endpoint,), [0, 0]))[-2:]
+
+    response = admin.get(url, base_url=HTTPS)
+    assert response.status_code == 200 and response.data.startswith(magic)
+    response.close()
+
+    total, count = series[(endpoint,)][-2:]
+    assert count == before[1] + 1
+    # Every batch query, plus whatever loading the logged-in user took
+    assert total - before[0] >= len(all_rows()) // BATCH + 1
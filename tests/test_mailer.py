@@ -0,0 +1,167 @@
+"""
+mailer.py against an in-process SMTP stub (SMTP_REQUIRE_TLS=0, no login):
+session reuse, reconnecting, the retry queue and giving up into dead/.
+"""
+import os
+import socketserver
+import threading
+
+import pytest
+
+import mailer
+from mailer import Email, flush_queue, queued, send_batch
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    """Plain SMTP without extensions; records every connection and delivered message"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubSMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.refuse = set()         # recipients answered with 550
+        self.drop_after = None      # hang up after this many messages per connection
+        self.lock = threading.Lock()
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        sent_here = 0
+        recipients = []
+        self.reply('220 stub ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 stub')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip().strip('<>')
+                if address in server.refuse:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.messages.extend(recipients)
+                self.reply('250 OK')
+                sent_here += 1
+                if server.drop_after is not None and sent_here >= server.drop_after:
+                    return
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    server = StubSMTPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('SMTP_SERVER', '127.0.0.1')
+    monkeypatch.setenv('SMTP_PORT', str(server.server_address[1]))
+    monkeypatch.setenv('SENDER_EMAIL', 'rides@example.com')
+    monkeypatch.setenv('SMTP_REQUIRE_TLS', '0')
+    monkeypatch.delenv('SENDER_PASSWORD', raising=False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def queue_dir(tmp_path):
+    return str(tmp_path / 'mail_queue')
+
+
+def emails(*recipients):
+    return [Email(to, 'Rides', '<p>Sunday</p>', 'Sunday') for to in recipients]
+
+
+def test_one_session_for_the_whole_batch(smtp, queue_dir):
+    batch = emails(*(f'member{n}@example.com' for n in range(10)))
+
+    sent, failed = send_batch(batch, queue_dir)
+
+    assert len(sent) == 10 and failed == []
+    assert smtp.connections == 1
+    assert smtp.messages == [email.to for email in batch]
+    assert queued(queue_dir) == []
+
+
+def test_reconnects_when_the_server_hangs_up(smtp, queue_dir):
+    smtp.drop_after = 2
+
+    sent, failed = send_batch(emails('a@example.com', 'b@example.com', 'c@example.com'), queue_dir)
+
+    assert len(sent) == 3 and failed == []
+    assert smtp.connections == 2
+    assert smtp.messages == ['a@example.com', 'b@example.com', 'c@example.com']
+
+
+def test_refused_recipient_is_queued_and_the_rest_delivered(smtp, queue_dir):
+    smtp.refuse.add('gone@example.com')
+
+    sent, failed = send_batch(emails('a@example.com', 'gone@example.com', 'b@example.com'), queue_dir)
+
+    assert [email.to for email in failed] == ['gone@example.com']
+    assert smtp.messages == ['a@example.com', 'b@example.com']
+    assert smtp.connections == 1
+    [entry] = queued(queue_dir)
+    assert entry['email']['to'] == 'gone@example.com' and entry['attempts'] == 1
+
+
+def test_unreachable_server_queues_everything(smtp, queue_dir):
+    smtp.shutdown()
+    smtp.server_close()
+
+    sent, failed = send_batch(emails('a@example.com', 'b@example.com'), queue_dir)
+
+    assert sent == [] and len(failed) == 2
+    assert sorted(entry['email']['to'] for entry in queued(queue_dir)) == ['a@example.com', 'b@example.com']
+
+
+def test_flush_sends_due_messages_and_leaves_the_rest(smtp, queue_dir):
+    smtp.refuse.add('a@example.com')
+    send_batch(emails('a@example.com'), queue_dir)
+    smtp.refuse.clear()
+    [entry] = queued(queue_dir)
+
+    assert flush_queue(queue_dir, now=entry['next_attempt'] - 1) == {'sent': 0, 'requeued': 0, 'dead': 0, 'waiting': 1}
+    assert flush_queue(queue_dir, now=entry['next_attempt']) == {'sent': 1, 'requeued': 0, 'dead': 0, 'waiting': 0}
+    assert queued(queue_dir) == []
+    assert smtp.messages == ['a@example.com']
+
+
+def test_gives_up_into_dead_after_max_attempts(smtp, queue_dir, monkeypatch):
+    monkeypatch.setattr(mailer, 'MAIL_MAX_ATTEMPTS', 3)
+    smtp.refuse.add('gone@example.com')
+    send_batch(emails('gone@example.com'), queue_dir)
+    far_future = float('inf')
+
+    assert flush_queue(queue_dir, now=far_future)['requeued'] == 1
+    [entry] = queued(queue_dir)
+    assert entry['attempts'] == 2
+    assert flush_queue(queue_dir, now=far_future)['dead'] == 1
+
+    assert queued(queue_dir) == []
+    assert os.listdir(os.path.join(queue_dir, 'dead')) == [f"{entry['id']}.json"]
+    assert flush_queue(queue_dir, now=far_future) == {'sent': 0, 'requeued': 0, 'dead': 0, 'waiting': 0}
@@ -0,0 +1,26 @@
+"""
+The password pool's rehash check must work even while the pool is full.
+"""
+import pytest
+from werkzeug.security import generate_password_hash
+
+from passwords import HashingBusy, PasswordHasher
+
+
+@pytest.fixture
+def full_hasher():
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', workers=0, queue_limit=1)
+    assert hasher._slots.acquire(blocking=False)
+    yield hasher
+    hasher._slots.release()
+
+
+def test_pool_is_full(full_hasher):
+    with pytest.raises(HashingBusy):
+        full_hasher.hash('secret')
+
+
+def test_needs_rehash_does_not_need_a_slot(full_hasher):
+    assert not full_hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+    assert full_hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:2000'))
+    assert full_hasher.rejected == 0
@@ -0,0 +1,141 @@
+"""
+prober.py against a local stub HTTP server: retries, backoff, confirmation
+after PROBE_CONFIRM_FAILURES misses, and the run's deadline.
+"""
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import prober
+from prober import Target, check_targets, probe_target
+
+
+class StubServer(ThreadingHTTPServer):
+    """Answers each path from a script of statuses; the last status repeats"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.scripts = {}
+        self.hits = {}
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.hits[self.path] = server.hits.get(self.path, 0) + 1
+        script = server.scripts.get(self.path, [404])
+        status = script.pop(0) if len(script) > 1 else script[0]
+        if status == 'hang':
+            time.sleep(2)
+            status = 200
+        self.send_response(302 if isinstance(status, str) else status)
+        if isinstance(status, str):
+            self.send_header('Location', status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def probe(server, path, confirm_failures=3, retry_delay=0.01, total_seconds=10, timeout=5):
+    target = Target(path, server.url(path), timeout)
+
+    async def run():
+        return await probe_target(target, time.monotonic() + total_seconds,
+                                  confirm_failures=confirm_failures, retry_delay=retry_delay)
+    return asyncio.run(run())
+
+
+def test_recovers_after_failures_below_the_confirmation_count(stub):
+    stub.scripts['/health'] = [500, 500, 200]
+
+    result = probe(stub, '/health')
+
+    assert result.ok and result.status == 200
+    assert result.attempts == 3
+    assert stub.hits['/health'] == 3
+
+
+def test_down_only_after_confirm_failures_in_a_row(stub):
+    stub.scripts['/ready'] = [500]
+
+    result = probe(stub, '/ready', confirm_failures=4)
+
+    assert not result.ok
+    assert (result.status, result.detail) == (500, 'HTTP 500')
+    assert result.attempts == 4
+    assert stub.hits['/ready'] == 4
+
+
+def test_backoff_doubles_with_jitter(stub, monkeypatch):
+    stub.scripts['/'] = [503]
+    jitter_ranges, delays = [], []
+    real_sleep = asyncio.sleep
+
+    def fake_uniform(low, high):
+        jitter_ranges.append((low, high))
+        return 1.0
+
+    async def record_sleep(seconds):
+        delays.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(prober.random, 'uniform', fake_uniform)
+    monkeypatch.setattr(prober.asyncio, 'sleep', record_sleep)
+
+    result = probe(stub, '/', confirm_failures=4, retry_delay=0.5)
+
+    assert not result.ok and result.attempts == 4
+    # No wait after the last attempt
+    assert delays == [0.5, 1.0, 2.0]
+    assert jitter_ranges == [(0.5, 1.5)] * 3
+
+
+def test_deadline_stops_retrying(stub):
+    stub.scripts['/slow'] = ['hang']
+
+    started = time.monotonic()
+    result = probe(stub, '/slow', confirm_failures=5, total_seconds=0.6, timeout=0.25)
+
+    assert not result.ok
+    assert result.attempts < 5
+    assert 'timed out' in result.detail
+    assert time.monotonic() - started < 1.5
+
+
+def test_follows_redirects(stub):
+    stub.scripts['/'] = ['/health']
+    stub.scripts['/health'] = [200]
+
+    assert probe(stub, '/').ok
+    assert stub.hits == {'/': 1, '/health': 1}
+
+
+def test_check_targets_reports_each_failure(stub):
+    stub.scripts['/health'] = [200]
+    stub.scripts['/ready'] = [500]
+    targets = [Target('/health', stub.url('/health'), 5), Target('/ready', stub.url('/ready'), 5)]
+
+    is_healthy, message, results = check_targets(targets, confirm_failures=2, retry_delay=0.01)
+
+    assert not is_healthy
+    assert message == "/ready: HTTP 500 (2 attempts)"
+    assert [r.ok for r in results] == [True, False]
@@ -0,0 +1,51 @@
+"""
+Query budgets for the ride board routes, so an N+1 in load_ride_board fails CI.
+
+The board is one query however many vehicles and passengers it has, and none
+at all while board_cache holds it. benchmarks/query_budgets.py checks the
+other routes the same way.
+"""
+import pytest
+
+from benchmarks.seed import PASSWORD, clear, seed, seeded_usernames
+from cache import board_cache
+from db import get_db
+from sqltrace import query_budget
+
+USERS, VEHICLES = 300, 30
+# With DATABASE_URL set the app redirects plain HTTP to HTTPS
+HTTPS = 'https://localhost'
+
+
+@pytest.fixture(scope='module')
+def passenger(database):
+    """Test client logged in as a seeded passenger, with 30 vehicles on the board"""
+    with get_db() as conn:
+        clear(conn)
+        seed(conn, users=USERS, vehicles=VEHICLES)
+    from app import app
+    client = app.test_client()
+    username = seeded_usernames(USERS, VEHICLES)['passengers'][0]
+    response = client.post('/login', data={'username': username, 'password': PASSWORD}, base_url=HTTPS)
+    assert response.status_code == 302
+    # Loads the session's user into user_cache, so only the board is left to count
+    client.get('/', base_url=HTTPS)
+    yield client
+    with get_db() as conn:
+        clear(conn)
+
+
+@pytest.mark.parametrize('path', ['/', '/api/rides'])
+def test_cold_board_is_one_query(passenger, path):
+    board_cache.invalidate()
+    with query_budget(1, max_repeats=1, label=f"GET {path}"):
+        response = passenger.get(path, base_url=HTTPS)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('path', ['/', '/api/rides'])
+def test_cached_board_needs_no_queries(passenger, path):
+    passenger.get(path, base_url=HTTPS)
+    with query_budget(0, label=f"GET {path}"):
+        response = passenger.get(path, base_url=HTTPS)
+    assert response.status_code == 200
@@ -0,0 +1,36 @@
+"""
+Login budgets: spending a username's budget from one address must not lock
+that user out everywhere.
+"""
+import pytest
+
+from app import app
+from ratelimit import DEFAULT_LIMITS, RateLimiter, request_keys
+
+
+def login_keys(address, username):
+    with app.test_request_context('/login', method='POST', data={'username': username, 'password': 'x'},
+                                  environ_base={'REMOTE_ADDR': address}):
+        return request_keys()
+
+
+@pytest.fixture
+def limiter():
+    # A stopped clock: no bucket refills during the test
+    return RateLimiter(DEFAULT_LIMITS, clock=lambda: 0.0)
+
+
+def test_username_budget_is_per_address(limiter):
+    burst = DEFAULT_LIMITS['login']['user'].burst
+    for _ in range(burst):
+        assert limiter.check('login', login_keys('203.0.113.50', 'Alice')) == 0
+    assert limiter.check('login', login_keys('203.0.113.50', 'alice ')) > 0
+
+    assert limiter.check('login', login_keys('198.51.100.8', 'alice')) == 0
+
+
+def test_address_budget_still_caps_username_spraying(limiter):
+    burst = DEFAULT_LIMITS['login']['ip'].burst
+    for n in range(burst):
+        assert limiter.check('login', login_keys('203.0.113.50', f'user{n}')) == 0
+    assert limiter.check('login', login_keys('203.0.113.50', 'one-more')) > 0
@@ -0,0 +1,105 @@
+"""
+The offline snapshot end to end for a watchdog that can't see the app's disk:
+the app serves it, the watchdog keeps a copy, and the copy still fills the
+alert once the app and the database are both gone.
+"""
+import os
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import metrics
+import watchdog_scheduler
+from benchmarks.booking_stress import cleanup, seed
+from snapshot import read_snapshot, snapshot_writer
+from sqltrace import query_budget
+
+TOKEN = 'snapshot-test-token'
+HTTPS = 'https://localhost'
+
+
+@pytest.fixture
+def app(database, monkeypatch):
+    """The app with a METRICS_TOKEN, one seeded driver and no snapshot written yet"""
+    from app import app
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', TOKEN)
+    cleanup()
+    seed(drivers=1, capacity=3, passengers=0)
+    if os.path.exists(snapshot_writer.path):
+        os.remove(snapshot_writer.path)
+    yield app
+    cleanup()
+
+
+@pytest.fixture
+def server(app):
+    """The app on a real port, behind a stand-in for the TLS-terminating proxy"""
+    def behind_https_proxy(environ, start_response):
+        environ['wsgi.url_scheme'] = 'https'
+        return app(environ, start_response)
+
+    server = make_server('127.0.0.1', 0, behind_https_proxy, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def test_snapshot_endpoint_needs_the_token(app):
+    client = app.test_client()
+    assert client.get('/api/ride_snapshot', base_url=HTTPS).status_code == 403
+    assert client.get('/api/ride_snapshot?token=wrong', base_url=HTTPS).status_code == 403
+
+
+def test_served_from_disk_without_the_database(app):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {TOKEN}'}
+    # First call writes the missing file
+    assert client.get('/api/ride_snapshot', headers=headers, base_url=HTTPS).status_code == 200
+
+    with query_budget(0):
+        response = client.get('/api/ride_snapshot', headers=headers, base_url=HTTPS)
+
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    with open(snapshot_writer.path, 'rb') as f:
+        assert response.data == f.read()
+
+
+def test_watchdog_copy_covers_a_full_outage(server, tmp_path, monkeypatch, capsys):
+    website_url = f"http://127.0.0.1:{server.server_port}/health"
+    copy = str(tmp_path / 'watchdog' / 'ride_snapshot.json.gz')
+    os.makedirs(os.path.dirname(copy))
+    monkeypatch.delenv('SNAPSHOT_URL', raising=False)
+
+    # No token: nothing is copied
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    assert not watchdog_scheduler.refresh_snapshot(website_url, copy)
+    assert not os.path.exists(copy)
+
+    # A healthy run keeps a copy
+    monkeypatch.setenv('METRICS_TOKEN', TOKEN)
+    assert watchdog_scheduler.refresh_snapshot(website_url, copy)
+    assert 'Stop 0-0' in [ride['vehicle_name'] for ride in read_snapshot(copy).rides]
+
+    # Something that isn't a snapshot never replaces the copy
+    saved = open(copy, 'rb').read()
+    monkeypatch.setenv('SNAPSHOT_URL', website_url)
+    assert not watchdog_scheduler.refresh_snapshot(website_url, copy)
+    assert open(copy, 'rb').read() == saved
+    monkeypatch.delenv('SNAPSHOT_URL')
+
+    # The app and the database go down
+    server.shutdown()
+    server.server_close()
+
+    def database_down():
+        raise ConnectionError("database unreachable")
+    monkeypatch.setattr(watchdog_scheduler, 'get_all_rides_data', database_down)
+
+    assert not watchdog_scheduler.refresh_snapshot(website_url, copy)
+    rides, source = watchdog_scheduler.load_backup_data(copy)
+    assert source.startswith('Offline snapshot written')
+    ride = next(ride for ride in rides if ride['vehicle_name'] == 'Stop 0-0')
+    assert ride['driver_name'] == 'Driver 0'
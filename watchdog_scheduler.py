@@ -4,11 +4,13 @@ If the website is down, sends an email with all rides and passengers.
 """
 import os
 import sys
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import requests
-from db import get_db_connection
+from html import escape
+from urllib.parse import urljoin
+from prober import Target, check_targets, parse_targets
+from mailer import parse_recipients, send_to_all, flush_queue
+import sqltrace
+from rides import load_ride_roster
+from snapshot import RIDE_SNAPSHOT_PATH, fetch_snapshot, read_snapshot
 
 def check_website_health(url, timeout=10):
     """
@@ -16,23 +18,13 @@ def check_website_health(url, timeout=10):
 
     Args:
         url: The URL to check
-        timeout: Request timeout in seconds
+        timeout: Request timeout in seconds (per attempt)
 
     Returns:
         tuple: (is_healthy: bool, status_message: str)
     """
-    try:
-        response = requests.get(url, timeout=timeout)
-        if response.status_code == 200:
-            return True, f"Website is healthy (HTTP {response.status_code})"
-        else:
-            return False, f"Website returned HTTP {response.status_code}"
-    except requests.exceptions.Timeout:
-        return False, f"Website request timed out after {timeout} seconds"
-    except requests.exceptions.ConnectionError:
-        return False, "Could not connect to website (connection error)"
-    except Exception as e:
-        return False, f"Error checking website: {str(e)}"
+    is_healthy, status_message, _ = check_targets([Target(url, url, timeout)])
+    return is_healthy, status_message
 
 def get_all_rides_data():
     """
@@ -41,132 +33,144 @@ def get_all_rides_data():
     Returns:
         list: List of dictionaries containing ride information
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with sqltrace.trace('watchdog get_all_rides_data'):
+        return load_ride_roster()
+
+def describe_age(seconds):
+    """Rough human-readable age, e.g. '12 minutes'"""
+    for unit, size in (('day', 86400), ('hour', 3600), ('minute', 60)):
+        if seconds >= size:
+            count = int(seconds // size)
+            return f"{count} {unit}{'s' if count != 1 else ''}"
+    return f"{int(seconds)} seconds"
+
+def refresh_snapshot(website_url, path=RIDE_SNAPSHOT_PATH):
+    """
+    Copy the app's offline snapshot to RIDE_SNAPSHOT_PATH (best effort).
+
+    Needs METRICS_TOKEN. SNAPSHOT_URL defaults to /api/ride_snapshot on
+    WEBSITE_URL's host. Not needed when the watchdog shares the app's disk.
+
+    Args:
+        website_url: WEBSITE_URL
+        path: Where to keep the copy
 
+    Returns:
+        bool: True if a fresh copy was saved
+    """
+    token = os.environ.get('METRICS_TOKEN')
+    if not token:
+        print("ℹ️ METRICS_TOKEN not set; not copying the ride snapshot")
+        return False
+    url = os.environ.get('SNAPSHOT_URL') or urljoin(website_url, '/api/ride_snapshot')
     try:
-        # Use the correct placeholder based on database type
-        placeholder = "%s" if os.environ.get('DATABASE_URL') else "?"
-
-        # Get all vehicles with driver information
-        cur.execute("""
-            SELECT v.id, v.vehicle_name, v.driver_id,
-                   u.full_name as driver_name,
-                   u.phone_number as driver_phone,
-                   u.email as driver_email,
-                   u.driver_capacity
-            FROM vehicles v
-            JOIN users u ON v.driver_id = u.id
-            ORDER BY u.full_name
-        """)
-        vehicles = cur.fetchall()
-
-        rides_data = []
-
-        for vehicle in vehicles:
-            vehicle_id = vehicle['id']
-
-            # Get passengers for this vehicle
-            cur.execute(f"""
-                SELECT u.full_name, u.phone_number, u.email, u.residence
-                FROM bookings b
-                JOIN users u ON b.passenger_id = u.id
-                WHERE b.vehicle_id = {placeholder}
-                ORDER BY u.full_name
-            """, (vehicle_id,))
-            passengers = cur.fetchall()
-
-            rides_data.append({
-                'vehicle_name': vehicle['vehicle_name'],
-                'driver_name': vehicle['driver_name'],
-                'driver_phone': vehicle['driver_phone'],
-                'driver_email': vehicle['driver_email'],
-                'driver_capacity': vehicle['driver_capacity'],
-                'passengers': [
-                    {
-                        'name': p['full_name'],
-                        'phone': p['phone_number'],
-                        'email': p['email'],
-                        'residence': p['residence']
-                    }
-                    for p in passengers
-                ]
-            })
-
-        return rides_data
-    finally:
-        conn.close()
-
-def format_rides_email(rides_data, status_message):
+        snapshot = fetch_snapshot(url, token, path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not copy the ride snapshot from {url}: {e}")
+        return False
+    print(f"📦 Saved ride snapshot (board version {snapshot.version}, {len(snapshot.rides)} rides)")
+    return True
+
+def load_backup_data(path=RIDE_SNAPSHOT_PATH):
+    """
+    Rides for the alert: the offline snapshot if there is one (works even
+    when the database is down), otherwise a live database query.
+
+    Args:
+        path: Snapshot file (the app's own, or the copy refresh_snapshot() keeps)
+
+    Returns:
+        tuple: (rides_data, data_source description for the email)
+    """
+    try:
+        snapshot = read_snapshot(path)
+    except ValueError as e:
+        print(f"⚠️ Ignoring ride snapshot: {e}")
+        snapshot = None
+
+    if snapshot is not None:
+        source = (f"Offline snapshot written {snapshot.written_at:%Y-%m-%d %H:%M} UTC "
+                  f"({describe_age(snapshot.age)} old, board version {snapshot.version})")
+        print(f"📦 Using ride snapshot ({describe_age(snapshot.age)} old)")
+        return snapshot.rides, source
+
+    return get_all_rides_data(), "Live database query"
+
+EMAIL_STYLE = """
+            body { font-family: Arial, sans-serif; }
+            h1 { color: #d9534f; }
+            h2 { color: #333; margin-top: 20px; }
+            .ride { margin-bottom: 30px; border: 1px solid #ddd; padding: 15px; border-radius: 5px; }
+            .driver-info { background-color: #f0f0f0; padding: 10px; margin-bottom: 10px; }
+            .passenger { margin-left: 20px; padding: 5px; }
+            .alert { background-color: #f2dede; border: 1px solid #ebccd1; color: #a94442; padding: 15px; margin-bottom: 20px; border-radius: 4px; }
+"""
+
+def _passenger_details(passenger):
+    """' - residence - phone - email' for the fields that are set"""
+    return ''.join(f" - {passenger[key]}" for key in ('residence', 'phone', 'email') if passenger[key])
+
+def format_rides_email(rides_data, status_message, data_source=None):
     """
     Format ride data into an HTML email.
 
     Args:
         rides_data: List of ride dictionaries
         status_message: The error message from the health check
+        data_source: Where the ride data came from (e.g. snapshot age)
 
     Returns:
         str: HTML formatted email body
     """
-    html = f"""
+    # Collect pieces and join once - repeated += is quadratic on large rosters
+    parts = [f"""
     <html>
     <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; }}
-            h1 {{ color: #d9534f; }}
-            h2 {{ color: #333; margin-top: 20px; }}
-            .ride {{ margin-bottom: 30px; border: 1px solid #ddd; padding: 15px; border-radius: 5px; }}
-            .driver-info {{ background-color: #f0f0f0; padding: 10px; margin-bottom: 10px; }}
-            .passenger {{ margin-left: 20px; padding: 5px; }}
-            .alert {{ background-color: #f2dede; border: 1px solid #ebccd1; color: #a94442; padding: 15px; margin-bottom: 20px; border-radius: 4px; }}
-        </style>
+        <style>{EMAIL_STYLE}        </style>
     </head>
     <body>
         <h1>⚠️ Church Rides Website Down - Backup Data</h1>
         <div class="alert">
-            <strong>Status:</strong> {status_message}
+            <strong>Status:</strong> {escape(status_message)}{
+                f"<br><strong>Data:</strong> {escape(data_source)}" if data_source else ""}
         </div>
 
         <p>The church-rides website health check failed. Below is a complete backup of all current rides and passengers.</p>
 
         <h2>Total Rides: {len(rides_data)}</h2>
-    """
+    """]
+    add = parts.append
 
     if not rides_data:
-        html += "<p><em>No rides currently scheduled.</em></p>"
-    else:
-        for ride in rides_data:
-            passenger_count = len(ride['passengers'])
-            capacity = ride['driver_capacity'] or 'Not set'
+        add("<p><em>No rides currently scheduled.</em></p>")
+    for ride in rides_data:
+        passenger_count = len(ride['passengers'])
+        capacity = ride['driver_capacity'] or 'Not set'
 
-            html += f"""
+        add(f"""
             <div class="ride">
-                <h3>{ride['vehicle_name']}</h3>
+                <h3>{escape(ride['vehicle_name'] or '')}</h3>
                 <div class="driver-info">
-                    <strong>Driver:</strong> {ride['driver_name']}<br>
-                    <strong>Phone:</strong> {ride['driver_phone'] or 'Not provided'}<br>
-                    <strong>Email:</strong> {ride['driver_email'] or 'Not provided'}<br>
+                    <strong>Driver:</strong> {escape(ride['driver_name'])}<br>
+                    <strong>Phone:</strong> {escape(ride['driver_phone'] or 'Not provided')}<br>
+                    <strong>Email:</strong> {escape(ride['driver_email'] or 'Not provided')}<br>
                     <strong>Capacity:</strong> {passenger_count} / {capacity} passengers
                 </div>
                 <strong>Passengers ({passenger_count}):</strong>
-            """
+            """)
 
-            if not ride['passengers']:
-                html += "<p class='passenger'><em>No passengers yet</em></p>"
-            else:
-                for passenger in ride['passengers']:
-                    html += f"""
+        if not ride['passengers']:
+            add("<p class='passenger'><em>No passengers yet</em></p>")
+        for passenger in ride['passengers']:
+            add(f"""
                     <div class="passenger">
-                        • <strong>{passenger['name']}</strong>
-                        {f" - {passenger['residence']}" if passenger['residence'] else ""}
-                        {f" - {passenger['phone']}" if passenger['phone'] else ""}
-                        {f" - {passenger['email']}" if passenger['email'] else ""}
+                        • <strong>{escape(passenger['name'])}</strong>{escape(_passenger_details(passenger))}
                     </div>
-                    """
+                    """)
 
-            html += "</div>"
+        add("</div>")
 
-    html += """
+    add("""
         <hr>
         <p style="color: #666; font-size: 12px;">
             This is an automated alert from the Church Rides Watchdog service.
@@ -174,95 +178,135 @@ def format_rides_email(rides_data, status_message):
         </p>
     </body>
     </html>
+    """)
+
+    return ''.join(parts)
+
+def format_rides_text(rides_data, status_message, data_source=None):
     """
+    Format ride data as the plain-text alternative to format_rides_email().
 
-    return html
+    Args:
+        rides_data: List of ride dictionaries
+        status_message: The error message from the health check
+        data_source: Where the ride data came from (e.g. snapshot age)
 
-def send_email(recipient_email, subject, html_body):
+    Returns:
+        str: Plain text email body
     """
-    Send an email using SMTP.
+    lines = [
+        "CHURCH RIDES WEBSITE DOWN - BACKUP DATA",
+        f"Status: {status_message}",
+    ]
+    add = lines.append
+    if data_source:
+        add(f"Data: {data_source}")
+    lines += [
+        "",
+        "The church-rides website health check failed. Below is a complete backup of all current rides and passengers.",
+        "",
+        f"Total Rides: {len(rides_data)}",
+    ]
+
+    if not rides_data:
+        add("")
+        add("No rides currently scheduled.")
+    for ride in rides_data:
+        passenger_count = len(ride['passengers'])
+        add("")
+        add("=" * 60)
+        add(ride['vehicle_name'] or '')
+        add(f"Driver:   {ride['driver_name']}")
+        add(f"Phone:    {ride['driver_phone'] or 'Not provided'}")
+        add(f"Email:    {ride['driver_email'] or 'Not provided'}")
+        add(f"Capacity: {passenger_count} / {ride['driver_capacity'] or 'Not set'} passengers")
+        add(f"Passengers ({passenger_count}):")
+        if not ride['passengers']:
+            add("  (no passengers yet)")
+        for passenger in ride['passengers']:
+            add(f"  - {passenger['name']}{_passenger_details(passenger)}")
+
+    add("")
+    add("-- ")
+    add("This is an automated alert from the Church Rides Watchdog service.")
+    add("This email is sent when the website health check fails.")
+    return '\n'.join(lines) + '\n'
+
+def send_email(recipient_email, subject, html_body, text_body=None):
+    """
+    Send an email to one or more recipients over a single SMTP session.
 
     Args:
-        recipient_email: Email address to send to
+        recipient_email: Address, comma-separated addresses, or a list of them
         subject: Email subject
         html_body: HTML content of the email
+        text_body: Plain-text alternative for clients that don't show HTML
 
     Returns:
-        bool: True if email sent successfully, False otherwise
+        bool: True if every recipient was sent to (failures are queued for retry)
     """
-    smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-    sender_email = os.environ.get('SENDER_EMAIL')
-    sender_password = os.environ.get('SENDER_PASSWORD')
-
-    if not sender_email or not sender_password:
-        print("ERROR: SENDER_EMAIL or SENDER_PASSWORD environment variables not set")
-        return False
-
-    try:
-        # Create message
-        message = MIMEMultipart('alternative')
-        message['Subject'] = subject
-        message['From'] = sender_email
-        message['To'] = recipient_email
-
-        # Attach HTML content
-        html_part = MIMEText(html_body, 'html')
-        message.attach(html_part)
-
-        # Send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(message)
-
-        print(f"✅ Email sent successfully to {recipient_email}")
-        return True
-    except Exception as e:
-        print(f"❌ Error sending email: {str(e)}")
-        return False
+    if isinstance(recipient_email, str):
+        recipient_email = parse_recipients(recipient_email)
+    sent, failed = send_to_all(recipient_email, subject, html_body, text_body)
+    return bool(sent) and not failed
 
 def main():
     """Main function to run the watchdog check."""
     website_url = os.environ.get('WEBSITE_URL', 'https://church-rides.up.railway.app/health')
-    recipient_email = os.environ.get('ALERT_EMAIL')
+    # ALERT_EMAILS: comma-separated coordinators; ALERT_EMAIL still works for one address
+    recipients = parse_recipients(os.environ.get('ALERT_EMAILS') or os.environ.get('ALERT_EMAIL'))
 
-    if not recipient_email:
-        print("ERROR: ALERT_EMAIL environment variable not set")
+    if not recipients:
+        print("ERROR: ALERT_EMAILS (or ALERT_EMAIL) environment variable not set")
         sys.exit(1)
 
-    print(f"🔍 Checking website health: {website_url}")
+    # Deliver alerts that failed on an earlier run before checking again
+    retried = flush_queue()
+    if retried['sent'] or retried['requeued'] or retried['dead']:
+        print(f"📬 Retried queued alerts: {retried['sent']} sent, {retried['requeued']} still failing, "
+              f"{retried['dead']} given up")
+
+    # /health, / and /ready concurrently, each retried before it counts as down
+    targets = parse_targets(website_url, os.environ.get('WATCHDOG_TARGETS'))
+    print(f"🔍 Checking website health: {', '.join(target.url for target in targets)}")
 
-    # Check website health
-    is_healthy, status_message = check_website_health(website_url)
+    is_healthy, status_message, results = check_targets(targets)
+    for result in results:
+        print(f"   {'✅' if result.ok else '❌'} {result.target.name}: {result.detail} "
+              f"({result.attempts} attempt{'s' if result.attempts != 1 else ''}, {result.elapsed:.1f}s)")
 
     if is_healthy:
         print(f"✅ {status_message}")
+        # Kept between runs, so the next outage has data even if the database is gone
+        refresh_snapshot(website_url)
         print("No action needed - website is healthy")
         sys.exit(0)
     else:
         print(f"❌ {status_message}")
         print("Website is down! Sending alert email...")
+        # Still answers when only the database is down; otherwise the last run's copy is used
+        refresh_snapshot(website_url)
 
         # Get all rides data
         try:
-            rides_data = get_all_rides_data()
-            print(f"📊 Retrieved {len(rides_data)} rides from database")
+            rides_data, data_source = load_backup_data()
+            print(f"📊 Retrieved {len(rides_data)} rides ({data_source})")
         except Exception as e:
             print(f"❌ Error fetching rides data: {str(e)}")
             sys.exit(1)
 
         # Format and send email
-        html_body = format_rides_email(rides_data, status_message)
+        html_body = format_rides_email(rides_data, status_message, data_source)
+        text_body = format_rides_text(rides_data, status_message, data_source)
         subject = f"🚨 Church Rides Website Alert - {status_message}"
 
-        success = send_email(recipient_email, subject, html_body)
+        success = send_email(recipients, subject, html_body, text_body)
 
         if success:
             print("✅ Alert email sent successfully")
             sys.exit(0)
         else:
-            print("❌ Failed to send alert email")
+            print("❌ Failed to send alert email to every recipient (failures are queued for retry)")
             sys.exit(1)
 
 if __name__ == '__main__':